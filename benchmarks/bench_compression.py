@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+    --- Compression benchmark ---
+
+    Compress a synthetic SQL dump with 1 to N worker processes and print
+    throughput and ratio of each run.
+
+    Usage: python3 benchmarks/bench_compression.py [size in MB] [max workers] [codec]
+
+    @author Julien Raynal
+
+"""
+
+import io
+import os
+import sys
+import tarfile
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=C0413
+from modules.compressor import Compressor
+from modules.compression_codecs import CODECS
+
+
+class SilentLog:
+    """
+    Stand-in for LogEmailMattermost, benchmark prints its own figures.
+
+    Methods
+    -------
+    info(current_action, message=None):
+        Ignore info.
+
+    """
+
+    def info(self, current_action, message=None):
+        """
+        Ignore info.
+
+        Parameters
+        ----------
+        current_action: string
+            Action name.
+        message: string, optional
+            Message. The default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+
+
+def make_dump(size):
+    """
+    Build a dump looking like a SQL dump, compressible like a real one.
+
+    Parameters
+    ----------
+    size: int
+        Size of dump in bytes.
+
+    Returns
+    -------
+    bytes:
+        Dump content.
+
+    """
+
+    lines = []
+    total = 0
+    i = 0
+    while total < size:
+        line = (
+            "INSERT INTO `orders` VALUES ({0},'customer-{1}','{2:08x}',{3}.{4:02d});\n"
+        ).format(i, i % 9973, (i * 2654435761) % (1 << 32), i % 1000, i % 100)
+        lines.append(line)
+        total += len(line)
+        i += 1
+    return "".join(lines).encode()[:size]
+
+
+def main():
+    """
+    Run benchmark.
+
+    Parameters
+    ----------
+
+    Returns
+    -------
+    None.
+
+    """
+
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    codec = sys.argv[3] if len(sys.argv) > 3 else "gzip"
+
+    dump = make_dump(size * 1024 * 1024)
+    print("Dump: {} MB, codec: {}, cpu count: {}".format(size, codec, os.cpu_count()))
+    print("workers |   MB/s | ratio | seconds")
+
+    reference = None
+    with tempfile.TemporaryDirectory() as folder:
+        for workers in range(1, max_workers + 1):
+            entry = tarfile.TarInfo("dumpfile.sql")
+            entry.size = len(dump)
+            compressor = Compressor(
+                SilentLog(),
+                {
+                    "workers": workers,
+                    "codec": codec,
+                    "level": CODECS[codec]["presets"]["default"],
+                },
+            )
+            result = compressor.compress(
+                io.BytesIO(dump), entry, folder + "/dump.tgz"
+            )
+            if result["error"] is not None:
+                print("{:7d} | error: {}".format(workers, result["error"]))
+                continue
+
+            if reference is None:
+                reference = result["seconds"]
+            print(
+                "{:7d} | {:6.1f} | {:.3f} | {:7.2f} (x{:.2f})".format(
+                    workers,
+                    result["speed"],
+                    result["ratio"],
+                    result["seconds"],
+                    reference / result["seconds"],
+                )
+            )
+
+            # Archive must stay a standard .tgz.
+            with tarfile.open(folder + "/dump.tgz", "r") as tgz:
+                assert tgz.extractfile("dumpfile.sql").read() == dump
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+    --- Archive retention benchmark ---
+
+    Fill a local SFTP stand-in, behind a proxy adding latency, with daily
+    archives and their checksum sidecars, then expire them with time to save
+    of 30 days: first file by file as before (listdir, then one remove per
+    file), then with a date index and a pipelined remove batch.
+
+    Usage: python3 benchmarks/bench_retention.py [number of files] [round trip in ms]
+
+    @author Julien Raynal
+
+"""
+
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=C0413
+from bench_sftp_transfer import start_stand_in, Session
+from modules.delta_archive import file_date
+from modules.retention import archive_index, RetentionPolicy, RemoveBatch
+
+
+def fill(folder, number):
+    """
+    Create archives and sidecars, one archive per day back from today.
+
+    Parameters
+    ----------
+    folder: string
+        Folder served.
+    number: int
+        Number of files.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    today = datetime.date.today()
+    for i in range(number):
+        name = (today - datetime.timedelta(days=i // 2)).strftime("%Y%d%m") + ".tgz"
+        if i % 2:
+            name += ".sha256"
+        with open(os.path.join(folder, name), "wb") as archive:
+            archive.write(b"x" * 64)
+
+
+def serial(session, dead_line):
+    """
+    Expire archives as before: list names, parse each, remove one by one.
+
+    Parameters
+    ----------
+    session: Session
+        Session to stand-in.
+    dead_line: datetime.date
+        Archives older than this date expire.
+
+    Returns
+    -------
+    int:
+        Number of files removed.
+
+    """
+
+    removed = 0
+    for file in session.sftp_client.listdir("."):
+        dates = file_date(file)
+        if dates is not None and dates[0] < dead_line:
+            session.sftp_client.remove(file)
+            removed += 1
+    return removed
+
+
+def batched(session, today):
+    """
+    Expire archives with a date index and a pipelined remove batch.
+
+    Parameters
+    ----------
+    session: Session
+        Session to stand-in.
+    today: datetime.date
+        Date of today.
+
+    Returns
+    -------
+    int:
+        Number of files removed.
+
+    """
+
+    index = archive_index(session.sftp_client.listdir_attr("."))
+    expired = RetentionPolicy(30).expired(index, today)
+    failed = RemoveBatch(session.sftp_client).remove(expired)
+    return len(expired) - len(failed)
+
+
+def main():
+    """
+    Run benchmark.
+
+    Parameters
+    ----------
+
+    Returns
+    -------
+    None.
+
+    """
+
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    rtt = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+
+    today = datetime.date.today()
+    with tempfile.TemporaryDirectory() as folder:
+        port = start_stand_in(folder, rtt)
+        print("Files: {}, round trip: {} ms".format(number, rtt))
+        print("method   | removed | seconds")
+        for name, expire in (
+                ("serial", lambda session: serial(
+                    session, today - datetime.timedelta(days=30))),
+                ("batched", lambda session: batched(session, today))):
+            fill(folder, number)
+            session = Session(port)
+            try:
+                start = time.monotonic()
+                removed = expire(session)
+                print("{:8} | {:7d} | {:7.2f}".format(name, removed, time.monotonic() - start))
+            finally:
+                session.close()
+            for file in os.listdir(folder):
+                os.remove(os.path.join(folder, file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,573 @@
+# -*- coding: utf-8 -*-
+"""
+    --- SFTP transfer benchmark ---
+
+    Upload and download a file through a local SFTP stand-in behind a proxy
+    adding latency, with several transfer settings, and print throughput of
+    each run.
+
+    Usage: python3 benchmarks/bench_sftp_transfer.py [size in MB] [round trip in ms]
+
+    @author Julien Raynal
+
+"""
+
+import heapq
+import io
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import paramiko
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=C0413
+from modules.sftp_transfer import TransferEngine
+
+
+# Settings compared: paramiko defaults first, then tuned ones.
+SETTINGS = [
+    ("default", {"window-size": 2 * 1024 * 1024, "pipelined": False}),
+    ("pipelined", {"window-size": 2 * 1024 * 1024, "pipelined": True}),
+    ("16 MiB window", {"window-size": 16 * 1024 * 1024, "pipelined": True}),
+    ("64 MiB window", {"window-size": 64 * 1024 * 1024, "pipelined": True}),
+]
+
+
+class SilentLog:
+    """
+    Stand-in for LogEmailMattermost, benchmark prints its own figures.
+
+    Methods
+    -------
+    info(current_action, message=None):
+        Ignore info.
+
+    """
+
+    def info(self, current_action, message=None):
+        """
+        Ignore info.
+
+        Parameters
+        ----------
+        current_action: string
+            Action name.
+        message: string, optional
+            Message. The default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+
+
+class StubServer(paramiko.ServerInterface):
+    """
+    SSH server accepting any password and sftp subsystem.
+
+    Methods
+    -------
+    check_auth_password(username, password):
+        Accept any password.
+    get_allowed_auths(username):
+        Only password authentication.
+    check_channel_request(kind, chanid):
+        Accept any channel.
+
+    """
+
+    def check_auth_password(self, username, password):
+        """
+        Accept any password.
+
+        Parameters
+        ----------
+        username: string
+            User name.
+        password: string
+            Password.
+
+        Returns
+        -------
+        int:
+            paramiko.AUTH_SUCCESSFUL.
+
+        """
+
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        """
+        Only password authentication.
+
+        Parameters
+        ----------
+        username: string
+            User name.
+
+        Returns
+        -------
+        string:
+            Allowed methods.
+
+        """
+
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        """
+        Accept any channel.
+
+        Parameters
+        ----------
+        kind: string
+            Channel kind.
+        chanid: int
+            Channel id.
+
+        Returns
+        -------
+        int:
+            paramiko.OPEN_SUCCEEDED.
+
+        """
+
+        return paramiko.OPEN_SUCCEEDED
+
+
+class StubHandle(paramiko.SFTPHandle):
+    """
+    Handle of an open file of stub sftp server.
+
+    Methods
+    -------
+    stat():
+        Attributes of open file.
+
+    """
+
+    def stat(self):
+        """
+        Attributes of open file.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        paramiko.SFTPAttributes:
+            Attributes.
+
+        """
+
+        return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+
+class StubSFTP(paramiko.SFTPServerInterface):
+    """
+    Sftp server serving files of ROOT folder, set on class before use.
+    Folders are flattened: only base name of paths is used.
+
+    Methods
+    -------
+    open(path, flags, attr):
+        Open a file.
+    stat(path):
+        Attributes of a file.
+    posix_rename(oldpath, newpath):
+        Rename a file, replacing target.
+    list_folder(path):
+        Attributes of every file.
+    remove(path):
+        Remove a file.
+
+    """
+
+    ROOT = None
+
+    def open(self, path, flags, attr):
+        """
+        Open a file.
+
+        Parameters
+        ----------
+        path: string
+            Remote path.
+        flags: int
+            os.open flags.
+        attr: paramiko.SFTPAttributes
+            Requested attributes, ignored.
+
+        Returns
+        -------
+        StubHandle:
+            Handle of open file.
+
+        """
+
+        mode = "wb" if flags & (os.O_WRONLY | os.O_RDWR) else "rb"
+        try:
+            fileobj = open(os.path.join(self.ROOT, os.path.basename(path)), mode)
+        except OSError as err:
+            return paramiko.SFTPServer.convert_errno(err.errno)
+        handle = StubHandle(flags)
+        handle.readfile = fileobj
+        handle.writefile = fileobj
+        return handle
+
+    def stat(self, path):
+        """
+        Attributes of a file.
+
+        Parameters
+        ----------
+        path: string
+            Remote path.
+
+        Returns
+        -------
+        paramiko.SFTPAttributes:
+            Attributes.
+
+        """
+
+        try:
+            return paramiko.SFTPAttributes.from_stat(
+                os.stat(os.path.join(self.ROOT, os.path.basename(path)))
+            )
+        except OSError as err:
+            return paramiko.SFTPServer.convert_errno(err.errno)
+
+    lstat = stat
+
+    def posix_rename(self, oldpath, newpath):
+        """
+        Rename a file, replacing target.
+
+        Parameters
+        ----------
+        oldpath: string
+            Remote path.
+        newpath: string
+            New remote path.
+
+        Returns
+        -------
+        int:
+            paramiko.SFTP_OK, or error code.
+
+        """
+
+        try:
+            os.replace(
+                os.path.join(self.ROOT, os.path.basename(oldpath)),
+                os.path.join(self.ROOT, os.path.basename(newpath)),
+            )
+        except OSError as err:
+            return paramiko.SFTPServer.convert_errno(err.errno)
+        return paramiko.SFTP_OK
+
+    def list_folder(self, path):
+        """
+        Attributes of every file, folder path is ignored.
+
+        Parameters
+        ----------
+        path: string
+            Remote path.
+
+        Returns
+        -------
+        list:
+            paramiko.SFTPAttributes of each file.
+
+        """
+
+        attributes = []
+        for name in os.listdir(self.ROOT):
+            attribute = paramiko.SFTPAttributes.from_stat(
+                os.stat(os.path.join(self.ROOT, name))
+            )
+            attribute.filename = name
+            attributes.append(attribute)
+        return attributes
+
+    def remove(self, path):
+        """
+        Remove a file.
+
+        Parameters
+        ----------
+        path: string
+            Remote path.
+
+        Returns
+        -------
+        int:
+            paramiko.SFTP_OK, or error code.
+
+        """
+
+        try:
+            os.remove(os.path.join(self.ROOT, os.path.basename(path)))
+        except OSError as err:
+            return paramiko.SFTPServer.convert_errno(err.errno)
+        return paramiko.SFTP_OK
+
+
+def serve(listener, key):
+    """
+    Accept ssh connections, each one is served by paramiko threads.
+
+    Parameters
+    ----------
+    listener: socket.socket
+        Listening socket.
+    key: paramiko.PKey
+        Host key.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    while True:
+        connection, _ = listener.accept()
+        transport = paramiko.Transport(connection)
+        transport.add_server_key(key)
+        transport.set_subsystem_handler("sftp", paramiko.SFTPServer, StubSFTP)
+        transport.start_server(server=StubServer())
+
+
+def forward(source, target, delay):
+    """
+    Copy data from a socket to another, each packet is delivered once
+    delay passed.
+
+    Parameters
+    ----------
+    source: socket.socket
+        Socket read.
+    target: socket.socket
+        Socket written.
+    delay: float
+        One way latency in seconds.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    queue = []
+    ready = threading.Condition()
+
+    def deliver():
+        while True:
+            with ready:
+                while not queue:
+                    ready.wait()
+                due, _, data = queue[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    ready.wait(wait)
+                    continue
+                heapq.heappop(queue)
+            try:
+                if data is None:
+                    target.shutdown(socket.SHUT_WR)
+                    return
+                target.sendall(data)
+            except OSError:
+                return
+
+    threading.Thread(target=deliver, daemon=True).start()
+    number = 0
+    while True:
+        try:
+            data = source.recv(256 * 1024)
+        except OSError:
+            data = b""
+        number += 1
+        with ready:
+            heapq.heappush(queue, (time.monotonic() + delay, number, data or None))
+            ready.notify()
+        if not data:
+            return
+
+
+def proxy(listener, server_port, delay):
+    """
+    Relay connections to server, adding latency both ways.
+
+    Parameters
+    ----------
+    listener: socket.socket
+        Listening socket.
+    server_port: int
+        Port of server on localhost.
+    delay: float
+        One way latency in seconds.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    while True:
+        client, _ = listener.accept()
+        server = socket.create_connection(("127.0.0.1", server_port))
+        for source, target in ((client, server), (server, client)):
+            threading.Thread(
+                target=forward, args=(source, target, delay), daemon=True
+            ).start()
+
+
+def listen():
+    """
+    Open a listening socket on a free local port.
+
+    Parameters
+    ----------
+
+    Returns
+    -------
+    socket.socket:
+        Listening socket.
+
+    """
+
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(8)
+    return listener
+
+
+def start_stand_in(folder, rtt):
+    """
+    Start stub sftp server serving a folder, behind a proxy adding latency.
+
+    Parameters
+    ----------
+    folder: string
+        Folder served.
+    rtt: float
+        Round trip time added, in milliseconds.
+
+    Returns
+    -------
+    int:
+        Port of proxy on localhost.
+
+    """
+
+    StubSFTP.ROOT = folder
+    server = listen()
+    relay = listen()
+    key = paramiko.RSAKey.generate(2048)
+    threading.Thread(target=serve, args=(server, key), daemon=True).start()
+    threading.Thread(
+        target=proxy,
+        args=(relay, server.getsockname()[1], rtt / 2000),
+        daemon=True,
+    ).start()
+    return relay.getsockname()[1]
+
+
+class Session:
+    """
+    Stand-in for pysftp.Connection, TransferEngine only needs its client.
+
+    Attributes
+    ----------
+    sftp_client: paramiko.SFTPClient
+        Session client.
+
+    """
+
+    def __init__(self, port):
+        """
+        Constructor of the Session class.
+
+        Parameters
+        ----------
+        port: int
+            Port of proxy.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.transport = paramiko.Transport(("127.0.0.1", port))
+        self.transport.connect(username="bench", password="bench")
+        self.sftp_client = paramiko.SFTPClient.from_transport(self.transport)
+
+    def close(self):
+        """
+        Close session.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.transport.close()
+
+
+def main():
+    """
+    Run benchmark.
+
+    Parameters
+    ----------
+
+    Returns
+    -------
+    None.
+
+    """
+
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    rtt = float(sys.argv[2]) if len(sys.argv) > 2 else 20.0
+
+    data = os.urandom(size * 1024 * 1024)
+
+    with tempfile.TemporaryDirectory() as folder:
+        port = start_stand_in(folder, rtt)
+
+        print("File: {} MB, round trip: {} ms".format(size, rtt))
+        print("settings      | upload MB/s | download MB/s")
+        for name, options in SETTINGS:
+            session = Session(port)
+            engine = TransferEngine(SilentLog(), options)
+            try:
+                upload = engine.upload(session, io.BytesIO(data), "bench.bin")
+                received = io.BytesIO()
+                download = engine.download(session, "bench.bin", received)
+                assert received.getvalue() == data
+                print(
+                    "{:13} | {:11.1f} | {:13.1f}".format(
+                        name, upload["speed"], download["speed"]
+                    )
+                )
+            finally:
+                engine.close()
+                session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+    --- Daemon ---
+
+    Run jobs of config file on their schedule, without cron:
+
+        python3 daemon.py
+
+    Control a running daemon, from the same folder:
+
+        python3 daemon.py status
+        python3 daemon.py trigger [job ...]
+        python3 daemon.py pause [job ...]
+        python3 daemon.py resume [job ...]
+        python3 daemon.py reload
+        python3 daemon.py stop
+
+    @author Julien Raynal
+
+"""
+
+import json
+import os
+import sys
+from modules.backup_daemon import BackupDaemon, send_command
+
+
+def main():
+    """
+    Start daemon, or send a command to the running one.
+
+    Parameters
+    ----------
+
+    Returns
+    -------
+    None.
+
+    """
+
+    daemon = BackupDaemon(8000, os.getcwd() + "/config.json")
+
+    if len(sys.argv) < 2:
+        daemon.serve()
+        return
+
+    # Socket is the one of config file.
+    try:
+        with open(daemon.config, "r") as json_config:
+            path = daemon.read_options(json.load(json_config))["socket"]
+    except (EnvironmentError, ValueError):
+        path = daemon.options["socket"]
+
+    try:
+        answer = send_command(path, " ".join(sys.argv[1:]))
+    except OSError:
+        print("No daemon listens on " + path + ".")
+        sys.exit(1)
+
+    print(json.dumps(answer, indent=2))
+    if not answer["ok"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
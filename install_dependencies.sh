@@ -22,6 +22,9 @@ python3 -m pip --version
 
 python3 -m pip install email_validator
 python3 -m pip install pysftp
+# Retention pipelines removals through private methods of paramiko,
+# checked on these versions.
+python3 -m pip install "paramiko>=2.7,<4"
 python3 -m pip install urllib3
 python3 -m pip install psutil
 
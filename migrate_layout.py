@@ -0,0 +1,65 @@
+"""
+    --- Layout migration ---
+
+    Move archives of flat remote folders into partitions of dated layout,
+    for every sftp destination of every job configured with "layout":
+    "dated". Run it once, after switching layout and before next run.
+
+    @author Julien Raynal
+
+"""
+
+import os
+from modules.job_pool import JobPool, JobLog
+from modules.scripting_system import ScriptingSystem
+from modules.sftp_server import SFTPServer
+from modules.remote_layout import DATED
+
+
+def main():
+    """
+    Migrate layout of every dated destination.
+
+    Parameters
+    ----------
+
+    Returns
+    -------
+    None.
+
+    """
+
+    pool = JobPool(8000, os.getcwd() + "/config.json")
+
+    pool.get_configuration()
+
+    if pool.critical_nb > 0:
+        return
+
+    for job in pool.jobs:
+        script = ScriptingSystem(pool.port, pool.config)
+        script.get_configuration(
+            {key: value for key, value in job.items() if key != "name"},
+            JobLog(pool.log_email_matt, job["name"], pool.lock),
+        )
+        if script.critical_nb > 0:
+            continue
+
+        for destination in script.destinations:
+            if destination["layout"] != DATED:
+                continue
+            sftp = SFTPServer(
+                dict(destination, transfer=script.transfer_options),
+                script.log_email_matt,
+                True,
+            )
+            try:
+                sftp.migrate_layout()
+            finally:
+                sftp.close()
+
+    pool.log_email_matt.send_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,685 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 25 18:02:44 2026
+
+-- Backup daemon --
+
+Instead of a cold start from cron for each run, the daemon stays up and runs
+jobs of config file on their own cron schedule, "schedule" of a job or of
+daemon bracket. Connections to web, sftp and e-mail servers are kept open
+between runs. Config file is read again when it changes, a wrong one is
+ignored and previous one is kept. Jobs due at the same time run together in
+one pipeline; a job still running when it is due again skips that run.
+
+A local control socket takes one command per line and answers one JSON line:
+"status", "trigger [job ...]", "pause [job ...]", "resume [job ...]",
+"reload" and "stop". Without job names, commands apply to every job. Paused
+jobs skip scheduled runs, they still run when triggered.
+
+@author: Julien
+"""
+
+import datetime
+import json
+import os
+import signal
+import socket
+import socketserver
+import threading
+import time
+from modules.connection_pool import ConnectionPool, DEFAULT_IDLE_TIMEOUT
+from modules.cron_schedule import CronSchedule
+from modules.job_pool import JobPool
+from modules.log_email_mattermost import LogEmailMattermost
+from modules.scripting_system import ScriptingSystem
+
+
+# Schedule of jobs without their own.
+DEFAULT_SCHEDULE = "@daily"
+
+# Control socket, in current folder.
+DEFAULT_SOCKET = "daemon.sock"
+
+# Seconds between checks of config file.
+DEFAULT_RELOAD_INTERVAL = 5
+
+# Name of the job of main brackets, when config file has no jobs bracket.
+MAIN_JOB = "main"
+
+# Longest command line read on control socket.
+MAX_COMMAND_SIZE = 4096
+
+
+class ControlHandler(socketserver.StreamRequestHandler):
+    """
+    Handler of a connection to control socket: one command per line, one
+    JSON answer per line.
+
+    Methods
+    -------
+    handle():
+        Answer every command of connection.
+
+    """
+
+    def handle(self):
+        """
+        Answer every command of connection until it is closed.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        while True:
+            line = self.rfile.readline(MAX_COMMAND_SIZE)
+            if not line:
+                return
+            words = line.decode(errors="replace").split()
+            if not words:
+                continue
+            answer = self.server.daemon.command(words[0].lower(), words[1:])
+            self.wfile.write(json.dumps(answer).encode() + b"\n")
+            self.wfile.flush()
+
+
+class ControlServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Control socket of daemon, each connection is answered in its own thread.
+
+    Attributes
+    ----------
+    daemon: BackupDaemon
+        Daemon commands are sent to.
+
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path, daemon):
+        """
+        Constructor of the ControlServer class.
+
+        Parameters
+        ----------
+        path: string
+            path of socket.
+        daemon: BackupDaemon
+            daemon commands are sent to.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.daemon = daemon
+        super().__init__(path, ControlHandler)
+
+
+def send_command(path, command):
+    """
+    Send a command to control socket of a running daemon.
+
+    Parameters
+    ----------
+    path: string
+        Path of socket.
+    command: string
+        Command and its job names.
+
+    Returns
+    -------
+    dict:
+        Answer of daemon.
+
+    Raises
+    ------
+    OSError
+        If no daemon listens on socket.
+
+    """
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        client.sendall(command.encode() + b"\n")
+        with client.makefile("rb") as reader:
+            return json.loads(reader.readline(1 << 20).decode())
+
+
+class BackupDaemon:
+    """
+    Class to run jobs of config file on their schedule, in a process that
+    stays up.
+
+    Attributes
+    ----------
+    port: int
+        Port used to connect to web server.
+    config: string
+        Configuration filename.
+    log_email_matt: LogEmailMattermost
+        Object to log daemon events, runs have their own.
+    options: dict
+        Options of daemon bracket.
+    pool: ConnectionPool
+        Connections kept open between runs, a new pool is made when config
+        file is loaded.
+    jobs: dict
+        For each job name: "schedule" (CronSchedule, None if it is not
+        scheduled), "next" run time, "paused" and outcome of "last" run.
+    stamp: tuple
+        Modification time and size of config file loaded.
+    paused: boolean
+        True if scheduled runs of every job are skipped.
+    pending: list
+        Names of jobs waiting for a run.
+    running: list
+        Names of jobs of current run.
+    worker: threading.Thread
+        Thread of current run, None between runs.
+    lock: threading.Lock
+        Lock shared by scheduler, runs and control socket.
+    wake: threading.Event
+        Set to wake scheduler up before its next tick.
+    stopping: threading.Event
+        Set once daemon has to stop.
+    reload_requested: boolean
+        True to read config file again on next tick, even if unchanged.
+
+    Methods
+    -------
+    read_options(data):
+        Check daemon bracket of config file.
+    config_stamp():
+        Get modification time and size of config file.
+    load():
+        Read config file and schedule its jobs.
+    serve():
+        Run scheduler until daemon is stopped.
+    tick(now):
+        Queue due jobs, start a run in a thread.
+    run_jobs(names, connections):
+        Run jobs, record their outcome.
+    command(name, args):
+        Answer a command of control socket.
+    select(args):
+        Get job names a command applies to.
+    status():
+        Describe schedule, runs and connections.
+    stop():
+        Ask daemon to stop.
+    open_socket():
+        Start control socket.
+
+    """
+
+    def __init__(self, port_, config_):
+        """
+        Constructor of the BackupDaemon class.
+
+        Parameters
+        ----------
+        port_: int
+            port to use to connect to web server
+        config_: string
+            configuration filename
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.port = port_
+        self.config = config_
+        self.log_email_matt = LogEmailMattermost()
+        self.options = {
+            "schedule": DEFAULT_SCHEDULE,
+            "socket": DEFAULT_SOCKET,
+            "reload-interval": DEFAULT_RELOAD_INTERVAL,
+            "idle-timeout": DEFAULT_IDLE_TIMEOUT,
+        }
+        self.pool = ConnectionPool()
+        self.jobs = {}
+        self.stamp = None
+        self.paused = False
+        self.pending = []
+        self.running = []
+        self.worker = None
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.reload_requested = False
+
+    def read_options(self, data):
+        """
+        Check daemon bracket of config file, as any other bracket.
+
+        Parameters
+        ----------
+        data: dict
+            Config file.
+
+        Returns
+        -------
+        dict:
+            Options of daemon bracket.
+
+        """
+
+        options = ScriptingSystem(self.port, self.config)
+        options.log_email_matt = self.log_email_matt
+        return options.get_options("Daemon", data.get("daemon", {}), self.options)
+
+    def config_stamp(self):
+        """
+        Get modification time and size of config file.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        tuple:
+            Modification time in nanoseconds and size, None if file is
+            missing.
+
+        """
+
+        try:
+            stat = os.stat(self.config)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self):
+        """
+        Read config file and schedule its jobs. Paused jobs stay paused and
+        keep outcome of their last run. Addresses and accounts may have
+        changed: next runs get a new connection pool, the previous one is
+        closed once current run is done.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        boolean:
+            True if config file was loaded, False if it is wrong and previous
+            one is kept.
+
+        """
+
+        stamp = self.config_stamp()
+        pool = JobPool(self.port, self.config)
+        pool.get_configuration()
+        if pool.critical_nb > 0:
+            self.stamp = stamp
+            self.log_email_matt.error(
+                "Daemon", "Config file could not be loaded, previous one is kept."
+            )
+            return False
+
+        with open(self.config, "r") as json_config:
+            options = self.read_options(json.load(json_config))
+
+        now = datetime.datetime.now()
+        jobs = {}
+        for job in pool.jobs:
+            name = job["name"] or MAIN_JOB
+            expression = job.get("schedule", options["schedule"])
+            try:
+                schedule = CronSchedule(expression)
+                following = schedule.next_after(now)
+                if following is None:
+                    raise ValueError("Schedule never runs.")
+            except ValueError as err:
+                schedule, following = None, None
+                self.log_email_matt.warning(
+                    "Daemon",
+                    "Schedule '" + str(expression) + "' of job " + name
+                    + " is not supported, job only runs when triggered. " + str(err),
+                )
+
+            previous = self.jobs.get(name, {})
+            jobs[name] = {
+                "schedule": schedule,
+                "next": following,
+                "paused": previous.get("paused", False),
+                "last": previous.get("last"),
+            }
+
+        with self.lock:
+            if self.stamp is not None and options["socket"] != self.options["socket"]:
+                self.log_email_matt.warning(
+                    "Daemon", "Control socket is moved on next start of daemon."
+                )
+                options["socket"] = self.options["socket"]
+            self.options = options
+            self.jobs = jobs
+            self.pending = [name for name in self.pending if name in jobs]
+            self.stamp = stamp
+            retired, self.pool = self.pool, ConnectionPool(options["idle-timeout"])
+            if self.worker is not None:
+                # Sessions are in use, current run closes them.
+                retired = None
+        if retired is not None:
+            retired.close()
+
+        self.log_email_matt.info(
+            "Daemon",
+            "Config file loaded, {} job(s) scheduled.".format(
+                sum(job["schedule"] is not None for job in jobs.values())
+            ),
+        )
+        return True
+
+    def serve(self):
+        """
+        Run scheduler until daemon is stopped by "stop" command, SIGTERM or
+        SIGINT. SIGHUP reads config file again. Current run is waited for
+        before leaving.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if not self.load():
+            return
+
+        control = self.open_socket()
+        if control is None:
+            return
+        threading.Thread(
+            target=control.serve_forever, name="control", daemon=True
+        ).start()
+
+        signal.signal(signal.SIGTERM, lambda *_: self.stop())
+        signal.signal(signal.SIGINT, lambda *_: self.stop())
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, lambda *_: self.command("reload", []))
+
+        self.log_email_matt.info(
+            "Daemon", "Daemon started, control socket " + self.options["socket"] + "."
+        )
+        checked = time.monotonic()
+        try:
+            while not self.stopping.is_set():
+                if (self.reload_requested
+                        or time.monotonic() - checked >= self.options["reload-interval"]):
+                    checked = time.monotonic()
+                    if self.reload_requested or self.config_stamp() != self.stamp:
+                        self.reload_requested = False
+                        self.load()
+                self.tick(datetime.datetime.now())
+                self.pool.prune()
+                self.wake.wait(1)
+                self.wake.clear()
+        finally:
+            control.shutdown()
+            control.server_close()
+            if os.path.exists(self.options["socket"]):
+                os.remove(self.options["socket"])
+            worker = self.worker
+            if worker is not None:
+                worker.join()
+            self.pool.close()
+            self.log_email_matt.info("Daemon", "Daemon stopped.")
+
+    def tick(self, now):
+        """
+        Queue jobs due, then start a run of queued jobs if none is running.
+
+        Parameters
+        ----------
+        now: datetime.datetime
+            Current time.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        with self.lock:
+            for name, job in self.jobs.items():
+                if job["next"] is None or job["next"] > now:
+                    continue
+                job["next"] = job["schedule"].next_after(now)
+                if self.paused or job["paused"]:
+                    continue
+                if name in self.running:
+                    self.log_email_matt.warning(
+                        "Daemon",
+                        "Job " + name + " is still running, scheduled run skipped.",
+                    )
+                elif name not in self.pending:
+                    self.pending.append(name)
+
+            if self.worker is not None or not self.pending:
+                return
+            names, self.pending = self.pending, []
+            self.running = names
+            self.worker = threading.Thread(
+                target=self.run_jobs, args=(names, self.pool), name="run"
+            )
+        self.worker.start()
+
+    def run_jobs(self, names, connections):
+        """
+        Run jobs in one pipeline with connections of previous runs, then
+        record their outcome. A run reads config file again, as from cron.
+
+        Parameters
+        ----------
+        names: list
+            Names of jobs to run.
+        connections: ConnectionPool
+            Connections of run, closed once it is done if config file was
+            loaded again meanwhile.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        start = datetime.datetime.now()
+        outcome = {}
+        try:
+            pool = JobPool(self.port, self.config, connections)
+            pool.get_configuration()
+            jobs = [job for job in pool.jobs if (job["name"] or MAIN_JOB) in names]
+            # Jobs removed from config file since they were queued are dropped.
+            for log in pool.run(jobs) if jobs else []:
+                outcome[log.name or MAIN_JOB] = {
+                    "errors": log.error_nb,
+                    "warnings": log.warning_nb,
+                }
+        except Exception as err:  # pylint: disable=W0703
+            # Daemon goes on, next run may succeed.
+            self.log_email_matt.error("Daemon", "Run stopped. " + repr(err))
+
+        last = {
+            "start": start.isoformat(timespec="seconds"),
+            "seconds": round((datetime.datetime.now() - start).total_seconds(), 2),
+        }
+        with self.lock:
+            for name in names:
+                if name in self.jobs:
+                    # A job missing from outcome did not run, config is wrong.
+                    self.jobs[name]["last"] = dict(
+                        last, **outcome.get(name, {"errors": None, "warnings": None})
+                    )
+            self.running = []
+            self.worker = None
+            retired = connections if connections is not self.pool else None
+        if retired is not None:
+            retired.close()
+        self.wake.set()
+
+    def command(self, name, args):
+        """
+        Answer a command of control socket.
+
+        Parameters
+        ----------
+        name: string
+            "status", "trigger", "pause", "resume", "reload" or "stop".
+        args: list
+            Job names, none for every job.
+
+        Returns
+        -------
+        dict:
+            Answer, "ok" is False with an "error" if command failed.
+
+        """
+
+        if name == "status":
+            return dict(self.status(), ok=True)
+
+        if name == "reload":
+            self.reload_requested = True
+            self.wake.set()
+            return {"ok": True}
+
+        if name == "stop":
+            self.stop()
+            return {"ok": True}
+
+        if name not in ("trigger", "pause", "resume"):
+            return {"ok": False, "error": "Unknown command " + name + "."}
+
+        with self.lock:
+            names = self.select(args)
+            if names is None:
+                return {"ok": False, "error": "Unknown job in " + " ".join(args) + "."}
+
+            if name == "trigger":
+                self.pending.extend(job for job in names if job not in self.pending)
+            elif not args:
+                self.paused = name == "pause"
+                for job in self.jobs.values():
+                    job["paused"] = False
+            else:
+                for job in names:
+                    self.jobs[job]["paused"] = name == "pause"
+
+        self.log_email_matt.info(
+            "Daemon", name.capitalize() + " " + (", ".join(args) or "every job") + "."
+        )
+        self.wake.set()
+        return {"ok": True, "jobs": names}
+
+    def select(self, args):
+        """
+        Get job names a command applies to.
+
+        Parameters
+        ----------
+        args: list
+            Job names given with command, none for every job.
+
+        Returns
+        -------
+        list:
+            Job names, None if one is unknown.
+
+        """
+
+        if not args:
+            return list(self.jobs)
+        if any(arg not in self.jobs for arg in args):
+            return None
+        return list(args)
+
+    def status(self):
+        """
+        Describe schedule of each job, runs and connections kept.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        dict:
+            "paused", "running", "pending", "jobs" and "connections".
+
+        """
+
+        with self.lock:
+            return {
+                "paused": self.paused,
+                "running": list(self.running),
+                "pending": list(self.pending),
+                "jobs": [
+                    {
+                        "name": name,
+                        "schedule": None if job["schedule"] is None else job["schedule"].expression,
+                        "next": None if job["next"] is None else job["next"].isoformat(),
+                        "paused": job["paused"],
+                        "last": job["last"],
+                    }
+                    for name, job in self.jobs.items()
+                ],
+                "connections": self.pool.stats(),
+            }
+
+    def stop(self):
+        """
+        Ask daemon to stop once current run is done.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.stopping.set()
+        self.wake.set()
+
+    def open_socket(self):
+        """
+        Start control socket, readable by current user only. A socket left
+        by a daemon that died is replaced.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        ControlServer:
+            Control socket, None if another daemon is running.
+
+        """
+
+        path = self.options["socket"]
+        if os.path.exists(path):
+            try:
+                send_command(path, "status")
+                self.log_email_matt.critical(
+                    "Daemon", "Another daemon listens on " + path + "."
+                )
+                return None
+            except (OSError, ValueError):
+                os.remove(path)
+
+        umask = os.umask(0o077)
+        try:
+            return ControlServer(path, self)
+        finally:
+            os.umask(umask)
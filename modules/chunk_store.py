@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 10:02:36 2026
+
+-- Content-defined chunk deduplication store on sftp server --
+
+Dump is cut in chunks at content-defined boundaries, so an insertion only
+changes the chunks around it. Each chunk is stored once on server, compressed
+and named after its SHA-256. A small recipe per day lists chunks to join to
+rebuild the dump.
+
+@author: Julien
+"""
+
+import hashlib
+import io
+import json
+import posixpath
+import zlib
+from modules.compression_codecs import CODECS, DEFAULT_CODEC
+from modules.sftp_transfer import TransferEngine, PART_EXTENSION
+
+
+# Extension of recipe of each day, replaces archive extension.
+RECIPE_EXTENSION = ".recipe"
+
+# Folder of chunks, inside archive folder.
+CHUNK_FOLDER = "chunks"
+
+# Chunk sizes in bytes: no cut below minimum, cut forced at maximum.
+DEFAULT_MIN_SIZE = 256 * 1024
+DEFAULT_AVG_SIZE = 1024 * 1024
+DEFAULT_MAX_SIZE = 4 * 1024 * 1024
+
+
+# Gear table of rolling hash cutting long lines, one 64-bit value per byte.
+GEAR = [int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], "big") for i in range(256)]
+
+GEAR_BITS = 64
+GEAR_MODULO = (1 << GEAR_BITS) - 1
+
+
+def gear_cut(chunk, start, state, min_size, max_size, mask):
+    """
+    Look for a cut point in a chunk with a gear rolling hash, as FastCDC
+    does: hash of a byte depends on the 64 bytes before it only, so cut
+    points follow content whatever their offset. No cut is looked for below
+    minimum size.
+
+    Parameters
+    ----------
+    chunk: bytearray
+        Chunk being built.
+    start: int
+        Bytes of chunk already hashed.
+    state: int
+        Hash after these bytes.
+    min_size: int
+        No cut before this size.
+    max_size: int
+        Cut forced at this size.
+    mask: int
+        High bits of hash that must be zero to cut.
+
+    Returns
+    -------
+    int:
+        Size of chunk to cut, None if no cut point yet.
+    int:
+        Hash after bytes hashed.
+    int:
+        Bytes of chunk hashed.
+
+    """
+
+    end = min(len(chunk), max_size)
+    position = max(start, min_size)
+    gear = GEAR
+    for i in range(position, end):
+        state = ((state << 1) + gear[chunk[i]]) & GEAR_MODULO
+        if not state & mask:
+            return i + 1, 0, 0
+    if len(chunk) >= max_size:
+        return max_size, 0, 0
+    return None, state, max(position, end)
+
+
+def split_chunks(source, min_size, avg_size, max_size):
+    """
+    Cut a dump in content-defined chunks. Chunks end at line ends, a line
+    ends a chunk with a probability of its length divided by average size,
+    decided by a hash of the line: same lines give same boundaries whatever
+    their offset, and chunks are about average size whatever line length.
+    Lines longer than maximum size, such as extended inserts, are cut where
+    a gear rolling hash of their content says, not at fixed offsets an
+    insertion would shift.
+
+    Parameters
+    ----------
+    source: file object
+        Dump to cut, read line by line.
+    min_size: int
+        No chunk ends before this size, but the last one.
+    avg_size: int
+        Expected size of chunks.
+    max_size: int
+        Chunk is cut once it reaches this size.
+
+    Returns
+    -------
+    generator:
+        Chunks, as bytes.
+
+    """
+
+    # Rolling hash cuts about every avg_size - min_size bytes past minimum.
+    bits = max((avg_size - min_size).bit_length() - 1, 1)
+    mask = ((1 << bits) - 1) << (GEAR_BITS - bits)
+
+    chunk = bytearray()
+    state, hashed = 0, 0
+    while True:
+        line = source.readline(max_size)
+        if not line:
+            break
+        chunk += line
+
+        # Part of a line longer than maximum size.
+        if len(line) == max_size and not line.endswith(b"\n"):
+            while True:
+                cut, state, hashed = gear_cut(chunk, hashed, state, min_size, max_size, mask)
+                if cut is None:
+                    break
+                yield bytes(chunk[:cut])
+                del chunk[:cut]
+            continue
+
+        if len(chunk) >= max_size or (
+                len(chunk) >= min_size
+                and zlib.crc32(line) % avg_size < len(line)):
+            yield bytes(chunk)
+            chunk = bytearray()
+            state, hashed = 0, 0
+    if chunk:
+        yield bytes(chunk)
+
+
+class ChunkStore:
+    """
+    Class to back up dumps on sftp server as deduplicated chunks. Only
+    chunks missing on server are uploaded, then recipe of the day is.
+
+    Attributes
+    ----------
+    sftp: pysftp.Connection
+        Open connection to sftp server.
+    client: paramiko.SFTPClient
+        Channel of connection, files are renamed on it.
+    folder: string
+        Remote folder of recipes, chunks are in its CHUNK_FOLDER.
+    log_email_matt: LogEmailMattermost
+        Object to manage all logs.
+    codec: string
+        Codec compressing new chunks, key of compression_codecs.CODECS.
+    level: int
+        Compression level of codec.
+    min_size: int
+        Minimum chunk size in bytes.
+    avg_size: int
+        Average chunk size in bytes.
+    max_size: int
+        Maximum chunk size in bytes.
+
+    Methods
+    -------
+    known_chunks():
+        List chunks already on server.
+    publish(data, path):
+        Write a file atomically.
+    backup(source, entry, recipe_name):
+        Upload missing chunks of dump, then its recipe.
+    collect_garbage(recipes=None):
+        Remove chunks no recipe refers to any more.
+    restore(recipe_name, path):
+        Rebuild a dump from its recipe and chunks.
+
+    """
+
+    def __init__(self, sftp, folder, logging, options=None):
+        """
+        Constructor of the ChunkStore class.
+
+        Parameters
+        ----------
+        sftp: pysftp.Connection
+            open connection to sftp server
+        folder: string
+            remote folder of recipes
+        logging: logging object
+            object to manage logs
+        options: dict, optional
+            chunk options "min-size", "avg-size" and "max-size", and "codec"
+            and "level" of chunks.
+            Default is None, defaults are then used.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if options is None:
+            options = {}
+
+        self.sftp = sftp
+        self.client = getattr(sftp, "sftp_client", sftp)
+        self.folder = folder
+        self.log_email_matt = logging
+        self.codec = options.get("codec", DEFAULT_CODEC)
+        self.level = options.get("level", CODECS[self.codec]["presets"]["default"])
+        self.min_size = options.get("min-size", DEFAULT_MIN_SIZE)
+        self.avg_size = max(options.get("avg-size", DEFAULT_AVG_SIZE), self.min_size)
+        self.max_size = max(options.get("max-size", DEFAULT_MAX_SIZE), self.avg_size)
+
+    def known_chunks(self):
+        """
+        List chunks already on server, chunk folder is created if missing.
+        Partial chunks of an interrupted upload are not known, they are
+        uploaded again.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        dict:
+            Remote chunk filename of each chunk hash.
+
+        """
+
+        chunk_folder = posixpath.join(self.folder, CHUNK_FOLDER)
+        if not self.sftp.exists(chunk_folder):
+            self.sftp.mkdir(chunk_folder)
+            return {}
+
+        # Chunk filename is <sha256>.<codec>.
+        return {
+            name.partition(".")[0]: name
+            for name in self.sftp.listdir(chunk_folder)
+            if not name.endswith(PART_EXTENSION)
+        }
+
+    def publish(self, data, path):
+        """
+        Write a file under a .part name, then rename it to its name: a file
+        on server is always whole.
+
+        Parameters
+        ----------
+        data: bytes
+            Content of file.
+        path: string
+            Remote path of file.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.client.putfo(io.BytesIO(data), path + PART_EXTENSION)
+        TransferEngine.publish(self.client, path + PART_EXTENSION, path)
+
+    def backup(self, source, entry, recipe_name):
+        """
+        Upload missing chunks of dump, then its recipe. Recipe is uploaded
+        last so a recipe on server always has all its chunks.
+
+        Parameters
+        ----------
+        source: file object
+            Dump to back up.
+        entry: tarfile.TarInfo
+            Name, size and date of dump, stored in recipe.
+        recipe_name: string
+            Path of recipe on server, relative to folder.
+
+        Returns
+        -------
+        dict:
+            "input" dump size, "output" bytes uploaded, "chunks" and "new"
+            numbers of chunks.
+
+        Raises
+        ------
+        IOError
+            If a remote file could not be written.
+
+        """
+
+        known = self.known_chunks()
+        chunk_folder = posixpath.join(self.folder, CHUNK_FOLDER)
+        compress_block = CODECS[self.codec]["block"]
+        result = {"input": 0, "output": 0, "chunks": 0, "new": 0}
+
+        chunks = []
+        for chunk in split_chunks(source, self.min_size, self.avg_size, self.max_size):
+            digest = hashlib.sha256(chunk).hexdigest()
+            if digest not in known:
+                name = digest + "." + self.codec
+                data = compress_block(chunk, self.level)
+                self.publish(data, posixpath.join(chunk_folder, name))
+                known[digest] = name
+                result["new"] += 1
+                result["output"] += len(data)
+            chunks.append([known[digest], len(chunk)])
+            result["chunks"] += 1
+            result["input"] += len(chunk)
+
+        recipe = json.dumps(
+            {
+                "file": entry.name,
+                "size": result["input"],
+                "mtime": entry.mtime,
+                "chunks": chunks,
+            }
+        ).encode()
+        self.publish(recipe, posixpath.join(self.folder, recipe_name))
+        result["output"] += len(recipe)
+
+        return result
+
+    def collect_garbage(self, recipes=None):
+        """
+        Remove chunks no recipe on server refers to any more. Call it once
+        old recipes were removed.
+
+        Parameters
+        ----------
+        recipes: list, optional
+            Paths of recipes left on server, relative to folder. Default is
+            None, recipes are then listed in folder.
+
+        Returns
+        -------
+        int:
+            Number of chunks removed.
+
+        """
+
+        if recipes is None:
+            recipes = [
+                name for name in self.sftp.listdir(self.folder)
+                if name.endswith(RECIPE_EXTENSION)
+            ]
+
+        used = set()
+        for name in recipes:
+            with self.sftp.open(posixpath.join(self.folder, name), "rb") as recipe:
+                used.update(chunk[0] for chunk in json.loads(recipe.read())["chunks"])
+
+        chunk_folder = posixpath.join(self.folder, CHUNK_FOLDER)
+        removed = 0
+        for name in self.sftp.listdir(chunk_folder):
+            if name not in used:
+                self.sftp.remove(posixpath.join(chunk_folder, name))
+                removed += 1
+        return removed
+
+    def restore(self, recipe_name, path):
+        """
+        Rebuild a dump from its recipe and chunks, each chunk is checked
+        against its hash.
+
+        Parameters
+        ----------
+        recipe_name: string
+            Path of recipe on server, relative to folder.
+        path: string
+            Local path of rebuilt dump.
+
+        Returns
+        -------
+        None.
+
+        Raises
+        ------
+        ValueError
+            If a chunk does not match its hash.
+
+        """
+
+        with self.sftp.open(posixpath.join(self.folder, recipe_name), "rb") as recipe:
+            chunks = json.loads(recipe.read())["chunks"]
+
+        chunk_folder = posixpath.join(self.folder, CHUNK_FOLDER)
+        with open(path, "wb") as dump:
+            for name, size in chunks:
+                digest, _, codec = name.partition(".")
+                buffer = io.BytesIO()
+                self.sftp.getfo(posixpath.join(chunk_folder, name), buffer)
+                chunk = CODECS[codec]["decompress"](buffer.getvalue())
+                if len(chunk) != size or hashlib.sha256(chunk).hexdigest() != digest:
+                    raise ValueError("Chunk " + name + " is corrupted.")
+                dump.write(chunk)
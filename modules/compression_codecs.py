@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:10:05 2026
+
+-- Compression codecs available for archives --
+
+Each codec gives the extension of its archives, a writer wrapping a file
+object, a function compressing one block (used by parallel mode, concatenated
+blocks stay a valid archive), the function decompressing it, a reader
+decompressing a file object as it is read, the magic number starting each
+block and its level presets.
+
+@author: Julien
+"""
+
+import bz2
+import gzip
+import io
+import lzma
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    # zstd is only available when zstandard module is installed.
+    zstandard = None
+
+
+def gzip_writer(fileobj, level, mtime):
+    """
+    Open a gzip writer on a file object.
+
+    Parameters
+    ----------
+    fileobj: file object
+        file object compressed data is written to
+    level: int
+        compression level
+    mtime: float
+        modification time stored in gzip header
+
+    Returns
+    -------
+    gzip.GzipFile:
+        Writer.
+
+    """
+
+    return gzip.GzipFile(
+        filename="", mode="wb", compresslevel=level, fileobj=fileobj, mtime=mtime
+    )
+
+
+def gzip_block(block, level):
+    """
+    Compress one block as a standalone gzip member.
+
+    Parameters
+    ----------
+    block: bytes
+        data to compress
+    level: int
+        compression level
+
+    Returns
+    -------
+    bytes:
+        Gzip member.
+
+    """
+
+    # mtime=0 keeps members reproducible, tar entries hold real dates.
+    return gzip.compress(block, level, mtime=0)
+
+
+def gzip_reader(fileobj):
+    """
+    Open a gzip reader on a file object, members are read one after the other.
+
+    Parameters
+    ----------
+    fileobj: file object
+        file object compressed data is read from
+
+    Returns
+    -------
+    gzip.GzipFile:
+        Reader.
+
+    """
+
+    return gzip.GzipFile(fileobj=fileobj, mode="rb")
+
+
+def bz2_writer(fileobj, level, mtime):  # pylint: disable=W0613
+    """
+    Open a bzip2 writer on a file object.
+
+    Parameters
+    ----------
+    fileobj: file object
+        file object compressed data is written to
+    level: int
+        compression level
+    mtime: float
+        unused, bzip2 has no header date
+
+    Returns
+    -------
+    bz2.BZ2File:
+        Writer.
+
+    """
+
+    return bz2.BZ2File(fileobj, "wb", compresslevel=level)
+
+
+def bz2_block(block, level):
+    """
+    Compress one block as a standalone bzip2 stream.
+
+    Parameters
+    ----------
+    block: bytes
+        data to compress
+    level: int
+        compression level
+
+    Returns
+    -------
+    bytes:
+        Bzip2 stream.
+
+    """
+
+    return bz2.compress(block, level)
+
+
+def xz_writer(fileobj, level, mtime):  # pylint: disable=W0613
+    """
+    Open a xz writer on a file object.
+
+    Parameters
+    ----------
+    fileobj: file object
+        file object compressed data is written to
+    level: int
+        compression preset
+    mtime: float
+        unused, xz has no header date
+
+    Returns
+    -------
+    lzma.LZMAFile:
+        Writer.
+
+    """
+
+    return lzma.LZMAFile(fileobj, "wb", preset=level)
+
+
+def xz_block(block, level):
+    """
+    Compress one block as a standalone xz stream.
+
+    Parameters
+    ----------
+    block: bytes
+        data to compress
+    level: int
+        compression preset
+
+    Returns
+    -------
+    bytes:
+        Xz stream.
+
+    """
+
+    return lzma.compress(block, preset=level)
+
+
+def zstd_writer(fileobj, level, mtime):  # pylint: disable=W0613
+    """
+    Open a zstd writer on a file object.
+
+    Parameters
+    ----------
+    fileobj: file object
+        file object compressed data is written to
+    level: int
+        compression level
+    mtime: float
+        unused, zstd has no header date
+
+    Returns
+    -------
+    zstandard.ZstdCompressionWriter:
+        Writer, closing it does not close fileobj.
+
+    """
+
+    return zstandard.ZstdCompressor(level=level).stream_writer(fileobj, closefd=False)
+
+
+def zstd_block(block, level):
+    """
+    Compress one block as a standalone zstd frame.
+
+    Parameters
+    ----------
+    block: bytes
+        data to compress
+    level: int
+        compression level
+
+    Returns
+    -------
+    bytes:
+        Zstd frame.
+
+    """
+
+    return zstandard.ZstdCompressor(level=level).compress(block)
+
+
+def zstd_decompress(data):
+    """
+    Decompress zstd frames, one after the other.
+
+    Parameters
+    ----------
+    data: bytes
+        zstd frames
+
+    Returns
+    -------
+    bytes:
+        Data decompressed.
+
+    """
+
+    with zstandard.ZstdDecompressor().stream_reader(
+            io.BytesIO(data), read_across_frames=True) as reader:
+        return reader.read()
+
+
+def zstd_reader(fileobj):
+    """
+    Open a zstd reader on a file object, frames are read one after the other.
+
+    Parameters
+    ----------
+    fileobj: file object
+        file object compressed data is read from
+
+    Returns
+    -------
+    zstandard.ZstdDecompressionReader:
+        Reader, closing it does not close fileobj.
+
+    """
+
+    return zstandard.ZstdDecompressor().stream_reader(
+        fileobj, read_across_frames=True, closefd=False
+    )
+
+
+# Registry of codecs, by name used in config file.
+CODECS = {
+    "gzip": {
+        "extension": ".tgz",
+        "magic": b"\x1f\x8b\x08",
+        "writer": gzip_writer,
+        "block": gzip_block,
+        "decompress": gzip.decompress,
+        "reader": gzip_reader,
+        "presets": {"fast": 1, "default": 6, "best": 9},
+        "levels": (1, 9),
+        "available": True,
+    },
+    "bz2": {
+        "extension": ".tbz2",
+        "magic": b"BZh",
+        "writer": bz2_writer,
+        "block": bz2_block,
+        "decompress": bz2.decompress,
+        "reader": bz2.BZ2File,
+        "presets": {"fast": 1, "default": 9, "best": 9},
+        "levels": (1, 9),
+        "available": True,
+    },
+    "xz": {
+        "extension": ".txz",
+        "magic": b"\xfd7zXZ\x00",
+        "writer": xz_writer,
+        "block": xz_block,
+        "decompress": lzma.decompress,
+        "reader": lzma.LZMAFile,
+        "presets": {"fast": 0, "default": 6, "best": 9},
+        "levels": (0, 9),
+        "available": True,
+    },
+    "zstd": {
+        "extension": ".tzst",
+        "magic": b"\x28\xb5\x2f\xfd",
+        "writer": zstd_writer,
+        "block": zstd_block,
+        "decompress": zstd_decompress,
+        "reader": zstd_reader,
+        "presets": {"fast": 1, "default": 3, "best": 19},
+        "levels": (1, 22),
+        "available": zstandard is not None,
+    },
+}
+
+DEFAULT_CODEC = "gzip"
+
+# Errors raised by codecs on data they can not write or read, gzip and bz2
+# also raise OSError.
+CODEC_ERRORS = (OSError, EOFError, zlib.error, lzma.LZMAError) + (
+    (zstandard.ZstdError,) if zstandard is not None else ()
+)
+
+# Extensions of every codec, archives of all codecs are managed on server.
+ARCHIVE_EXTENSIONS = tuple(codec["extension"] for codec in CODECS.values())
+
+
+def get_level(codec, preset):
+    """
+    Get compression level of a codec from a preset name or a number.
+
+    Parameters
+    ----------
+    codec: string
+        Codec name, key of CODECS.
+    preset: string or int
+        "fast", "default", "best" or a level of this codec.
+
+    Returns
+    -------
+    int:
+        Compression level, None if preset is not supported by codec.
+
+    """
+
+    presets = CODECS[codec]["presets"]
+    if str(preset).lower() in presets:
+        return presets[str(preset).lower()]
+
+    try:
+        level = int(preset)
+    except (TypeError, ValueError):
+        return None
+
+    lowest, highest = CODECS[codec]["levels"]
+    if lowest <= level <= highest:
+        return level
+    return None
+
+
+def strip_extension(name):
+    """
+    Remove archive extension of any codec from a filename.
+
+    Parameters
+    ----------
+    name: string
+        Filename.
+
+    Returns
+    -------
+    string:
+        Filename without archive extension, None if it is not an archive.
+
+    """
+
+    for extension in ARCHIVE_EXTENSIONS:
+        if name.endswith(extension):
+            return name[:-len(extension)]
+    return None
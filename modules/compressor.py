@@ -0,0 +1,458 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 16:40:12 2026
+
+-- In-process tar compression engine --
+
+@author: Julien
+"""
+
+import contextlib
+import hashlib
+import os
+import tarfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, BrokenExecutor
+from modules.compression_codecs import CODECS, CODEC_ERRORS, DEFAULT_CODEC
+
+
+# Gzip level used by default, the same than tar -czf.
+DEFAULT_LEVEL = CODECS[DEFAULT_CODEC]["presets"]["default"]
+
+# Size of blocks read from dump and written to archive (1 MiB).
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+# Number of processes compressing blocks, 1 disables parallel mode.
+DEFAULT_WORKERS = 1
+
+
+class CountingFile:
+    """
+    Thin wrapper around a file object counting bytes read or written through
+    it, and hashing them if asked.
+
+    Attributes
+    ----------
+    fileobj: file object
+        Wrapped file object.
+    count: int
+        Number of bytes read or written.
+    sha256: hashlib object
+        SHA-256 of bytes read or written, None if not asked.
+
+    Methods
+    -------
+    read(size=-1):
+        Read from wrapped file object and count bytes.
+    write(data):
+        Write to wrapped file object and count bytes.
+    flush():
+        Flush wrapped file object.
+
+    """
+
+    def __init__(self, fileobj, digest=False):
+        """
+        Constructor of the CountingFile class.
+
+        Parameters
+        ----------
+        fileobj: file object
+            file object to wrap
+        digest: boolean, optional
+            True to compute SHA-256 of bytes on the fly. Default is False.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.fileobj = fileobj
+        self.count = 0
+        self.sha256 = hashlib.sha256() if digest else None
+
+    def read(self, size=-1):
+        """
+        Read from wrapped file object and count bytes.
+
+        Parameters
+        ----------
+        size: int, optional
+            Number of bytes to read. Default is -1, everything is read.
+
+        Returns
+        -------
+        bytes:
+            Data read.
+
+        """
+
+        data = self.fileobj.read(size)
+        self.count += len(data)
+        if self.sha256 is not None:
+            self.sha256.update(data)
+        return data
+
+    def write(self, data):
+        """
+        Write to wrapped file object and count bytes.
+
+        Parameters
+        ----------
+        data: bytes
+            Data to write.
+
+        Returns
+        -------
+        int:
+            Number of bytes written.
+
+        """
+
+        self.fileobj.write(data)
+        self.count += len(data)
+        if self.sha256 is not None:
+            self.sha256.update(data)
+        return len(data)
+
+    def flush(self):
+        """
+        Flush wrapped file object.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.fileobj.flush()
+
+
+class ParallelWriter:
+    """
+    Write-only file object compressing its input in a process pool, like
+    pigz: input is cut in blocks, each block is compressed as an independent
+    member (gzip member, bzip2 or xz stream, zstd frame), and members are
+    written in order. Concatenated members are a standard archive of the
+    codec, readable by any tar.
+
+    Attributes
+    ----------
+    fileobj: file object
+        Archive compressed members are written to.
+    compress_block: function
+        Codec function compressing one block.
+    level: int
+        Compression level.
+    block_size: int
+        Size in bytes of each block compressed independently.
+    pool: ProcessPoolExecutor
+        Processes compressing blocks.
+    pending: deque
+        Blocks being compressed, in archive order.
+    max_pending: int
+        Number of blocks compressed at once, bounds memory use.
+    buffer: bytearray
+        Input not yet sent to pool.
+
+    Methods
+    -------
+    write(data):
+        Buffer data and send every full block to pool.
+    submit(block):
+        Send a block to pool, write oldest members if too many are pending.
+    flush():
+        Nothing to do, blocks are written once full.
+    close():
+        Compress last block and write all pending members.
+
+    """
+
+    def __init__(self, fileobj, compress_block, level, block_size, pool, workers):
+        """
+        Constructor of the ParallelWriter class.
+
+        Parameters
+        ----------
+        fileobj: file object
+            archive compressed members are written to
+        compress_block: function
+            codec function compressing one block, it must be picklable
+        level: int
+            compression level
+        block_size: int
+            size in bytes of each block compressed independently
+        pool: ProcessPoolExecutor
+            processes compressing blocks
+        workers: int
+            number of processes in pool
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.fileobj = fileobj
+        self.compress_block = compress_block
+        self.level = level
+        self.block_size = block_size
+        self.pool = pool
+        self.pending = deque()
+        self.max_pending = 2 * workers
+        self.buffer = bytearray()
+
+    def write(self, data):
+        """
+        Buffer data and send every full block to pool.
+
+        Parameters
+        ----------
+        data: bytes
+            Data to compress.
+
+        Returns
+        -------
+        int:
+            Number of bytes written.
+
+        """
+
+        self.buffer += data
+        while len(self.buffer) >= self.block_size:
+            self.submit(bytes(self.buffer[:self.block_size]))
+            del self.buffer[:self.block_size]
+        return len(data)
+
+    def submit(self, block):
+        """
+        Send a block to pool, write oldest members if too many are pending.
+
+        Parameters
+        ----------
+        block: bytes
+            Block to compress.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.pending.append(self.pool.submit(self.compress_block, block, self.level))
+        while len(self.pending) >= self.max_pending:
+            self.fileobj.write(self.pending.popleft().result())
+
+    def flush(self):
+        """
+        Nothing to do, blocks are written once full.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+    def close(self):
+        """
+        Compress last block and write all pending members.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if self.buffer:
+            self.submit(bytes(self.buffer))
+            self.buffer = bytearray()
+        while self.pending:
+            self.fileobj.write(self.pending.popleft().result())
+        self.fileobj.flush()
+
+
+class Compressor:
+    """
+    Class to compress dump into a tar archive in-process, with tarfile and
+    the configured codec (gzip, bz2, xz or zstd), instead of a tar shell
+    command. Every compression returns its figures (input bytes, output
+    bytes, ratio, speed) or its error.
+
+    Attributes
+    ----------
+    log_email_matt: LogEmailMattermost
+        Object to manage all logs.
+    codec: string
+        Codec name, key of compression_codecs.CODECS.
+    level: int
+        Compression level of codec.
+    block_size: int
+        Size in bytes of blocks read from dump and written to archive, and of
+        blocks compressed independently in parallel mode.
+    workers: int
+        Number of processes compressing blocks, 1 disables parallel mode.
+
+    Methods
+    -------
+    compress(source, entry, target):
+        Write source as the only entry of a compressed tar archive.
+    report(result):
+        Log figures of a compression.
+
+    """
+
+    def __init__(self, logging, options=None):
+        """
+        Constructor of the Compressor class.
+
+        Parameters
+        ----------
+        logging: logging object
+            object to manage logs
+        options: dict, optional
+            compression options such as "codec", "level", "block-size" and
+            "workers".
+            Default is None, defaults are then used.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if options is None:
+            options = {}
+
+        self.log_email_matt = logging
+        self.codec = options.get("codec", DEFAULT_CODEC)
+        self.level = options.get("level", DEFAULT_LEVEL)
+        self.block_size = options.get("block-size", DEFAULT_BLOCK_SIZE)
+        self.workers = options.get("workers", DEFAULT_WORKERS)
+
+    def compress(self, source, entry, target):
+        """
+        Write source as the only entry of a compressed tar archive.
+
+        Parameters
+        ----------
+        source: file object
+            Dump to compress, read block by block.
+        entry: tarfile.TarInfo
+            Tar entry of dump, its size must be set.
+        target: string or file object
+            Path of archive to create, it is removed if compression fails.
+            Or file object archive is written to, such as a pipe to SFTP
+            server, it is left open.
+
+        Returns
+        -------
+        dict:
+            "input" and "output" sizes in bytes, "ratio" (output / input),
+            "seconds", "speed" in MB/s, "sha256" of archive, and "error", a
+            message or None.
+
+        """
+
+        start = time.monotonic()
+        reader = CountingFile(source)
+        writer = None
+        result = {
+            "input": 0,
+            "output": 0,
+            "ratio": 0.0,
+            "seconds": 0.0,
+            "speed": 0.0,
+            "sha256": None,
+            "error": None,
+        }
+
+        codec = CODECS[self.codec]
+        pool = None
+        try:
+            if isinstance(target, str):
+                output = open(target, "wb")
+            else:
+                output = contextlib.nullcontext(target)
+            with output as archive_file:
+                writer = CountingFile(archive_file, digest=True)
+                if self.workers > 1:
+                    pool = ProcessPoolExecutor(max_workers=self.workers)
+                    compressed = ParallelWriter(
+                        writer,
+                        codec["block"],
+                        self.level,
+                        self.block_size,
+                        pool,
+                        self.workers,
+                    )
+                else:
+                    compressed = codec["writer"](writer, self.level, entry.mtime)
+                with tarfile.open(
+                        fileobj=compressed,
+                        mode="w|",
+                        bufsize=self.block_size,
+                        copybufsize=self.block_size) as archive:
+                    archive.addfile(entry, reader)
+                compressed.close()
+
+        except (tarfile.TarError, zipfile.BadZipFile, BrokenExecutor) + CODEC_ERRORS as err:
+            result["error"] = str(err) or type(err).__name__
+            if isinstance(target, str) and os.path.exists(target):
+                os.remove(target)
+
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        result["input"] = reader.count
+        if result["error"] is None and writer is not None:
+            result["output"] = writer.count
+            result["sha256"] = writer.sha256.hexdigest()
+        result["seconds"] = time.monotonic() - start
+        if result["input"] > 0:
+            result["ratio"] = result["output"] / result["input"]
+        if result["seconds"] > 0:
+            result["speed"] = result["input"] / result["seconds"] / (1024 * 1024)
+
+        return result
+
+    def report(self, result):
+        """
+        Log figures of a compression.
+
+        Parameters
+        ----------
+        result: dict
+            Figures returned by compress.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.log_email_matt.info(
+            "Compress file",
+            "{} bytes to {} bytes with {} level {} (ratio {:.3f}) in {:.2f} s "
+            "({:.2f} MB/s).".format(
+                result["input"],
+                result["output"],
+                self.codec,
+                self.level,
+                result["ratio"],
+                result["seconds"],
+                result["speed"],
+            ),
+        )
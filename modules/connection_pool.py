@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 25 17:12:09 2026
+
+-- Warm connections between runs --
+
+When runs are scheduled by the daemon, connections are kept open from one run
+to the next instead of being handshaked again: HTTP connections to web server
+and to notification hook, and logged in sessions to sftp and e-mail servers.
+A session is taken by one user at a time and given back once done. Sessions
+are checked before being handed out, dead ones and those idle for too long
+are closed.
+
+@author: Julien
+"""
+
+import threading
+import time
+import urllib3
+import requests
+
+
+# Seconds an idle session is kept open.
+DEFAULT_IDLE_TIMEOUT = 300
+
+
+class ConnectionPool:
+    """
+    Class to keep connections open between runs.
+
+    Attributes
+    ----------
+    idle_timeout: int
+        Seconds an idle session is kept open.
+    managers: dict
+        urllib3.PoolManager of web server, by connections per host.
+    web: requests.Session
+        Session of notification hook, None until used.
+    idle: dict
+        Idle sessions by key, each with the time it was given back.
+    reused: int
+        Sessions handed out again.
+    lock: threading.Lock
+        Lock serialising jobs taking and giving back sessions.
+
+    Methods
+    -------
+    http(maxsize):
+        Get connection pool of web server.
+    web_session():
+        Get session of notification hook.
+    acquire(key, alive):
+        Take an idle session.
+    release(key, connection):
+        Give a session back.
+    prune():
+        Close sessions idle for too long.
+    stats():
+        Get figures of pool.
+    discard(connection):
+        Close a session.
+    close():
+        Close every connection.
+
+    """
+
+    def __init__(self, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        """
+        Constructor of the ConnectionPool class.
+
+        Parameters
+        ----------
+        idle_timeout: int, optional
+            seconds an idle session is kept open. Default is 300.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.idle_timeout = idle_timeout
+        self.managers = {}
+        self.web = None
+        self.idle = {}
+        self.reused = 0
+        self.lock = threading.Lock()
+
+    def http(self, maxsize):
+        """
+        Get connection pool of web server, shared by every run.
+
+        Parameters
+        ----------
+        maxsize: int
+            Connections kept per host.
+
+        Returns
+        -------
+        urllib3.PoolManager:
+            Connection pool.
+
+        """
+
+        with self.lock:
+            if maxsize not in self.managers:
+                self.managers[maxsize] = urllib3.PoolManager(maxsize=maxsize)
+            return self.managers[maxsize]
+
+    def web_session(self):
+        """
+        Get session of notification hook, shared by every run.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        requests.Session:
+            Session.
+
+        """
+
+        with self.lock:
+            if self.web is None:
+                self.web = requests.Session()
+            return self.web
+
+    def acquire(self, key, alive):
+        """
+        Take an idle session, dead ones are closed.
+
+        Parameters
+        ----------
+        key: tuple
+            Service, address and credentials of session.
+        alive: function
+            takes a session, returns True if it can be used.
+
+        Returns
+        -------
+        object:
+            Session, None if there is no idle one.
+
+        """
+
+        while True:
+            with self.lock:
+                sessions = self.idle.get(key)
+                if not sessions:
+                    return None
+                connection, _ = sessions.pop()
+
+            # Check is done out of lock, it may wait for server.
+            if alive(connection):
+                with self.lock:
+                    self.reused += 1
+                return connection
+            self.discard(connection)
+
+    def release(self, key, connection):
+        """
+        Give a session back, it is handed out to next user.
+
+        Parameters
+        ----------
+        key: tuple
+            Service, address and credentials of session.
+        connection: object
+            Session, with a close method.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        with self.lock:
+            self.idle.setdefault(key, []).append((connection, time.monotonic()))
+
+    def prune(self):
+        """
+        Close sessions idle for more than idle timeout.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        expired = []
+        limit = time.monotonic() - self.idle_timeout
+        with self.lock:
+            for key, sessions in self.idle.items():
+                expired.extend(connection for connection, since in sessions if since < limit)
+                self.idle[key] = [session for session in sessions if session[1] >= limit]
+        for connection in expired:
+            self.discard(connection)
+
+    def stats(self):
+        """
+        Get figures of pool.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        dict:
+            "idle" sessions and sessions "reused".
+
+        """
+
+        with self.lock:
+            return {
+                "idle": sum(len(sessions) for sessions in self.idle.values()),
+                "reused": self.reused,
+            }
+
+    @staticmethod
+    def discard(connection):
+        """
+        Close a session, errors of a dead one are ignored.
+
+        Parameters
+        ----------
+        connection: object
+            Session, with a close method.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        try:
+            connection.close()
+        except Exception:  # pylint: disable=W0703
+            pass
+
+    def close(self):
+        """
+        Close every connection, such as when config file changed.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        with self.lock:
+            sessions = [connection for idle in self.idle.values() for connection, _ in idle]
+            self.idle = {}
+            managers = list(self.managers.values())
+            self.managers = {}
+            web, self.web = self.web, None
+
+        for connection in sessions:
+            self.discard(connection)
+        for manager in managers:
+            manager.clear()
+        if web is not None:
+            web.close()
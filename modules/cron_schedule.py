@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 25 16:38:20 2026
+
+-- Cron schedule --
+
+Cron expressions of daemon jobs: minute, hour, day of month, month and day of
+week, each a "*", a value, a range "a-b", a step "*/n" or "a-b/n", or a list
+of them. Months and days of week may be named, "jan" or "mon", day of week 0
+and 7 are sunday. As in cron, when both day of month and day of week are
+restricted, a day matching either of them matches. "@hourly", "@daily",
+"@weekly", "@monthly" and "@yearly" are shorthands.
+
+@author: Julien
+"""
+
+import datetime
+
+
+# Low and high value of each field.
+FIELDS = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day", 1, 31),
+    ("month", 1, 12),
+    ("weekday", 0, 7),
+)
+
+# Names allowed in month and day of week fields.
+NAMES = {
+    "month": {
+        name: i + 1
+        for i, name in enumerate(
+            ("jan", "feb", "mar", "apr", "may", "jun",
+             "jul", "aug", "sep", "oct", "nov", "dec")
+        )
+    },
+    "weekday": {
+        name: i for i, name in enumerate(("sun", "mon", "tue", "wed", "thu", "fri", "sat"))
+    },
+}
+
+ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+}
+
+# Years searched for next run, a schedule such as "0 0 30 2 *" never runs.
+SEARCH_YEARS = 5
+
+
+class CronSchedule:
+    """
+    Class to find run times of a cron expression.
+
+    Attributes
+    ----------
+    expression: string
+        Cron expression.
+    minutes, hours, days, months, weekdays: set
+        Values matched by each field, sunday is 0.
+    any_day: boolean
+        True if day of month field starts with "*".
+    any_weekday: boolean
+        True if day of week field starts with "*".
+
+    Methods
+    -------
+    parse_field(text, field):
+        Get values matched by a field.
+    day_matches(date):
+        Check a day matches.
+    matches(moment):
+        Check a minute matches.
+    next_after(moment):
+        Get next minute matching.
+
+    """
+
+    def __init__(self, expression):
+        """
+        Constructor of the CronSchedule class.
+
+        Parameters
+        ----------
+        expression: string
+            cron expression, five fields or a shorthand.
+
+        Returns
+        -------
+        None.
+
+        Raises
+        ------
+        ValueError
+            If expression is not supported.
+
+        """
+
+        self.expression = str(expression).strip()
+        fields = ALIASES.get(self.expression.lower(), self.expression).split()
+        if len(fields) != len(FIELDS):
+            raise ValueError("Cron expression must have five fields: " + self.expression)
+
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self.parse_field(text, field) for text, field in zip(fields, FIELDS)
+        )
+        if 7 in self.weekdays:
+            self.weekdays = (self.weekdays - {7}) | {0}
+        self.any_day = fields[2].startswith("*")
+        self.any_weekday = fields[4].startswith("*")
+
+    @staticmethod
+    def parse_field(text, field):
+        """
+        Get values matched by a field.
+
+        Parameters
+        ----------
+        text: string
+            Field of cron expression.
+        field: tuple
+            Name, low and high value of field.
+
+        Returns
+        -------
+        set:
+            Values matched.
+
+        Raises
+        ------
+        ValueError
+            If field is not supported.
+
+        """
+
+        name, low, high = field
+        names = NAMES.get(name, {})
+
+        def value(part):
+            part = part.lower()
+            number = names[part] if part in names else int(part)
+            if not low <= number <= high:
+                raise ValueError(
+                    "Cron " + name + " " + part + " is not between "
+                    + str(low) + " and " + str(high) + "."
+                )
+            return number
+
+        values = set()
+        for item in text.split(","):
+            span, _, step = item.partition("/")
+            step = int(step) if step else 1
+            if step < 1:
+                raise ValueError("Cron step must be at least 1: " + item)
+
+            if span == "*":
+                first, last = low, high
+            elif "-" in span:
+                first, last = (value(part) for part in span.split("-", 1))
+            else:
+                first = value(span)
+                # "a/n" runs from a to the end of field, as in cron.
+                last = high if step > 1 else first
+            if first > last:
+                raise ValueError("Cron range is reversed: " + item)
+            values.update(range(first, last + 1, step))
+        return values
+
+    def day_matches(self, date):
+        """
+        Check a day matches day of month and day of week fields.
+
+        Parameters
+        ----------
+        date: datetime.date
+            Day.
+
+        Returns
+        -------
+        boolean:
+            True if day matches.
+
+        """
+
+        day = date.day in self.days
+        weekday = date.isoweekday() % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def matches(self, moment):
+        """
+        Check a minute matches schedule.
+
+        Parameters
+        ----------
+        moment: datetime.datetime
+            Minute.
+
+        Returns
+        -------
+        boolean:
+            True if a run is due at this minute.
+
+        """
+
+        return (
+            moment.minute in self.minutes
+            and moment.hour in self.hours
+            and moment.month in self.months
+            and self.day_matches(moment)
+        )
+
+    def next_after(self, moment):
+        """
+        Get next minute matching schedule, strictly after a moment. Months,
+        days and hours not matching are skipped whole.
+
+        Parameters
+        ----------
+        moment: datetime.datetime
+            Moment to search from.
+
+        Returns
+        -------
+        datetime.datetime:
+            Next run time, None if schedule never runs.
+
+        """
+
+        candidate = moment.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        last_year = candidate.year + SEARCH_YEARS
+        while candidate.year <= last_year:
+            if candidate.month not in self.months:
+                candidate = (candidate.replace(day=28) + datetime.timedelta(days=4)).replace(
+                    day=1, hour=0, minute=0
+                )
+            elif not self.day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + datetime.timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + datetime.timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += datetime.timedelta(minutes=1)
+            else:
+                return candidate
+        return None
@@ -0,0 +1,642 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 14:27:50 2026
+
+-- Incremental archives, binary delta against previous dump --
+
+Only signatures of the last dump sent (content-defined chunk hashes) are kept
+locally. A delta archive holds a single member: a JSON header line listing
+operations (copy a range of base dump, or take next literal bytes) followed
+by literal bytes. Its name gives the date of its base, such as
+20261910.from-20261810.tgz, so chains are known from file names.
+
+@author: Julien
+"""
+
+import datetime
+import hashlib
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+from modules.chunk_store import split_chunks, RECIPE_EXTENSION
+from modules.compression_codecs import strip_extension, CODECS
+from modules.sftp_transfer import CHECKSUM_EXTENSION, PART_EXTENSION
+
+
+# Separator between date of archive and date of its base in delta names.
+DELTA_SEPARATOR = ".from-"
+
+# Extension of the member of a delta archive, after name of dump.
+DELTA_EXTENSION = ".delta"
+
+# Local file keeping signatures of last dump sent.
+DEFAULT_STATE_FILE = "delta-state.json"
+
+# A full archive is forced once the last one is this old, in days.
+DEFAULT_FULL_EVERY = 7
+
+# Chunk sizes in bytes, smaller than dedup ones for finer deltas.
+DEFAULT_MIN_SIZE = 64 * 1024
+DEFAULT_AVG_SIZE = 256 * 1024
+DEFAULT_MAX_SIZE = 1024 * 1024
+
+# Literal bytes of a delta stay in memory up to this size (64 MiB).
+SPOOL_SIZE = 64 * 1024 * 1024
+
+
+def archive_date(file, date_format="%Y%d%m"):
+    """
+    Get date of an archive or recipe from its filename, and date of its base
+    if it is a delta archive.
+
+    Parameters
+    ----------
+    file: string
+        Filename in archive folder.
+    date_format: string, optional
+        Format of dates in filename. Default is "%Y%d%m", as archives are
+        named locally.
+
+    Returns
+    -------
+    tuple:
+        Date and base date (None if archive is full) as datetime.date, or
+        None if filename is not one of an archive, such as a checksum
+        sidecar or an unfinished upload.
+
+    """
+
+    if file.endswith((PART_EXTENSION, CHECKSUM_EXTENSION)):
+        return None
+    name = strip_extension(file)
+    if name is None and file.endswith(RECIPE_EXTENSION):
+        name = file[:-len(RECIPE_EXTENSION)]
+    date, _, base = (name or "").partition(DELTA_SEPARATOR)
+    try:
+        date = datetime.datetime.strptime(date, date_format).date()
+        base = datetime.datetime.strptime(base, date_format).date() if base else None
+    except ValueError:
+        return None
+    return date, base
+
+
+def file_date(file, date_format="%Y%d%m"):
+    """
+    Get dates of the archive or recipe a file goes with: the archive itself,
+    its checksum sidecar or its unfinished upload.
+
+    Parameters
+    ----------
+    file: string
+        Filename in archive folder.
+    date_format: string, optional
+        Format of dates in filename. Default is "%Y%d%m".
+
+    Returns
+    -------
+    tuple:
+        Date and base date as given by archive_date, None if file does not
+        go with an archive.
+
+    """
+
+    for extension in (PART_EXTENSION, CHECKSUM_EXTENSION):
+        if file.endswith(extension):
+            file = file[:-len(extension)]
+    return archive_date(file, date_format)
+
+
+def apply_delta(base, delta, target):
+    """
+    Rebuild a dump from its base dump and delta member.
+
+    Parameters
+    ----------
+    base: file object
+        Base dump, seekable.
+    delta: file object
+        Member of delta archive.
+    target: file object
+        Rebuilt dump is written to it.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    header = json.loads(delta.readline())
+    for operation in header["ops"]:
+        if operation[0] == "copy":
+            base.seek(operation[1])
+            target.write(base.read(operation[2]))
+        else:
+            target.write(delta.read(operation[1]))
+
+
+def open_archive(archive):
+    """
+    Open a full or delta archive of any codec as a tar stream, codec is
+    found from its magic number.
+
+    Parameters
+    ----------
+    archive: file object
+        Archive, at its start.
+
+    Returns
+    -------
+    tarfile.TarFile:
+        Tar stream, members are read in order.
+
+    Raises
+    ------
+    ValueError
+        If archive is not written by an available codec.
+
+    """
+
+    magic = archive.read(8)
+    archive.seek(0)
+    for codec in CODECS.values():
+        if codec["available"] and magic.startswith(codec["magic"]):
+            return tarfile.open(fileobj=codec["reader"](archive), mode="r|")
+    raise ValueError("Archive is not written by an available codec.")
+
+
+def archive_base(archive):
+    """
+    Get name of base of an archive, read from header of its delta member.
+
+    Parameters
+    ----------
+    archive: file object
+        Archive, seekable, it is put back at its start.
+
+    Returns
+    -------
+    string:
+        Local name of base archive, None if archive is full.
+
+    """
+
+    with open_archive(archive) as tar:
+        member = tar.next()
+        base = None
+        if member is not None and member.name.endswith(DELTA_EXTENSION):
+            base = json.loads(tar.extractfile(member).readline())["base"]
+    archive.seek(0)
+    return base
+
+
+def rebuild_dump(archives, target, folder=None):
+    """
+    Rebuild a dump from its full archive and the delta archives of its
+    chain, each delta is applied to the dump rebuilt by the previous one.
+
+    Parameters
+    ----------
+    archives: list
+        File objects of archives, seekable: full archive first, then each
+        delta in order.
+    target: file object
+        Rebuilt dump is written to it.
+    folder: string, optional
+        Folder of dumps rebuilt on the way. Default is None, temporary
+        folder of system.
+
+    Returns
+    -------
+    None.
+
+    Raises
+    ------
+    ValueError
+        If an archive holds no dump.
+
+    """
+
+    base = None
+    temporaries = []
+    try:
+        for position, archive in enumerate(archives):
+            if position == len(archives) - 1:
+                output = target
+            else:
+                output = tempfile.TemporaryFile(dir=folder)
+                temporaries.append(output)
+
+            with open_archive(archive) as tar:
+                member = tar.next()
+                if member is None or not member.isfile():
+                    raise ValueError("Archive holds no dump.")
+                if base is None:
+                    shutil.copyfileobj(tar.extractfile(member), output)
+                else:
+                    apply_delta(base, tar.extractfile(member), output)
+                    # Previous dump is no longer needed.
+                    base.close()
+            base = output
+            if base is not target:
+                base.seek(0)
+    finally:
+        for temporary in temporaries:
+            temporary.close()
+
+
+class SignatureReader:
+    """
+    File object reading dump through content-defined chunking, so signatures
+    of a full archive are computed while it is compressed.
+
+    Attributes
+    ----------
+    chunks: generator
+        Chunks of dump.
+    buffer: bytearray
+        Data of chunks not read yet.
+    signatures: list
+        SHA-256 and size of each chunk read.
+
+    Methods
+    -------
+    read(size=-1):
+        Read data, whole chunks are pulled from dump as needed.
+
+    """
+
+    def __init__(self, source, min_size, avg_size, max_size):
+        """
+        Constructor of the SignatureReader class.
+
+        Parameters
+        ----------
+        source: file object
+            dump to read
+        min_size: int
+            minimum chunk size in bytes
+        avg_size: int
+            average chunk size in bytes
+        max_size: int
+            maximum chunk size in bytes
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.chunks = split_chunks(source, min_size, avg_size, max_size)
+        self.buffer = bytearray()
+        self.signatures = []
+
+    def read(self, size=-1):
+        """
+        Read data, whole chunks are pulled from dump as needed.
+
+        Parameters
+        ----------
+        size: int, optional
+            Number of bytes to read, less only at end of dump. Default is -1,
+            everything is read.
+
+        Returns
+        -------
+        bytes:
+            Data read.
+
+        """
+
+        while size < 0 or len(self.buffer) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.signatures.append([hashlib.sha256(chunk).hexdigest(), len(chunk)])
+            self.buffer += chunk
+
+        if size < 0:
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+
+class ConcatFile:
+    """
+    Read-only file object joining header of delta and its literal bytes.
+
+    Attributes
+    ----------
+    files: list
+        File objects read one after the other.
+
+    Methods
+    -------
+    read(size=-1):
+        Read data, from next file once current one is exhausted.
+
+    """
+
+    def __init__(self, *files):
+        """
+        Constructor of the ConcatFile class.
+
+        Parameters
+        ----------
+        *files: file object
+            files to join, in order
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.files = list(files)
+
+    def read(self, size=-1):
+        """
+        Read data, from next file once current one is exhausted.
+
+        Parameters
+        ----------
+        size: int, optional
+            Number of bytes to read. Default is -1, everything is read.
+
+        Returns
+        -------
+        bytes:
+            Data read.
+
+        """
+
+        data = bytearray()
+        while self.files and (size < 0 or len(data) < size):
+            part = self.files[0].read(-1 if size < 0 else size - len(data))
+            if not part:
+                self.files.pop(0)
+            data += part
+        return bytes(data)
+
+
+class DeltaArchive:
+    """
+    Class to write incremental archives: a binary delta against the last
+    dump sent, or a full archive every few days or when there is no base.
+
+    Attributes
+    ----------
+    log_email_matt: LogEmailMattermost
+        Object to manage all logs.
+    state_file: string
+        Local file keeping signatures of last dump sent.
+    full_every: int
+        Days between two full archives.
+    min_size: int
+        Minimum chunk size in bytes.
+    avg_size: int
+        Average chunk size in bytes.
+    max_size: int
+        Maximum chunk size in bytes.
+    state: dict
+        Base archive name, date of its full archive and chunk signatures,
+        None if there is no usable base.
+    pending_state: dict
+        State of the archive written this run, saved once it was sent.
+
+    Methods
+    -------
+    load_state():
+        Read signatures of last dump sent.
+    base_date(today):
+        Get date of base of today's delta, None if a full archive is needed.
+    compress(compressor, source, entry, target, name):
+        Write full or delta archive of dump.
+    save_state():
+        Store signatures of archive sent this run.
+
+    """
+
+    def __init__(self, logging, options=None):
+        """
+        Constructor of the DeltaArchive class.
+
+        Parameters
+        ----------
+        logging: logging object
+            object to manage logs
+        options: dict, optional
+            incremental options such as "full-every", "state-file" and chunk
+            sizes "min-size", "avg-size" and "max-size".
+            Default is None, defaults are then used.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if options is None:
+            options = {}
+
+        self.log_email_matt = logging
+        self.state_file = options.get("state-file", DEFAULT_STATE_FILE)
+        self.full_every = options.get("full-every", DEFAULT_FULL_EVERY)
+        self.min_size = options.get("min-size", DEFAULT_MIN_SIZE)
+        self.avg_size = max(options.get("avg-size", DEFAULT_AVG_SIZE), self.min_size)
+        self.max_size = max(options.get("max-size", DEFAULT_MAX_SIZE), self.avg_size)
+        self.state = self.load_state()
+        self.pending_state = None
+
+    def load_state(self):
+        """
+        Read signatures of last dump sent.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        dict:
+            State, None if missing or unreadable.
+
+        """
+
+        try:
+            with open(self.state_file, "r") as state_file:
+                state = json.load(state_file)
+            datetime.date.fromisoformat(state["full"])
+            if not isinstance(state["base"], str) or not isinstance(state["chunks"], list):
+                raise ValueError()
+            return state
+
+        except FileNotFoundError:
+            return None
+
+        except (OSError, KeyError, TypeError, ValueError):
+            self.log_email_matt.warning(
+                "Compress file", "Delta state is unreadable, a full archive is made."
+            )
+            return None
+
+    def base_date(self, today):
+        """
+        Get date of base of today's delta, None if a full archive is needed:
+        there is no base, last full archive is too old or base is today's.
+
+        Parameters
+        ----------
+        today: datetime.date
+            Date of today's archive.
+
+        Returns
+        -------
+        datetime.date:
+            Date of base archive, or None.
+
+        """
+
+        if self.state is None:
+            return None
+
+        full = datetime.date.fromisoformat(self.state["full"])
+        if (today - full).days >= self.full_every:
+            return None
+
+        name = strip_extension(self.state["base"]) or ""
+        try:
+            base = datetime.datetime.strptime(
+                name.partition(DELTA_SEPARATOR)[0], "%Y%d%m"
+            ).date()
+        except ValueError:
+            return None
+        return base if base < today else None
+
+    def compress(self, compressor, source, entry, target, name):
+        """
+        Write full or delta archive of dump, depending on its name.
+
+        Parameters
+        ----------
+        compressor: Compressor
+            Engine writing archive.
+        source: file object
+            Dump to archive.
+        entry: tarfile.TarInfo
+            Tar entry of dump.
+        target: string or file object
+            Archive path or file object, see Compressor.compress.
+        name: string
+            Archive name, a delta if it holds DELTA_SEPARATOR.
+
+        Returns
+        -------
+        dict:
+            Figures of Compressor.compress.
+
+        """
+
+        today = datetime.datetime.now().date()
+        if DELTA_SEPARATOR not in name:
+            reader = SignatureReader(source, self.min_size, self.avg_size, self.max_size)
+            result = compressor.compress(reader, entry, target)
+            self.pending_state = {
+                "base": name,
+                "full": today.isoformat(),
+                "chunks": reader.signatures,
+            }
+            return result
+
+        base = {}
+        offset = 0
+        for digest, size in self.state["chunks"]:
+            base.setdefault(digest, (offset, size))
+            offset += size
+
+        operations = []
+        signatures = []
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as literals:
+            for chunk in split_chunks(source, self.min_size, self.avg_size, self.max_size):
+                digest = hashlib.sha256(chunk).hexdigest()
+                signatures.append([digest, len(chunk)])
+                if digest in base:
+                    start, size = base[digest]
+                    last = operations[-1] if operations else None
+                    if last and last[0] == "copy" and last[1] + last[2] == start:
+                        last[2] += size
+                    else:
+                        operations.append(["copy", start, size])
+                else:
+                    literals.write(chunk)
+                    if operations and operations[-1][0] == "data":
+                        operations[-1][1] += len(chunk)
+                    else:
+                        operations.append(["data", len(chunk)])
+
+            header = (
+                json.dumps(
+                    {
+                        "base": self.state["base"],
+                        "file": entry.name,
+                        "size": sum(size for _, size in signatures),
+                        "ops": operations,
+                    }
+                )
+                + "\n"
+            ).encode()
+
+            delta_entry = tarfile.TarInfo(entry.name + DELTA_EXTENSION)
+            delta_entry.mode = entry.mode
+            delta_entry.mtime = entry.mtime
+            delta_entry.size = len(header) + literals.tell()
+            literals.seek(0)
+
+            self.log_email_matt.info(
+                "Compress file",
+                "Delta against {}: {} of {} bytes changed.".format(
+                    self.state["base"],
+                    delta_entry.size - len(header),
+                    sum(size for _, size in signatures),
+                ),
+            )
+            result = compressor.compress(
+                ConcatFile(io.BytesIO(header), literals), delta_entry, target
+            )
+
+        self.pending_state = {
+            "base": name,
+            "full": self.state["full"],
+            "chunks": signatures,
+        }
+        return result
+
+    def save_state(self):
+        """
+        Store signatures of archive sent this run, it becomes base of next
+        delta. Call it only once archive is on server.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if self.pending_state is None:
+            return
+
+        try:
+            temporary = self.state_file + ".tmp"
+            with open(temporary, "w") as state_file:
+                json.dump(self.pending_state, state_file)
+            os.replace(temporary, self.state_file)
+
+        except OSError:
+            self.log_email_matt.warning(
+                "Compress file", "Delta state could not be saved, next archive is full."
+            )
@@ -46,13 +46,19 @@ class EMail:
         E-mail title
     dest: array of strings
         All e-mail addresses to send e-mail.
+    pool: ConnectionPool
+        Connections kept open between runs of daemon, None outside daemon.
 
     Methods
     -------
     login():
         Log-in server.
-    login_and_send():
+    login_and_send(logged_in=False):
         Log-in server and send e-mail to all destination e-mail addresses.
+    pool_key():
+        Get key of smtp session in pool.
+    alive(server):
+        Check a smtp session still answers.
     smtp_server():
         Send e-mail via smtp server.
     internal_server():
@@ -68,7 +74,7 @@ class EMail:
 
     """
 
-    def __init__(self, json_, log):
+    def __init__(self, json_, log, pool=None):
 
         """
         Constructor to build the mail instance
@@ -79,10 +85,13 @@ class EMail:
             Contains all e-mail parameters in config file.
         log: LogEmailMattermost
             Object to manage all logs.
+        pool: ConnectionPool, optional
+            Connections kept open between runs of daemon. Default is None.
 
         """
 
         self.server = None
+        self.pool = pool
         self.email_content = []
 
         self.critical_nb = 0
@@ -228,12 +237,15 @@ E-mails not sent.",
 E-mail(s) not sent.",
             )
 
-    def login_and_send(self):
+    def login_and_send(self, logged_in=False):
         """
         Log-in to e-mail account and send e-mail to all valid e-mails destinations.
 
         Parameters
         ----------
+        logged_in: boolean, optional
+            True if session of a previous run is already logged in. Default
+            is False.
 
         Returns
         -------
@@ -241,9 +253,11 @@ E-mail(s) not sent.",
 
         """
 
+        sent = False
         try:
             # Log-in e-mail server.
-            self.login()
+            if not logged_in:
+                self.login()
 
             # Create a MIME message that will be send. Use MIME type to attach log file if needed.
             msg = MIMEMultipart()
@@ -260,13 +274,10 @@ E-mail(s) not sent.",
             # Convert the MIME message into string to send it as a string
             # to all destination e-mails.
             self.server.sendmail(self.auth["email"], self.dest, msg.as_string())
+            sent = True
 
             self.log_email_matt.info("Sending e-mails")
 
-            # Close the server connection after using resources.
-            if self.server is not None:
-                self.server.quit()
-
         except smtplib.SMTPRecipientsRefused:
             self.log_email_matt.warning(
                 "Sending e-mails",
@@ -303,9 +314,62 @@ at your server. E-mails not sent.",
 Email(s) not sent.",
             )
 
+        finally:
+            # Close the server connection after using resources. Daemon keeps
+            # it for next run, unless sending failed: it may be broken.
+            if self.pool is not None and sent:
+                self.pool.release(self.pool_key(), self.server)
+            elif self.pool is not None:
+                self.pool.discard(self.server)
+            else:
+                try:
+                    self.server.quit()
+                except (smtplib.SMTPException, OSError):
+                    self.server.close()
+            self.server = None
+
+    def pool_key(self):
+        """
+        Get key of smtp session in pool.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        tuple:
+            Server, port and account of session.
+
+        """
+
+        return ("smtp", self.ip_server, self.port, self.auth["email"], self.auth["password"])
+
+    @staticmethod
+    def alive(server):
+        """
+        Check a smtp session kept from a previous run still answers.
+
+        Parameters
+        ----------
+        server: smtplib.SMTP_SSL
+            Session.
+
+        Returns
+        -------
+        boolean:
+            True if session can be used, else False.
+
+        """
+
+        try:
+            return server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
     def smtp_server(self):
         """
         Create a secure connection to SMTP server to send e-mails from external server.
+        Daemon reuses session of a previous run, already logged in.
 
         Parameters
         ----------
@@ -316,6 +380,12 @@ Email(s) not sent.",
 
         """
 
+        if self.pool is not None:
+            self.server = self.pool.acquire(self.pool_key(), self.alive)
+            if self.server is not None:
+                self.login_and_send(True)
+                return
+
         # Create a secure SSL context
         context = ssl.create_default_context()
 
@@ -13,11 +13,80 @@ data = {
     "zip": "my_zip",
     "file": "dumpfile",
     "time-to-save": "1",
-    "sftp": {
-        "ip": "my_sftp_ip",
-        "user": "my_sftp_user",
-        "password": "my_sftp_password",
+    "sftp": [
+        {
+            "name": "main",
+            "ip": "my_sftp_ip",
+            "user": "my_sftp_user",
+            "password": "my_sftp_password",
+            "folder": "TSE-INFORX",
+            "layout": "flat",
+            "manifest": "yes",
+            "server-hash": "yes",
+            "keepalive": "30",
+        },
+    ],
+    "transfer": {
+        "window-size": "16777216",
+        "max-packet-size": "32768",
+        "block-size": "1048576",
+        "buffer-size": "1048576",
+        "pipelined": "yes",
+        "resume": "yes",
     },
+    "retention": {
+        "keep-daily": "0",
+        "keep-weekly": "0",
+        "keep-monthly": "0",
+        "max-bytes": "0",
+        "delete-window": "64",
+    },
+    "download": {
+        "chunk-size": "1048576",
+        "resume": "yes",
+        "probe": "yes",
+        "retries": "3",
+        "segments": "1",
+        "segment-size": "16777216",
+    },
+    "compression": {
+        "transcode": "yes",
+        "codec": "gzip",
+        "preset": "default",
+        "days": {},
+        "block-size": "1048576",
+        "workers": "1",
+        "stream": "no",
+        "stream-buffer": "8388608",
+        "split-tables": "no",
+    },
+    "dedup": {
+        "enabled": "no",
+        "min-size": "262144",
+        "avg-size": "1048576",
+        "max-size": "4194304",
+    },
+    "incremental": {
+        "enabled": "no",
+        "full-every": "7",
+        "min-size": "65536",
+        "avg-size": "262144",
+        "max-size": "1048576",
+    },
+    "pool": {
+        "workers": "4",
+        "download": "2",
+        "compress": "1",
+        "upload": "2",
+        "queue-size": "1",
+    },
+    "daemon": {
+        "schedule": "@daily",
+        "socket": "daemon.sock",
+        "reload-interval": "5",
+        "idle-timeout": "300",
+    },
+    "jobs": [],
     "email": {
         "send-emails": "yes",
         "auth": {"email": "exemple@exemple.com", "password": "my_password_for_mail"},
@@ -0,0 +1,601 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 24 10:27:52 2026
+
+-- Pool of backup jobs --
+
+Config file may hold a "jobs" bracket: a list of jobs, each with its own zip,
+dump, time to save, retention, destinations and any other bracket overriding
+main ones. Jobs go through download, compression and upload stages of a
+pipeline, connected by bounded queues: a job downloads while another
+compresses and a third uploads. Workers of each stage, queue sizes and jobs
+in pipeline are bounded. Every job logs into the same log file, e-mail and
+notification, tagged with its name: one report is sent per run, with figures
+of each stage to tune them.
+
+@author: Julien
+"""
+
+import json
+import os
+import posixpath
+import re
+import threading
+from modules.log_email_mattermost import LogEmailMattermost
+from modules.scripting_system import ScriptingSystem
+from modules.sftp_fanout import SFTPFanout, DestinationLog
+from modules.sftp_server import DEFAULT_FOLDER
+from modules.stage_pipeline import Stage, StagePipeline
+
+
+# Jobs in pipeline at the same time.
+DEFAULT_WORKERS = 4
+
+# Jobs in each stage at the same time.
+DEFAULT_STAGE_LIMITS = {"download": 2, "compress": 1, "upload": 2}
+
+# Jobs waiting for each stage at most.
+DEFAULT_QUEUE_SIZE = 1
+
+# Local folder of job folders, in current folder.
+JOBS_FOLDER = "jobs"
+
+
+class JobLog(DestinationLog):
+    """
+    Logs of one job: action names are prefixed with job name, calls of
+    concurrent jobs are serialised.
+
+    Attributes
+    ----------
+    warning_nb: int
+        Number of warnings of this job.
+
+    Methods
+    -------
+    tag(current_action):
+        Add job name to action name.
+    warning(current_action, message=None):
+        Log warning.
+
+    """
+
+    def __init__(self, logging, name, lock):
+        """
+        Constructor of the JobLog class.
+
+        Parameters
+        ----------
+        logging: logging object
+            object to manage logs
+        name: string
+            job name, None to leave action names as they are
+        lock: threading.Lock
+            lock shared by every job
+
+        Returns
+        -------
+        None.
+
+        """
+
+        super().__init__(logging, name, lock)
+        self.warning_nb = 0
+
+    def tag(self, current_action):
+        """
+        Add job name to action name.
+
+        Parameters
+        ----------
+        current_action: string
+            Action name.
+
+        Returns
+        -------
+        string:
+            Tagged action name.
+
+        """
+
+        if self.name is None:
+            return current_action
+        return "[" + self.name + "] " + current_action
+
+    def warning(self, current_action, message=None):
+        """
+        Log warning.
+
+        Parameters
+        ----------
+        current_action: string
+            Action name.
+        message: string, optional
+            Message. The default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        with self.lock:
+            self.warning_nb += 1
+        super().warning(current_action, message)
+
+
+def download_stage(job):
+    """
+    Download zip of a job, then extract its dump.
+
+    Parameters
+    ----------
+    job: dict
+        "script" (ScriptingSystem, configured) and "log" (JobLog) of job.
+
+    Returns
+    -------
+    dict:
+        Job, None if it is done.
+
+    """
+
+    script = job["script"]
+    script.request_zip()
+
+    # Zip did not change since last run, nothing new to archive.
+    if script.zip_not_modified:
+        script.clean(None)
+        return None
+
+    # Probe showed dump is missing or stale, zip was not downloaded.
+    # When transcoding, dump is read straight from zip while compressing.
+    if not script.download_skipped and not script.compression_options["transcode"]:
+        script.extract_zip()
+    return job
+
+
+def compress_stage(job):
+    """
+    Compress dump of a job into an archive, unless it is streamed.
+
+    Parameters
+    ----------
+    job: dict
+        "script" (ScriptingSystem, configured) and "log" (JobLog) of job.
+
+    Returns
+    -------
+    dict:
+        Job, with "is_date_ok", None if it is done.
+
+    """
+
+    script = job["script"]
+    if not script.zip_has_file():
+        finish_job(job)
+        return None
+
+    # When streaming, archive is compressed while it is sent to server, in
+    # upload stage. In dedup mode, chunks of dump are sent instead of an
+    # archive.
+    streamed = script.compression_options["stream"] or script.dedup_options["enabled"]
+    if not script.download_skipped and not streamed:
+        script.compress_to_tgz()
+
+    # File date is not the same than before - file has been changed today
+    job["is_date_ok"] = script.compare_date()
+    return job
+
+
+def upload_stage(job):
+    """
+    Check archives of every destination, send archive of a job, check its
+    ACK.
+
+    Parameters
+    ----------
+    job: dict
+        "script" (ScriptingSystem, configured), "log" (JobLog) and
+        "is_date_ok" of job.
+
+    Returns
+    -------
+    dict:
+        Job.
+
+    """
+
+    script = job["script"]
+    is_date_ok = job["is_date_ok"]
+
+    # SFTP server area, archive is sent to every destination at once.
+    destinations = []
+    for destination in script.destinations:
+        sftp_options = dict(destination, transfer=script.transfer_options, pool=script.pool)
+        if script.dedup_options["enabled"]:
+            sftp_options["dedup"] = dict(
+                script.dedup_options,
+                codec=script.compression_options["codec"],
+                level=script.compression_options["level"],
+            )
+        destinations.append(sftp_options)
+
+    sftp = SFTPFanout(
+        destinations,
+        script.log_email_matt,
+        is_date_ok,
+        script.compression_options["stream-buffer"],
+    )
+    job["sftp"] = sftp
+
+    sftp.archival_check()
+
+    if is_date_ok:
+        job["sent"] = True
+        if script.dedup_options["enabled"]:
+            sftp.send_chunks(script.tgz_name, script.open_dump)
+        elif script.compression_options["stream"]:
+            sftp.stream_to_sftp_server(
+                script.tgz_name,
+                script.compress_to_tgz,
+                script.compression_options["stream-buffer"],
+            )
+        else:
+            sftp.send_to_sftp_server(
+                script.tgz_name, script.workdir + "/" + script.tgz_name
+            )
+        sftp.check_file_ack(script.tgz_name, script.archive_digest)
+
+    sftp.report()
+
+    finish_job(job)
+    return job
+
+
+def finish_job(job):
+    """
+    Save states of a job for next run if it went without error, then clean
+    its folder.
+
+    Parameters
+    ----------
+    job: dict
+        "script" (ScriptingSystem, configured), "log" (JobLog), and "sftp"
+        and "sent" once uploaded, of job.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    script = job["script"]
+
+    # Next run will only download zip if it changed since this one.
+    if script.log_email_matt.error_nb == 0:
+        script.save_download_state()
+        # Next delta archive is made against the dump sent today.
+        if job.get("sent", False):
+            script.save_incremental_state()
+
+    script.clean(job.get("sftp"))
+
+
+class JobPool:
+    """
+    Class to run every job of config file on a bounded pool of workers.
+
+    Attributes
+    ----------
+    port: int
+        Port used to connect to web server.
+    config: string
+        Configuration filename.
+    critical_nb: int
+        Number of critical occured while reading config file or jobs.
+    log_email_matt: LogEmailMattermost
+        Object to manage logs, e-mail and notification of every job.
+    jobs: list
+        Job of each worker, brackets overriding main ones, with a "name".
+    workers: int
+        Jobs in pipeline at the same time.
+    stages: dict
+        Workers of "download", "compress" and "upload" stages.
+    queue_size: int
+        Jobs waiting for each stage at most.
+    lock: threading.Lock
+        Lock serialising logs of jobs.
+    pool: ConnectionPool
+        Connections kept open between runs of daemon, None outside daemon.
+
+    Methods
+    -------
+    get_configuration():
+        Read jobs and pool bracket of config file.
+    run(jobs=None):
+        Run every job, then send one report.
+    prepare_job(job):
+        Configure one job.
+    stop_job(stage, job, err):
+        Log a job stopped by an exception.
+    report(logs):
+        Log outcome of every job.
+
+    """
+
+    def __init__(self, port_, config_, pool_=None):
+        """
+        Constructor of the JobPool class.
+
+        Parameters
+        ----------
+        port_: int
+            port to use to connect to web server
+        config_: string
+            configuration filename
+        pool_: ConnectionPool, optional
+            connections kept open between runs of daemon. Default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.port = port_
+        self.config = config_
+        self.critical_nb = 0
+        self.log_email_matt = None
+        self.jobs = []
+        self.workers = DEFAULT_WORKERS
+        self.stages = dict(DEFAULT_STAGE_LIMITS)
+        self.queue_size = DEFAULT_QUEUE_SIZE
+        self.lock = threading.Lock()
+        self.pool = pool_
+
+    def get_configuration(self):
+        """
+        Read jobs and pool bracket of config file. Without jobs bracket, main
+        brackets are the only job. A job without sftp bracket sends to main
+        destinations, in a sub folder named after it.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.log_email_matt = LogEmailMattermost()
+
+        try:
+            with open(self.config, "r") as json_config:
+                data = json.load(json_config)
+            self.log_email_matt = LogEmailMattermost(
+                data["email"], data["notification"], self.pool
+            )
+
+        except json.JSONDecodeError:
+            self.log_email_matt.critical(
+                "JSON read",
+                "Config file need correct values. \
+There must be JSON compile error(s) in config file.",
+            )
+            self.critical_nb += 1
+            return
+
+        except KeyError as err:
+            self.log_email_matt.critical(
+                "JSON read",
+                "Missing keyword '"
+                + err.args[0]
+                + "' in main bracket in config file. \
+To be sure to have all keywords, please regenerate config file template.",
+            )
+            self.critical_nb += 1
+            return
+
+        except EnvironmentError:
+            self.log_email_matt.critical("JSON read", "Config file could not be read.")
+            self.critical_nb += 1
+            return
+
+        # Pool options are checked as any other bracket.
+        options = ScriptingSystem(self.port, self.config)
+        options.log_email_matt = self.log_email_matt
+        pool = options.get_options(
+            "Pool",
+            data.get("pool", {}),
+            dict(
+                DEFAULT_STAGE_LIMITS,
+                workers=DEFAULT_WORKERS,
+                **{"queue-size": DEFAULT_QUEUE_SIZE}
+            ),
+        )
+        self.workers = pool["workers"]
+        self.stages = {stage: pool[stage] for stage in DEFAULT_STAGE_LIMITS}
+        self.queue_size = pool["queue-size"]
+
+        jobs = data.get("jobs") or []
+        if not isinstance(jobs, list) or not all(isinstance(job, dict) for job in jobs):
+            self.log_email_matt.critical("JSON read", "Jobs bracket must be a list of jobs.")
+            self.critical_nb += 1
+            return
+
+        if not jobs:
+            # Main brackets are the only job, in current folder.
+            self.jobs = [{"name": None}]
+            return
+
+        names = set()
+        for i, job in enumerate(jobs):
+            name = str(job.get("name", job.get("zip", "job-" + str(i + 1))))
+            if name in names:
+                self.log_email_matt.critical(
+                    "JSON read", "Job name '" + name + "' is used twice."
+                )
+                self.critical_nb += 1
+                return
+            names.add(name)
+
+            job = dict(job, name=name)
+            if "sftp" not in job and "sftp" in data:
+                destinations = data["sftp"]
+                if not isinstance(destinations, list):
+                    destinations = [destinations]
+                job["sftp"] = [
+                    dict(
+                        destination,
+                        folder=posixpath.join(
+                            destination.get("folder", DEFAULT_FOLDER), name
+                        ),
+                    )
+                    if isinstance(destination, dict)
+                    else destination
+                    for destination in destinations
+                ]
+            self.jobs.append(job)
+
+    def run(self, jobs=None):
+        """
+        Configure every job, run them through the pipeline, then send one
+        report. As before jobs, a lone job whose config is wrong sends
+        nothing.
+
+        Parameters
+        ----------
+        jobs: list, optional
+            jobs to run, among jobs of config file. Default is None, every
+            job.
+
+        Returns
+        -------
+        list:
+            JobLog of each job run.
+
+        """
+
+        if self.critical_nb > 0:
+            return []
+
+        if jobs is None:
+            jobs = self.jobs
+        jobs = [self.prepare_job(job) for job in jobs]
+
+        if len(jobs) == 1 and self.critical_nb > 0:
+            return []
+
+        pipeline = StagePipeline(
+            [
+                Stage(name, function, self.stages[name], self.queue_size)
+                for name, function in (
+                    ("download", download_stage),
+                    ("compress", compress_stage),
+                    ("upload", upload_stage),
+                )
+            ],
+            self.log_email_matt,
+            self.workers,
+            self.stop_job,
+        )
+        pipeline.run([job for job in jobs if job["script"] is not None])
+
+        logs = [job["log"] for job in jobs]
+        self.report(logs)
+        if len(jobs) > 1:
+            pipeline.report()
+        self.log_email_matt.send_all()
+        return logs
+
+    def prepare_job(self, job):
+        """
+        Configure one job, in its own local folder when there are several
+        jobs.
+
+        Parameters
+        ----------
+        job: dict
+            brackets overriding main ones, with a "name".
+
+        Returns
+        -------
+        dict:
+            "script" (ScriptingSystem, None if its config is wrong) and "log"
+            (JobLog) of job.
+
+        """
+
+        name = job["name"]
+        log = JobLog(self.log_email_matt, name, self.lock)
+
+        workdir = None
+        if name is not None:
+            workdir = os.path.join(
+                os.getcwd(), JOBS_FOLDER, re.sub(r"[^\w.-]", "_", name)
+            )
+            os.makedirs(workdir, exist_ok=True)
+        job = {key: value for key, value in job.items() if key != "name"}
+
+        script = ScriptingSystem(self.port, self.config, workdir, self.pool)
+        script.get_configuration(job, log)
+        if script.critical_nb > 0:
+            self.critical_nb += script.critical_nb
+            script = None
+        return {"script": script, "log": log}
+
+    @staticmethod
+    def stop_job(stage, job, err):
+        """
+        Log a job stopped by an exception, then clean its folder. Other jobs
+        go on.
+
+        Parameters
+        ----------
+        stage: string
+            Name of stage job was in.
+        job: dict
+            "script" (ScriptingSystem) and "log" (JobLog) of job.
+        err: Exception
+            Exception raised.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        job["log"].error("Job", "Job stopped in " + stage + " stage. " + repr(err))
+        job["script"].clean(job.get("sftp"))
+
+    def report(self, logs):
+        """
+        Log outcome of every job, when there are several.
+
+        Parameters
+        ----------
+        logs: list
+            JobLog of each job.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if len(logs) < 2:
+            return
+
+        for log in logs:
+            self.log_email_matt.info(
+                "Jobs",
+                "{}: {} error(s), {} warning(s).".format(
+                    log.name, log.error_nb, log.warning_nb
+                ),
+            )
+        succeeded = sum(log.error_nb == 0 for log in logs)
+        self.log_email_matt.info(
+            "Jobs", "{} of {} job(s) without error.".format(succeeded, len(logs))
+        )
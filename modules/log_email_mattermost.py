@@ -49,7 +49,7 @@ class LogEmailMattermost:
 
     """
 
-    def __init__(self, email_config=None, notification=None):
+    def __init__(self, email_config=None, notification=None, pool=None):
         """
         Initialize log, e-mail content and notification content.
 
@@ -61,6 +61,8 @@ class LogEmailMattermost:
         notification: string (enum type), optional
             Always, never or error to know when send mattermost notification.
             Default is None.
+        pool: ConnectionPool, optional
+            connections kept open between runs of daemon. Default is None.
 
         Returns
         -------
@@ -90,7 +92,7 @@ class LogEmailMattermost:
             # notification or not
             self.send_notification = notification
             # Initialize mattermost notification.
-            self.mattermost = Mattermost(self)
+            self.mattermost = Mattermost(self, pool)
             if notification not in ("always", "error", "never"):
                 self.send_notification = "always"
                 self.warning(
@@ -103,7 +105,7 @@ class LogEmailMattermost:
 
         if email_config is not None:
             # Initialize e-mail object.
-            self.email = EMail(email_config, self)
+            self.email = EMail(email_config, self, pool)
             # If an error occured in the constructor of e-mail,
             # then affect None to this variable to prevent default.
             if self.email.critical_nb > 0:
@@ -25,6 +25,8 @@ class Mattermost:
         url to send notification
     mattermost_content: dict
         content of the notification
+    pool: ConnectionPool
+        connections kept open between runs of daemon, None outside daemon.
 
     Methods
     -------
@@ -39,7 +41,7 @@ class Mattermost:
 
     """
 
-    def __init__(self, logs):
+    def __init__(self, logs, pool=None):
         """
         Constructor. Initialize all attributes.
 
@@ -47,6 +49,8 @@ class Mattermost:
         ----------
         logs: log object
             Object to manage all logs, log file, e-mail and mattermost notification.
+        pool: ConnectionPool, optional
+            connections kept open between runs of daemon. Default is None.
 
         Returns
         -------
@@ -55,6 +59,7 @@ class Mattermost:
         """
 
         self.log_email_matt = logs
+        self.pool = pool
 
         self.hooks = (
             "https://chat.telecomste.fr/" + "hooks/" + "otnp6d3trpf3peo1gdinzq77gh"
@@ -166,8 +171,10 @@ class Mattermost:
         }
 
         try:
-            # Post request on Mattermost TSE server
-            req = requests.post(self.hooks, json=payload)
+            # Post request on Mattermost TSE server, on the session of
+            # previous runs when run by daemon.
+            session = requests if self.pool is None else self.pool.web_session()
+            req = session.post(self.hooks, json=payload)
             # Raise error if request was not accepted.
             req.raise_for_status()
 
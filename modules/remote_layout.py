@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Oct 22 10:12:46 2026
+
+-- Layout of archives on sftp server --
+
+In flat layout, archives are all in remote folder, named YYYYDDMM as they are
+locally. In dated layout, they are stored in year and month partitions,
+YYYY/MM, and named YYYYMMDD so that names sort by date: path of an archive is
+known without listing, and retention only lists partitions reaching its
+horizon, older ones are dropped whole.
+
+@author: Julien
+"""
+
+import datetime
+import posixpath
+from modules.delta_archive import file_date, DELTA_SEPARATOR
+from modules.retention import archive_index
+
+
+# Every archive in remote folder, dates of local names.
+FLAT = "flat"
+
+# Archives in YYYY/MM partitions of remote folder, sortable dates.
+DATED = "dated"
+
+LAYOUTS = (FLAT, DATED)
+
+# Date format of archive names in each layout.
+DATE_FORMATS = {FLAT: "%Y%d%m", DATED: "%Y%m%d"}
+
+
+class RemoteLayout:
+    """
+    Class to place archives in remote folder.
+
+    Attributes
+    ----------
+    folder: string
+        Remote folder of archives.
+    layout: string
+        "flat" or "dated".
+    date_format: string
+        Date format of archive names on server.
+    created: set
+        Partitions known to exist, not created again.
+
+    Methods
+    -------
+    remote_name(name):
+        Get name of an archive on server.
+    relative(name):
+        Get path of an archive in remote folder.
+    path(name):
+        Get remote path of an archive.
+    partition(date):
+        Get partition of a date.
+    prepare(sftp, name):
+        Create partition of an archive.
+    partitions(sftp):
+        List partitions of remote folder.
+    listing(sftp):
+        List files of every partition.
+    index(sftp, horizon):
+        Index archives retention has to decide on.
+    month_end(first):
+        Get last day of a month.
+
+    """
+
+    def __init__(self, folder, layout=FLAT):
+        """
+        Constructor of the RemoteLayout class.
+
+        Parameters
+        ----------
+        folder: string
+            remote folder of archives.
+        layout: string, optional
+            "flat" or "dated". Default is "flat".
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.folder = folder
+        self.layout = layout if layout in LAYOUTS else FLAT
+        self.date_format = DATE_FORMATS[self.layout]
+        self.created = set()
+
+    def remote_name(self, name):
+        """
+        Get name of an archive, recipe or sidecar on server: in dated layout,
+        its dates, and the one of its base, are written YYYYMMDD.
+
+        Parameters
+        ----------
+        name: string
+            Local name, dates written YYYYDDMM.
+
+        Returns
+        -------
+        string:
+            Name on server.
+
+        """
+
+        dates = file_date(name)
+        if self.layout == FLAT or dates is None:
+            return name
+
+        date, base = dates
+        local = DATE_FORMATS[FLAT]
+        name = date.strftime(self.date_format) + name[len(date.strftime(local)):]
+        if base is not None:
+            name = name.replace(
+                DELTA_SEPARATOR + base.strftime(local),
+                DELTA_SEPARATOR + base.strftime(self.date_format),
+                1,
+            )
+        return name
+
+    def relative(self, name):
+        """
+        Get path of an archive in remote folder.
+
+        Parameters
+        ----------
+        name: string
+            Local name.
+
+        Returns
+        -------
+        string:
+            Path relative to remote folder.
+
+        """
+
+        dates = file_date(name)
+        if self.layout == FLAT or dates is None:
+            return name
+        return posixpath.join(self.partition(dates[0]), self.remote_name(name))
+
+    def path(self, name):
+        """
+        Get remote path of an archive, without listing server.
+
+        Parameters
+        ----------
+        name: string
+            Local name.
+
+        Returns
+        -------
+        string:
+            Path relative to login folder.
+
+        """
+
+        return posixpath.join(self.folder, self.relative(name))
+
+    @staticmethod
+    def partition(date):
+        """
+        Get partition of a date.
+
+        Parameters
+        ----------
+        date: datetime.date
+            Archive date.
+
+        Returns
+        -------
+        string:
+            YYYY/MM.
+
+        """
+
+        return date.strftime("%Y/%m")
+
+    def prepare(self, sftp, name):
+        """
+        Create partition of an archive if it does not exist yet.
+
+        Parameters
+        ----------
+        sftp: pysftp.Connection or paramiko.SFTPClient
+            session to sftp server.
+        name: string
+            Local name.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        folder = posixpath.dirname(self.path(name))
+        if folder == self.folder or folder in self.created:
+            return
+
+        parent = self.folder
+        for part in posixpath.relpath(folder, self.folder).split("/"):
+            parent = posixpath.join(parent, part)
+            try:
+                sftp.stat(parent)
+            except IOError:
+                sftp.mkdir(parent)
+        self.created.add(folder)
+
+    def partitions(self, sftp):
+        """
+        List partitions of remote folder.
+
+        Parameters
+        ----------
+        sftp: pysftp.Connection or paramiko.SFTPClient
+            session to sftp server.
+
+        Returns
+        -------
+        list:
+            First day and YYYY/MM path of each partition, oldest first.
+
+        """
+
+        partitions = []
+        for year in sftp.listdir(self.folder):
+            if len(year) != 4 or not year.isdigit():
+                continue
+            for month in sftp.listdir(posixpath.join(self.folder, year)):
+                try:
+                    first = datetime.date(int(year), int(month), 1)
+                except ValueError:
+                    continue
+                partitions.append((first, year + "/" + month))
+        return sorted(partitions)
+
+    def listing(self, sftp):
+        """
+        List files of remote folder in flat layout, of every partition in
+        dated layout.
+
+        Parameters
+        ----------
+        sftp: pysftp.Connection or paramiko.SFTPClient
+            session to sftp server.
+
+        Returns
+        -------
+        list:
+            Path relative to remote folder and paramiko.SFTPAttributes of
+            each file.
+
+        """
+
+        if self.layout == FLAT:
+            return [
+                (attribute.filename, attribute)
+                for attribute in sftp.listdir_attr(self.folder)
+            ]
+        return [
+            (posixpath.join(path, attribute.filename), attribute)
+            for _, path in self.partitions(sftp)
+            for attribute in sftp.listdir_attr(posixpath.join(self.folder, path))
+        ]
+
+    def index(self, sftp, horizon):
+        """
+        Index archives retention has to decide on. Flat folder is listed
+        whole. In dated layout, partitions reaching horizon are listed, then
+        those holding bases of their delta archives. Other partitions only
+        hold archives older than horizon: they are not indexed and are
+        dropped whole.
+
+        Parameters
+        ----------
+        sftp: pysftp.Connection or paramiko.SFTPClient
+            session to sftp server.
+        horizon: datetime.date
+            date before which no archive is kept but bases of deltas, None
+            to list every partition.
+
+        Returns
+        -------
+        dict:
+            Index given by archive_index, paths relative to remote folder.
+        list:
+            Partitions to drop.
+
+        """
+
+        if self.layout == FLAT:
+            return archive_index(sftp.listdir_attr(self.folder), self.date_format), []
+
+        partitions = self.partitions(sftp)
+        existing = {path for _, path in partitions}
+        pending = {
+            path
+            for first, path in partitions
+            if horizon is None or self.month_end(first) >= horizon
+        }
+        index = {}
+        listed = set()
+        while pending:
+            for path in pending:
+                archive_index(
+                    sftp.listdir_attr(posixpath.join(self.folder, path)),
+                    self.date_format,
+                    path,
+                    index,
+                )
+            listed.update(pending)
+            # Bases may be in older partitions, down to their full archive.
+            pending = {
+                self.partition(base)
+                for entry in index.values()
+                for base in entry["bases"]
+            } & existing - listed
+
+        return index, [path for _, path in partitions if path not in listed]
+
+    @staticmethod
+    def month_end(first):
+        """
+        Get last day of a month.
+
+        Parameters
+        ----------
+        first: datetime.date
+            First day of month.
+
+        Returns
+        -------
+        datetime.date:
+            Last day of month.
+
+        """
+
+        following = (first.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+        return following - datetime.timedelta(days=1)
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 23 09:41:05 2026
+
+-- Manifest of archives on sftp server --
+
+A small JSON file in remote folder records each archive and recipe on server:
+its size, SHA-256, codec, creation time and whether it has a checksum
+sidecar. An upload is recorded under its .part file when it starts, entry
+replaced by the archive once published, so retention removes stale ones.
+Retention, ACK and restore read it instead of listing folder. It is written to
+a temporary file renamed over the manifest, so a reader never sees half of it.
+A missing or unreadable manifest is rebuilt from a listing.
+
+@author: Julien
+"""
+
+import datetime
+import io
+import json
+import posixpath
+from modules.compression_codecs import CODECS
+from modules.chunk_store import RECIPE_EXTENSION
+from modules.delta_archive import file_date
+from modules.sftp_transfer import TransferEngine, CHECKSUM_EXTENSION, PART_EXTENSION
+
+
+# Name of manifest in remote folder.
+MANIFEST_NAME = "manifest.json"
+
+# Version of manifest format.
+MANIFEST_VERSION = 1
+
+# Extension of manifest being written, renamed once complete.
+TEMPORARY_EXTENSION = ".tmp"
+
+
+def archive_codec(name):
+    """
+    Get codec of an archive from its name, or of its unfinished upload.
+
+    Parameters
+    ----------
+    name: string
+        Archive, recipe or unfinished upload name.
+
+    Returns
+    -------
+    string:
+        Codec name, "recipe" for a recipe of dedup mode.
+
+    """
+
+    if name.endswith(PART_EXTENSION):
+        name = name[:-len(PART_EXTENSION)]
+    if name.endswith(RECIPE_EXTENSION):
+        return "recipe"
+    for codec, infos in CODECS.items():
+        if name.endswith(infos["extension"]):
+            return codec
+    return None
+
+
+class RemoteManifest:
+    """
+    Class to keep manifest of archives on sftp server.
+
+    Attributes
+    ----------
+    layout: RemoteLayout
+        Place of each archive in remote folder.
+    path: string
+        Remote path of manifest.
+    entries: dict
+        Entry of each archive, by path relative to remote folder. None until
+        manifest is loaded.
+
+    Methods
+    -------
+    read(sftp):
+        Read manifest from server.
+    load(sftp):
+        Read manifest once, rebuild entries if it is missing.
+    rebuild(sftp, known=None):
+        Build entries from a listing of remote folder.
+    record(path, size=None, sha256=None, sidecar=None, created=None):
+        Add or update entry of an archive.
+    forget(paths):
+        Remove entries of removed files.
+    index():
+        Group archives by date, as archive_index does.
+    save(client):
+        Write manifest to server atomically.
+
+    """
+
+    def __init__(self, layout):
+        """
+        Constructor of the RemoteManifest class.
+
+        Parameters
+        ----------
+        layout: RemoteLayout
+            place of each archive in remote folder.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.layout = layout
+        self.path = posixpath.join(layout.folder, MANIFEST_NAME)
+        self.entries = None
+
+    def read(self, sftp):
+        """
+        Read manifest from server.
+
+        Parameters
+        ----------
+        sftp: pysftp.Connection or paramiko.SFTPClient
+            session to sftp server.
+
+        Returns
+        -------
+        dict:
+            Entries of manifest, None if it is missing or unreadable.
+
+        """
+
+        buffer = io.BytesIO()
+        try:
+            sftp.getfo(self.path, buffer)
+            manifest = json.loads(buffer.getvalue().decode())
+            if manifest["version"] != MANIFEST_VERSION:
+                return None
+            return manifest["archives"]
+        except (IOError, ValueError, KeyError, TypeError):
+            return None
+
+    def load(self, sftp):
+        """
+        Read manifest once, later calls use entries in memory. Entries of a
+        missing or unreadable manifest are rebuilt from a listing, it has
+        then to be saved.
+
+        Parameters
+        ----------
+        sftp: pysftp.Connection or paramiko.SFTPClient
+            session to sftp server.
+
+        Returns
+        -------
+        boolean:
+            True if manifest was read, False if it was rebuilt.
+
+        """
+
+        if self.entries is not None:
+            return True
+
+        entries = self.read(sftp)
+        if entries is not None:
+            self.entries = entries
+            return True
+
+        self.rebuild(sftp)
+        return False
+
+    def rebuild(self, sftp, known=None):
+        """
+        Build entries from a listing of remote folder. SHA-256 is unknown
+        unless given by known entries. An unfinished upload gets an entry of
+        its own, under its name.
+
+        Parameters
+        ----------
+        sftp: pysftp.Connection or paramiko.SFTPClient
+            session to sftp server.
+        known: dict, optional
+            entries kept for paths still on server. Default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if known is None:
+            known = {}
+
+        self.entries = {}
+        sidecars = set()
+        for path, attribute in self.layout.listing(sftp):
+            name = posixpath.basename(path)
+            if file_date(name, self.layout.date_format) is None:
+                continue
+            if name.endswith(CHECKSUM_EXTENSION):
+                sidecars.add(path[:-len(CHECKSUM_EXTENSION)])
+                continue
+            entry = {
+                "size": attribute.st_size or 0,
+                "codec": archive_codec(name),
+                "sha256": None,
+                "created": datetime.datetime.fromtimestamp(
+                    attribute.st_mtime or 0
+                ).isoformat(timespec="seconds"),
+                "sidecar": False,
+            }
+            entry.update(known.get(path, {}))
+            self.entries[path] = entry
+
+        for path in sidecars & set(self.entries):
+            self.entries[path]["sidecar"] = True
+
+    def record(self, path, size=None, sha256=None, sidecar=None, created=None):
+        """
+        Add entry of an archive, or update fields given of its entry.
+
+        Parameters
+        ----------
+        path: string
+            Path relative to remote folder.
+        size: int, optional
+            Size in bytes. Default is None, unchanged.
+        sha256: string, optional
+            SHA-256 of archive. Default is None, unchanged.
+        sidecar: boolean, optional
+            True if a checksum sidecar is next to archive. Default is None,
+            unchanged.
+        created: string, optional
+            Creation time, ISO format. Default is None, now for a new entry.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        entry = self.entries.setdefault(
+            path,
+            {
+                "size": 0,
+                "codec": archive_codec(path),
+                "sha256": None,
+                "created": datetime.datetime.now().isoformat(timespec="seconds"),
+                "sidecar": False,
+            },
+        )
+        for key, value in (
+                ("size", size), ("sha256", sha256), ("sidecar", sidecar), ("created", created)):
+            if value is not None:
+                entry[key] = value
+        # Archive is published, its unfinished upload is gone.
+        self.entries.pop(path + PART_EXTENSION, None)
+
+    def forget(self, paths):
+        """
+        Remove entries of removed files. Sidecars only clear flag of their
+        archive.
+
+        Parameters
+        ----------
+        paths: list
+            Paths relative to remote folder.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        for path in paths:
+            if path.endswith(CHECKSUM_EXTENSION):
+                entry = self.entries.get(path[:-len(CHECKSUM_EXTENSION)])
+                if entry is not None:
+                    entry["sidecar"] = False
+            else:
+                self.entries.pop(path, None)
+
+    def index(self):
+        """
+        Group archives by date, as archive_index does from a listing.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        dict:
+            For each datetime.date, "files" (paths relative to remote
+            folder, with sidecars and unfinished uploads), "size" (bytes)
+            and "bases" (dates of bases of its delta archives).
+
+        """
+
+        index = {}
+        for path, entry in self.entries.items():
+            dates = file_date(posixpath.basename(path), self.layout.date_format)
+            if dates is None:
+                continue
+            date, base = dates
+            item = index.setdefault(date, {"files": [], "size": 0, "bases": set()})
+            item["files"].append(path)
+            if entry["sidecar"]:
+                item["files"].append(path + CHECKSUM_EXTENSION)
+            item["size"] += entry["size"]
+            if base is not None:
+                item["bases"].add(base)
+        return index
+
+    def save(self, client):
+        """
+        Write manifest to a temporary file, then rename it over manifest.
+
+        Parameters
+        ----------
+        client: paramiko.SFTPClient
+            channel manifest is written on.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        data = json.dumps(
+            {"version": MANIFEST_VERSION, "archives": self.entries},
+            separators=(",", ":"),
+            sort_keys=True,
+        ).encode()
+        client.putfo(io.BytesIO(data), self.path + TEMPORARY_EXTENSION)
+        TransferEngine.publish(client, self.path + TEMPORARY_EXTENSION, self.path)
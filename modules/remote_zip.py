@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 14:03:51 2026
+
+-- Zip file read remotely with HTTP Range requests --
+
+@author: Julien
+"""
+
+import io
+import urllib3
+
+
+# Bytes fetched at the end of zip by first request: end of central directory
+# record (22 bytes) plus the longest possible zip comment (65535 bytes).
+TAIL_SIZE = 22 + 65535
+
+# Smallest Range request sent when data outside cached tail is read.
+MIN_REQUEST_SIZE = 64 * 1024
+
+
+class RemoteZipFile(io.RawIOBase):
+    """
+    Read-only file object backed by HTTP Range requests, so zipfile.ZipFile
+    can parse the central directory of a zip still on web server. The tail of
+    the zip is fetched once and cached, it holds the central directory of
+    most zips. Last block fetched before the tail is cached too.
+
+    Attributes
+    ----------
+    http: urllib3.PoolManager
+        Requester used to talk to web server.
+    url: string
+        URL of zip file on web server.
+    length: int
+        Size in bytes of zip on web server.
+    validator: string
+        ETag or Last-Modified of zip, further requests fail if zip changed.
+    tail: bytes
+        Cached end of zip.
+    tail_offset: int
+        Offset of first byte of cached tail.
+    block: bytes
+        Cached block, last one fetched before the tail.
+    block_offset: int
+        Offset of first byte of cached block.
+    position: int
+        Current offset in zip.
+    fetched: int
+        Number of bytes received from web server.
+    requests: int
+        Number of requests sent to web server.
+    not_modified: boolean
+        True if web server answered zip did not change since last run.
+
+    Methods
+    -------
+    open_tail(headers):
+        Fetch end of zip and learn its size.
+    readinto(buffer):
+        Read bytes at current offset, from cache or with a Range request.
+    fetch(first, last):
+        Get bytes of zip between two offsets with a Range request.
+
+    """
+
+    def __init__(self, http, url):
+        """
+        Constructor of the RemoteZipFile class.
+
+        Parameters
+        ----------
+        http: urllib3.PoolManager
+            requester used to talk to web server
+        url: string
+            URL of zip file on web server
+
+        Returns
+        -------
+        None.
+
+        """
+
+        super().__init__()
+        self.http = http
+        self.url = url
+        self.length = None
+        self.validator = None
+        self.tail = b""
+        self.tail_offset = 0
+        self.block = b""
+        self.block_offset = 0
+        self.position = 0
+        self.fetched = 0
+        self.requests = 0
+        self.not_modified = False
+
+    def open_tail(self, headers=None):
+        """
+        Fetch end of zip with a suffix Range request and learn its size.
+
+        Parameters
+        ----------
+        headers: dict, optional
+            Extra headers, such as conditional ones. Default is None.
+
+        Returns
+        -------
+        boolean:
+            True if web server served the range (or answered 304), False if
+            it does not support ranges for this zip.
+
+        Raises
+        ------
+        urllib3.exceptions.ResponseError
+            If zip file was not found on web server.
+
+        """
+
+        headers = dict(headers or {})
+        headers["Range"] = "bytes=-" + str(TAIL_SIZE)
+
+        req = self.http.request("GET", self.url, headers=headers, preload_content=False)
+        self.requests += 1
+
+        try:
+            if req.status == 304:
+                self.not_modified = True
+                return True
+
+            if req.status >= 400:
+                raise urllib3.exceptions.ResponseError()
+
+            if req.status != 206:
+                # Whole zip is coming, close connection before body is sent.
+                req.close()
+                return False
+
+            # Content-Range: bytes <first>-<last>/<total>
+            content_range = req.headers.get("Content-Range", "")
+            first = content_range.replace("bytes ", "").partition("-")[0]
+            total = content_range.rpartition("/")[2]
+            if not first.isdigit() or not total.isdigit():
+                req.close()
+                return False
+
+            self.tail = req.read()
+            self.tail_offset = int(first)
+            self.length = int(total)
+            self.fetched += len(self.tail)
+
+            # Weak ETags can not be used with If-Range.
+            self.validator = req.headers.get("ETag")
+            if self.validator is None or self.validator.startswith("W/"):
+                self.validator = req.headers.get("Last-Modified")
+
+        finally:
+            req.release_conn()
+
+        return True
+
+    def readable(self):
+        """
+        File object can be read.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        boolean:
+            Always True.
+
+        """
+
+        return True
+
+    def seekable(self):
+        """
+        File object supports random access, needed by zipfile.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        boolean:
+            Always True.
+
+        """
+
+        return True
+
+    def tell(self):
+        """
+        Get current offset in zip.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        int:
+            Current offset.
+
+        """
+
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        """
+        Move current offset in zip.
+
+        Parameters
+        ----------
+        offset: int
+            Offset relative to whence.
+        whence: int, optional
+            io.SEEK_SET, io.SEEK_CUR or io.SEEK_END. Default is io.SEEK_SET.
+
+        Returns
+        -------
+        int:
+            New offset.
+
+        """
+
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        elif whence == io.SEEK_END:
+            self.position = self.length + offset
+        else:
+            raise ValueError("Invalid whence: " + str(whence))
+
+        if self.position < 0:
+            raise OSError("Negative seek position.")
+        return self.position
+
+    def readinto(self, buffer):
+        """
+        Read bytes at current offset, from cached tail or block, or with a
+        Range request.
+
+        Parameters
+        ----------
+        buffer: bytearray
+            Buffer to fill.
+
+        Returns
+        -------
+        int:
+            Number of bytes read, 0 at end of zip.
+
+        """
+
+        size = min(len(buffer), self.length - self.position)
+        if size <= 0:
+            return 0
+
+        first = self.position
+        last = first + size - 1
+        if first >= self.tail_offset:
+            data = self.tail[first - self.tail_offset:last - self.tail_offset + 1]
+        else:
+            # Block is fetched again only if it does not hold the whole read.
+            if not self.block_offset <= first <= last < self.block_offset + len(self.block):
+                self.block = self.fetch(first, max(last, first + MIN_REQUEST_SIZE - 1))
+                self.block_offset = first
+            data = self.block[first - self.block_offset:last - self.block_offset + 1]
+
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def fetch(self, first, last):
+        """
+        Get bytes of zip between two offsets with a Range request.
+
+        Parameters
+        ----------
+        first: int
+            Offset of first byte.
+        last: int
+            Offset of last byte, it is capped to the end of zip.
+
+        Returns
+        -------
+        bytes:
+            Data received.
+
+        Raises
+        ------
+        urllib3.exceptions.ProtocolError
+            If zip changed on web server or range was not served.
+
+        """
+
+        last = min(last, self.length - 1)
+        headers = {"Range": "bytes=" + str(first) + "-" + str(last)}
+        if self.validator is not None:
+            headers["If-Range"] = self.validator
+
+        req = self.http.request("GET", self.url, headers=headers, preload_content=False)
+        self.requests += 1
+
+        try:
+            if req.status != 206:
+                req.close()
+                raise urllib3.exceptions.ProtocolError("ZIP changed on web server.")
+            data = req.read()
+            self.fetched += len(data)
+
+        finally:
+            req.release_conn()
+
+        return data
@@ -0,0 +1,457 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 15:38:21 2026
+
+-- Retention of archives on sftp server --
+
+Archive folder is listed once with its attributes and turned into an index
+of archive dates. Policies pick the dates to keep: the last days, one archive
+per day, week and month (grandfather-father-son) and a total size budget.
+Bases of kept delta archives are always kept. Expired files are removed in a
+pipelined batch: many remove requests are in flight at once.
+
+@author: Julien
+"""
+
+import datetime
+import posixpath
+from paramiko import SFTP_OK
+from paramiko.sftp import CMD_REMOVE, CMD_STATUS
+from modules.delta_archive import file_date
+
+
+# Remove requests in flight at once.
+DEFAULT_DELETE_WINDOW = 64
+
+# Private methods of paramiko.SFTPClient pipelined removal relies on, see
+# send_request. Paramiko version is pinned by install_dependencies.sh.
+PIPELINE_METHODS = ("_async_request", "_read_response")
+
+
+def can_pipeline(client):
+    """
+    Check a channel has the paramiko methods pipelined removal relies on.
+
+    Parameters
+    ----------
+    client: paramiko.SFTPClient
+        Channel.
+
+    Returns
+    -------
+    boolean:
+        True if requests can be pipelined, else False.
+
+    """
+
+    return all(callable(getattr(client, method, None)) for method in PIPELINE_METHODS)
+
+
+# Paramiko has no public API to send a request without waiting for its
+# answer. Its SFTPClient sends one with _async_request, which gives the
+# request number; _read_response later reads one answer and hands it to
+# _async_response(kind, message, number) of the object given with the
+# request. These two functions are the only uses of its private methods.
+def send_request(client, handler, command, *arguments):
+    """
+    Send a request without waiting for its answer.
+
+    Parameters
+    ----------
+    client: paramiko.SFTPClient
+        Channel request is sent on.
+    handler: object
+        Its _async_response method gets the answer.
+    command: int
+        SFTP command, such as paramiko.sftp.CMD_REMOVE.
+    *arguments: object
+        Arguments of command.
+
+    Returns
+    -------
+    int:
+        Request number.
+
+    """
+
+    return client._async_request(handler, command, *arguments)  # pylint: disable=W0212
+
+
+def read_response(client):
+    """
+    Wait for next answer and hand it to handler of its request.
+
+    Parameters
+    ----------
+    client: paramiko.SFTPClient
+        Channel requests were sent on.
+
+    Returns
+    -------
+    None.
+
+    """
+
+    client._read_response()  # pylint: disable=W0212
+
+
+def archive_index(attributes, date_format="%Y%d%m", folder="", index=None):
+    """
+    Group files of an archive folder by archive date.
+
+    Parameters
+    ----------
+    attributes: list
+        paramiko.SFTPAttributes of folder, as given by listdir_attr.
+    date_format: string, optional
+        Format of dates in filenames. Default is "%Y%d%m".
+    folder: string, optional
+        Path of folder, prefixes filenames. Default is "".
+    index: dict, optional
+        Index files are added to. Default is None, a new index is made.
+
+    Returns
+    -------
+    dict:
+        For each datetime.date, "files" (paths), "size" (bytes) and
+        "bases" (dates of bases of its delta archives).
+
+    """
+
+    if index is None:
+        index = {}
+    for attribute in attributes:
+        dates = file_date(attribute.filename, date_format)
+        if dates is None:
+            continue
+        date, base = dates
+        entry = index.setdefault(date, {"files": [], "size": 0, "bases": set()})
+        entry["files"].append(posixpath.join(folder, attribute.filename))
+        entry["size"] += attribute.st_size or 0
+        if base is not None:
+            entry["bases"].add(base)
+    return index
+
+
+class RetentionPolicy:
+    """
+    Class to choose archives to keep on sftp server.
+
+    Attributes
+    ----------
+    time_to_save: int
+        Archives of the last days are kept.
+    keep_daily: int
+        Number of most recent archive dates kept.
+    keep_weekly: int
+        Number of weeks whose newest archive is kept.
+    keep_monthly: int
+        Number of months whose newest archive is kept.
+    max_bytes: int
+        Budget of archive folder in bytes, oldest archives are removed until
+        it fits. 0 for no budget.
+
+    Methods
+    -------
+    horizon(today):
+        Get date before which no archive is kept, but bases of deltas.
+    kept(index, today):
+        Get dates of archives to keep.
+    expired(index, today):
+        Get files to remove.
+    newest_per(dates, period, number):
+        Get newest date of each of the last periods.
+    with_bases(index, dates):
+        Add bases of delta archives, down to their full archive.
+
+    """
+
+    def __init__(self, time_to_save, options=None):
+        """
+        Constructor of the RetentionPolicy class.
+
+        Parameters
+        ----------
+        time_to_save: int
+            number of days archives are kept
+        options: dict, optional
+            retention options "keep-daily", "keep-weekly", "keep-monthly" and
+            "max-bytes", 0 to disable each.
+            Default is None, only time to save is then used.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if options is None:
+            options = {}
+
+        self.time_to_save = time_to_save
+        self.keep_daily = options.get("keep-daily", 0)
+        self.keep_weekly = options.get("keep-weekly", 0)
+        self.keep_monthly = options.get("keep-monthly", 0)
+        self.max_bytes = options.get("max-bytes", 0)
+
+    def horizon(self, today):
+        """
+        Get date before which no archive is kept, but bases of kept deltas,
+        without knowing archives. Daily, weekly and monthly policies may keep
+        any old archive.
+
+        Parameters
+        ----------
+        today: datetime.date
+            Date of today.
+
+        Returns
+        -------
+        datetime.date:
+            Horizon, None if every archive must be known to decide.
+
+        """
+
+        if self.keep_daily or self.keep_weekly or self.keep_monthly:
+            return None
+        return today - datetime.timedelta(days=self.time_to_save)
+
+    def kept(self, index, today):
+        """
+        Get dates of archives to keep. An archive is kept if it is younger
+        than time to save or picked by daily, weekly or monthly policy, then
+        oldest ones are dropped while folder is over budget. Newest archive
+        and bases of kept deltas are never dropped.
+
+        Parameters
+        ----------
+        index: dict
+            Index given by archive_index.
+        today: datetime.date
+            Date of today.
+
+        Returns
+        -------
+        set:
+            Dates to keep.
+
+        """
+
+        dead_line = today - datetime.timedelta(days=self.time_to_save)
+        dates = sorted(index, reverse=True)
+        kept = {date for date in dates if date >= dead_line}
+        kept.update(dates[:self.keep_daily])
+        kept.update(
+            self.newest_per(dates, lambda date: date.isocalendar()[:2], self.keep_weekly)
+        )
+        kept.update(
+            self.newest_per(dates, lambda date: (date.year, date.month), self.keep_monthly)
+        )
+        kept = self.with_bases(index, kept)
+
+        if self.max_bytes > 0 and kept:
+            newest = max(kept)
+            total = sum(index[date]["size"] for date in kept)
+            while total > self.max_bytes:
+                needed = set()
+                for date in kept:
+                    needed.update(index[date]["bases"])
+                candidates = [date for date in kept if date not in needed and date != newest]
+                if not candidates:
+                    break
+                oldest = min(candidates)
+                kept.remove(oldest)
+                total -= index[oldest]["size"]
+
+        return kept
+
+    def expired(self, index, today):
+        """
+        Get files to remove.
+
+        Parameters
+        ----------
+        index: dict
+            Index given by archive_index.
+        today: datetime.date
+            Date of today.
+
+        Returns
+        -------
+        list:
+            Filenames to remove, oldest first.
+
+        """
+
+        kept = self.kept(index, today)
+        return [
+            file
+            for date in sorted(index)
+            if date not in kept
+            for file in index[date]["files"]
+        ]
+
+    @staticmethod
+    def newest_per(dates, period, number):
+        """
+        Get newest date of each of the last periods holding an archive.
+
+        Parameters
+        ----------
+        dates: list
+            Archive dates, newest first.
+        period: function
+            gives the period of a date, such as its year and month.
+        number: int
+            Number of periods.
+
+        Returns
+        -------
+        list:
+            Newest date of each period.
+
+        """
+
+        newest = {}
+        for date in dates:
+            if len(newest) >= number and period(date) not in newest:
+                break
+            newest.setdefault(period(date), date)
+        return list(newest.values())
+
+    @staticmethod
+    def with_bases(index, dates):
+        """
+        Add bases of delta archives, down to their full archive. Bases
+        missing from folder are left out, there is nothing to keep.
+
+        Parameters
+        ----------
+        index: dict
+            Index given by archive_index.
+        dates: set
+            Dates to keep.
+
+        Returns
+        -------
+        set:
+            Dates to keep, with bases.
+
+        """
+
+        kept = set()
+        pending = list(dates)
+        while pending:
+            date = pending.pop()
+            if date in kept or date not in index:
+                continue
+            kept.add(date)
+            pending.extend(index[date]["bases"])
+        return kept
+
+
+class RemoveBatch:
+    """
+    Pipelined removal of remote files: up to a window of remove requests
+    are sent before waiting for answers, so a batch costs about one round
+    trip per window instead of one per file. Files are removed one by one
+    if paramiko does not have the methods it relies on.
+
+    Attributes
+    ----------
+    client: paramiko.SFTPClient
+        Channel removals are sent on, not used by other threads meanwhile.
+    window: int
+        Remove requests in flight at once.
+    pending: dict
+        Path of each request waiting for its answer.
+    failed: list
+        Paths that could not be removed.
+
+    Methods
+    -------
+    remove(paths):
+        Remove remote files.
+
+    """
+
+    def __init__(self, client, window=DEFAULT_DELETE_WINDOW):
+        """
+        Constructor of the RemoveBatch class.
+
+        Parameters
+        ----------
+        client: paramiko.SFTPClient
+            channel removals are sent on
+        window: int, optional
+            remove requests in flight at once. Default is 64.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.client = client
+        self.window = max(window, 1)
+        self.pending = {}
+        self.failed = []
+
+    def remove(self, paths):
+        """
+        Remove remote files.
+
+        Parameters
+        ----------
+        paths: list
+            Remote paths.
+
+        Returns
+        -------
+        list:
+            Paths that could not be removed.
+
+        """
+
+        self.failed = []
+        if not can_pipeline(self.client):
+            for path in paths:
+                try:
+                    self.client.remove(path)
+                except IOError:
+                    self.failed.append(path)
+            return self.failed
+
+        for path in paths:
+            while len(self.pending) >= self.window:
+                read_response(self.client)
+            # Answer is given to _async_response.
+            number = send_request(self.client, self, CMD_REMOVE, path)
+            self.pending[number] = path
+        while self.pending:
+            read_response(self.client)
+        return self.failed
+
+    def _async_response(self, kind, message, number):
+        """
+        Record answer of a remove request, called by paramiko with this
+        name, see send_request.
+
+        Parameters
+        ----------
+        kind: int
+            Type of answer.
+        message: paramiko.Message
+            Answer.
+        number: int
+            Request number.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        path = self.pending.pop(number)
+        if kind != CMD_STATUS or message.get_int() != SFTP_OK:
+            self.failed.append(path)
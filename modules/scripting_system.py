@@ -9,13 +9,55 @@ Created on Mon Dec 21 11:37:28 2020
 # pylint: disable=R0915
 # pylint: disable=C0200
 
-import io
 import zipfile
 import datetime
 import os
 import json
+import shutil
+import tarfile
+import time
 import urllib3
 from modules.log_email_mattermost import LogEmailMattermost
+from modules.remote_zip import RemoteZipFile
+from modules.compressor import Compressor, DEFAULT_BLOCK_SIZE, DEFAULT_WORKERS
+from modules.table_compressor import TableCompressor
+from modules.sftp_server import DEFAULT_KEEPALIVE, DEFAULT_FOLDER
+from modules.remote_layout import LAYOUTS, FLAT
+from modules import sftp_transfer
+from modules.retention import DEFAULT_DELETE_WINDOW
+from modules.compression_codecs import CODECS, DEFAULT_CODEC, get_level
+from modules.stream_pipe import DEFAULT_PIPE_SIZE
+from modules.chunk_store import (
+    RECIPE_EXTENSION,
+    DEFAULT_MIN_SIZE,
+    DEFAULT_AVG_SIZE,
+    DEFAULT_MAX_SIZE,
+)
+from modules import delta_archive
+from modules.delta_archive import DeltaArchive, DELTA_SEPARATOR
+from modules.zip_download import (
+    ZipDownload,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_STATE_FILE,
+    DEFAULT_RETRIES,
+    DEFAULT_SEGMENT_SIZE,
+)
+
+
+# Buffer used to copy dump out of zip (4 MiB).
+COPY_BUFFER_SIZE = 4 * 1024 * 1024
+
+
+# Day names used in "days" bracket of compression options.
+WEEK_DAYS = (
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+)
 
 
 class ScriptingSystem:
@@ -30,22 +72,66 @@ class ScriptingSystem:
         on the ground program quit when encounter at least on critical.
     config: string
         configuration filename
+    workdir: string
+        local folder of zip, dump, archive and state files
+    pool: ConnectionPool
+        connections kept open between runs of daemon, None outside daemon
     port: int
         port used to connect to web server
     tgz_name: string
-        name of tar.gz file to post on server
+        name of archive to post on server, its extension follows the codec,
+        or name of recipe of the day in dedup mode
     zfile: Zipfile object
         zip file object to manage zip
     zip_name: string
         zip name to get on web server
+    zip_path: string
+        local path zip is spooled to while downloading
+    download_options: dict
+        options of zip download such as chunk size, resume and retries
+    compression_options: dict
+        options of archive compression, such as codec and its level, block
+        size, number of worker processes, transcoding straight from zip,
+        streaming archive to sftp server while compressing and splitting
+        dump by table
+    dedup_options: dict
+        options of dedup mode, dump is then sent as chunks stored once on
+        sftp server plus a recipe of the day, instead of an archive
+    incremental_options: dict
+        options of incremental mode, archive is then a delta against the
+        last dump sent, a full archive being forced every few days
+    delta: DeltaArchive
+        object writing incremental archives, None if mode is disabled
+    archive_digest: dict
+        SHA-256 and size of archive computed while compressing it, None
+        until archive is created
+    sftp_options: dict
+        default sftp options of destinations, such as asking server for
+        SHA-256 of archive, keepalive interval of sftp session and manifest
+        of archives kept on server
+    destinations: list
+        sftp destinations, each with its credentials, name, remote folder,
+        layout, time to save, retention and sftp options
+    transfer_options: dict
+        options of sftp transfers such as window size, packet size and
+        pipelined writes, and resume of failed uploads
+    retention_options: dict
+        retention policies of archives on sftp server, beyond time to save
+    downloader: ZipDownload
+        object downloading zip, keeps validators of the last downloaded zip
+    zip_not_modified: boolean
+        True if web server answered zip did not change since last run
+    download_skipped: boolean
+        True if probe showed zip does not need to be downloaded, zfile then
+        only holds the central directory read remotely
     file_name: string
         Dump filename
     ip_sftp: string
-        ip of destination server
+        ip of first destination server
     user: string
-        username to connect via sftp
+        username to connect via sftp to first destination
     pswd: string
-        password to connect via sftp
+        password to connect via sftp to first destination
     time_to_save: int
         time to get files stored on sftp server (in days)
     log_email_matt: log object
@@ -53,29 +139,46 @@ class ScriptingSystem:
 
     Methods
     -------
-    get_configuration():
+    get_configuration(job=None, log=None):
         Get configurations from config file and make sure that values are availables.
+    get_options(name, section, defaults, minimums=None):
+        Check options of a config file bracket and fill missing ones with defaults.
+    get_destination(section, time_to_save):
+        Check one sftp destination of config file.
+    select_codec():
+        Choose codec and level of today's archive from compression options.
     request_zip():
         Make GET HTTP request to get zip file on web server.
-    create_zip(data):
-        Create zip file from data got from web server.
+    probe_zip(http, url):
+        Read central directory of zip still on web server to know if it has
+        to be downloaded.
+    save_download_state():
+        Store validators of downloaded zip so next run can skip it if unchanged.
+    select_incremental():
+        Choose between full and delta archive in incremental mode.
+    save_incremental_state():
+        Store signatures of dump sent, base of next delta archive.
+    create_zip():
+        Open zip file spooled to disk from web server.
     compare_date():
         Get last modified date of file (name) and zip (zfile) and compare with
         today's date. If it is the same it means file has been change earlier
         today.
     extract_zip():
-        Extract zip.
+        Extract dump file from zip.
     zip_has_file():
         Check if zip contains dump file.
-    compress_to_tgz():
-        Compress file to .tgz.
+    open_dump():
+        Open dump for reading, from zip or from extracted file.
+    compress_to_tgz(target=None):
+        Compress file to .tgz, on local disk or into a file object.
     clean(sftp):
          Clean all the folder, by removing everything that has to be removed
          and closing all connections still opened
 
     """
 
-    def __init__(self, port_, config_):
+    def __init__(self, port_, config_, workdir_=None, pool_=None):
         """
         Initialize all variables needed from source to destination.
 
@@ -85,6 +188,12 @@ class ScriptingSystem:
             port to use to connect on sftp server
         config_: string
             configuration filename
+        workdir_: string, optional
+            local folder of zip, dump, archive and state files. Default is
+            None, current folder.
+        pool_: ConnectionPool, optional
+            connections kept open between runs of daemon. Default is None,
+            connections are closed once used.
 
         """
 
@@ -93,11 +202,20 @@ class ScriptingSystem:
         # File name of the configuration
         self.config = config_
 
+        # Local files of this job are kept apart from other jobs.
+        self.workdir = workdir_ if workdir_ is not None else os.getcwd()
+
+        # Connections of previous runs, when run by daemon.
+        self.pool = pool_
+
         # Port to connect to web server
         self.port = port_
 
-        # YYYYDDMM.tgz
-        self.tgz_name = datetime.datetime.now().date().strftime("%Y%d%m") + ".tgz"
+        # YYYYDDMM.tgz, extension changes with configured codec.
+        self.tgz_name = (
+            datetime.datetime.now().date().strftime("%Y%d%m")
+            + CODECS[DEFAULT_CODEC]["extension"]
+        )
 
         # Initialize to none all needed variables.
 
@@ -105,6 +223,61 @@ class ScriptingSystem:
         self.zfile = None
         # Zip name on web server.
         self.zip_name = None
+        self.zip_path = None
+        self.download_options = {}
+        self.compression_options = {
+            "transcode": True,
+            "codec": DEFAULT_CODEC,
+            "preset": "default",
+            "days": {},
+            "block-size": DEFAULT_BLOCK_SIZE,
+            "workers": DEFAULT_WORKERS,
+            "stream": False,
+            "stream-buffer": DEFAULT_PIPE_SIZE,
+            "split-tables": False,
+        }
+        self.dedup_options = {
+            "enabled": False,
+            "min-size": DEFAULT_MIN_SIZE,
+            "avg-size": DEFAULT_AVG_SIZE,
+            "max-size": DEFAULT_MAX_SIZE,
+        }
+        self.incremental_options = {
+            "enabled": False,
+            "full-every": delta_archive.DEFAULT_FULL_EVERY,
+            "min-size": delta_archive.DEFAULT_MIN_SIZE,
+            "avg-size": delta_archive.DEFAULT_AVG_SIZE,
+            "max-size": delta_archive.DEFAULT_MAX_SIZE,
+            "state-file": self.workdir + "/" + delta_archive.DEFAULT_STATE_FILE,
+        }
+        self.delta = None
+        self.archive_digest = None
+        self.sftp_options = {
+            "server-hash": True,
+            "keepalive": DEFAULT_KEEPALIVE,
+            "folder": DEFAULT_FOLDER,
+            "layout": FLAT,
+            "manifest": True,
+        }
+        self.destinations = []
+        self.transfer_options = {
+            "window-size": sftp_transfer.DEFAULT_WINDOW_SIZE,
+            "max-packet-size": sftp_transfer.DEFAULT_MAX_PACKET_SIZE,
+            "block-size": sftp_transfer.DEFAULT_BLOCK_SIZE,
+            "buffer-size": sftp_transfer.DEFAULT_BUFFER_SIZE,
+            "pipelined": True,
+            "resume": True,
+        }
+        self.retention_options = {
+            "keep-daily": 0,
+            "keep-weekly": 0,
+            "keep-monthly": 0,
+            "max-bytes": 0,
+            "delete-window": DEFAULT_DELETE_WINDOW,
+        }
+        self.downloader = None
+        self.zip_not_modified = False
+        self.download_skipped = False
         self.file_name = None
         self.ip_sftp = None
         self.user = None
@@ -112,12 +285,18 @@ class ScriptingSystem:
         self.time_to_save = None
         self.log_email_matt = None
 
-    def get_configuration(self):
+    def get_configuration(self, job=None, log=None):
         """
         Get configurations from config file and make sure that values are availables.
 
         Parameters
         ----------
+        job: dict, optional
+            job of config file, its keys override main brackets. Default is
+            None, main brackets are used.
+        log: log object, optional
+            object to manage logs shared with other jobs. Default is None,
+            it is created from config file.
 
         Returns
         -------
@@ -126,30 +305,36 @@ class ScriptingSystem:
         """
         user_zip = None
         user_dump = None
-        ip_ = None
-        user_ = None
-        pswd_ = None
+        destinations_ = [{}]
         time_to_save_ = None
 
         # Initialise just log file, program does not know if notification
         # and e-mails configuration is available.
-        self.log_email_matt = LogEmailMattermost()
+        self.log_email_matt = LogEmailMattermost() if log is None else log
 
         try:
             # Try reading config file as a serialize data (JSON) to get specific parameters
             with open(self.config, "r") as json_config:
                 data = json.load(json_config)
+                if job is not None:
+                    data.update(job)
                 user_zip = data["zip"]
                 user_dump = data["file"]
-                ip_ = data["sftp"]["ip"]
-                user_ = data["sftp"]["user"]
-                pswd_ = data["sftp"]["password"]
+                # Sftp bracket is one destination or a list of destinations.
+                destinations_ = data["sftp"]
+                if not isinstance(destinations_, list):
+                    destinations_ = [destinations_]
+                for destination in destinations_:
+                    for key in ("ip", "user", "password"):
+                        if not isinstance(destination, dict) or key not in destination:
+                            raise KeyError(key)
 
                 # Initialize logging object to manage logs, mattermost notification and e-mails.
                 # Set notification value (always, never or error)
-                self.log_email_matt = LogEmailMattermost(
-                    data["email"], data["notification"]
-                )
+                if log is None:
+                    self.log_email_matt = LogEmailMattermost(
+                        data["email"], data["notification"]
+                    )
 
                 try:
                     # Cast to int
@@ -162,6 +347,68 @@ class ScriptingSystem:
                         "Time to save value format is not supported. Default value is 10 days.",
                     )
 
+                # Transfer options are optional, keep defaults if missing.
+                self.transfer_options = self.get_options(
+                    "Transfer", data.get("transfer", {}), self.transfer_options
+                )
+
+                # Retention policies are optional, 0 disables each one.
+                self.retention_options = self.get_options(
+                    "Retention",
+                    data.get("retention", {}),
+                    self.retention_options,
+                    {"keep-daily": 0, "keep-weekly": 0, "keep-monthly": 0, "max-bytes": 0},
+                )
+
+                self.destinations = [
+                    self.get_destination(destination, time_to_save_)
+                    for destination in destinations_
+                ]
+
+                # Download options are optional, keep defaults if missing.
+                self.download_options = self.get_options(
+                    "Download",
+                    data.get("download", {}),
+                    {
+                        "chunk-size": DEFAULT_CHUNK_SIZE,
+                        "retries": DEFAULT_RETRIES,
+                        "resume": True,
+                        "probe": True,
+                        "segments": 1,
+                        "segment-size": DEFAULT_SEGMENT_SIZE,
+                        "state-file": self.workdir + "/" + DEFAULT_STATE_FILE,
+                    },
+                    {"retries": 0},
+                )
+
+                # Compression options are optional, keep defaults if missing.
+                self.compression_options = self.get_options(
+                    "Compression",
+                    data.get("compression", {}),
+                    self.compression_options,
+                )
+
+                self.select_codec()
+
+                # Dedup options are optional, keep defaults if missing.
+                self.dedup_options = self.get_options(
+                    "Dedup", data.get("dedup", {}), self.dedup_options
+                )
+                if self.dedup_options["enabled"]:
+                    # Recipe of the day is sent instead of an archive.
+                    self.tgz_name = (
+                        datetime.datetime.now().date().strftime("%Y%d%m")
+                        + RECIPE_EXTENSION
+                    )
+
+                # Incremental options are optional, keep defaults if missing.
+                self.incremental_options = self.get_options(
+                    "Incremental",
+                    data.get("incremental", {}),
+                    self.incremental_options,
+                )
+                self.select_incremental()
+
         except json.JSONDecodeError:
             self.log_email_matt.critical(
                 "JSON read",
@@ -199,20 +446,22 @@ when you will regenerate template.",
                 "JSON read", "Zip name must not be blank in 'config.json'."
             )
 
-        if ip_ == "" or ip_ is None:
-            self.log_email_matt.error(
-                "JSON read", "SFTP server IP must not be blank in 'config.json'."
-            )
+        for destination in destinations_:
+            if destination.get("ip") in ("", None):
+                self.log_email_matt.error(
+                    "JSON read", "SFTP server IP must not be blank in 'config.json'."
+                )
 
-        if user_ == "" or user_ is None:
-            self.log_email_matt.error(
-                "JSON read", "SFTP server user must not be blank in 'config.json'."
-            )
+            if destination.get("user") in ("", None):
+                self.log_email_matt.error(
+                    "JSON read", "SFTP server user must not be blank in 'config.json'."
+                )
 
-        if pswd_ == "" or pswd_ is None:
-            self.log_email_matt.error(
-                "JSON read", "SFTP server password must not be blank in 'config.json'."
-            )
+            if destination.get("password") in ("", None):
+                self.log_email_matt.error(
+                    "JSON read",
+                    "SFTP server password must not be blank in 'config.json'.",
+                )
 
         # Add extension if there are not.
         if user_dump is not None and user_dump.find(".sql") == -1:
@@ -222,15 +471,196 @@ when you will regenerate template.",
 
         # Affect all values.
         self.zip_name = user_zip
+        if user_zip is not None:
+            self.zip_path = self.workdir + "/" + user_zip
         self.file_name = user_dump
-        self.ip_sftp = ip_
-        self.user = user_
-        self.pswd = pswd_
+        self.ip_sftp = destinations_[0].get("ip")
+        self.user = destinations_[0].get("user")
+        self.pswd = destinations_[0].get("password")
         self.time_to_save = time_to_save_
 
         if self.log_email_matt.error_nb == 0:
             self.log_email_matt.info("JSON read")
 
+    def get_options(self, name, section, defaults, minimums=None):
+        """
+        Check options of a config file bracket and fill missing ones with
+        defaults. Each option must have the type of its default value: integer
+        or yes / no (boolean), other defaults are kept as they are.
+
+        Parameters
+        ----------
+        name: string
+            Bracket name written in logs, such as "Download".
+        section: dict
+            Bracket of config file.
+        defaults: dict
+            Default value of each option.
+        minimums: dict, optional
+            Lowest value allowed for integer options. Default is None, then
+            integers must be at least 1.
+
+        Returns
+        -------
+        dict:
+            Options checked.
+
+        """
+
+        options = dict(defaults)
+        if minimums is None:
+            minimums = {}
+
+        if not isinstance(section, dict):
+            self.log_email_matt.warning(
+                "JSON read",
+                name + " bracket format is not supported. Defaults are used.",
+            )
+            return options
+
+        for key, default in defaults.items():
+            if key not in section:
+                continue
+
+            value = section[key]
+            try:
+                if isinstance(default, bool):
+                    value = str(value).lower()
+                    if value not in ("yes", "y", "no", "n"):
+                        raise ValueError()
+                    options[key] = value in ("yes", "y")
+
+                elif isinstance(default, int):
+                    value = int(value)
+                    if value < minimums.get(key, 1):
+                        raise ValueError()
+                    options[key] = value
+
+                else:
+                    options[key] = value
+
+            except (TypeError, ValueError):
+                if isinstance(default, bool):
+                    default = "yes" if default else "no"
+                self.log_email_matt.warning(
+                    "JSON read",
+                    name
+                    + " "
+                    + key
+                    + " format is not supported. Default value is "
+                    + str(default)
+                    + ".",
+                )
+
+        return options
+
+    def get_destination(self, section, time_to_save):
+        """
+        Check one sftp destination of config file. Name, remote folder,
+        layout, time to save and retention are optional, they default to the
+        address, "TSE-INFORX", flat layout, main time to save and main
+        retention bracket.
+
+        Parameters
+        ----------
+        section: dict
+            Destination in sftp bracket of config file.
+        time_to_save: int
+            Main time to save in days.
+
+        Returns
+        -------
+        dict:
+            Server infos of destination, as used by SFTPServer.
+
+        """
+
+        name = str(section.get("name", section["ip"]))
+        options = self.get_options(
+            "SFTP " + name,
+            section,
+            dict(self.sftp_options, **{"time-to-save": time_to_save}),
+            {"keepalive": 0},
+        )
+        if options["layout"] not in LAYOUTS:
+            self.log_email_matt.warning(
+                "JSON read",
+                "SFTP " + name + " layout format is not supported. Default value is "
+                + FLAT + ".",
+            )
+            options["layout"] = FLAT
+        options["retention"] = self.get_options(
+            "Retention " + name,
+            section.get("retention", {}),
+            self.retention_options,
+            {"keep-daily": 0, "keep-weekly": 0, "keep-monthly": 0, "max-bytes": 0},
+        )
+        options.update(
+            name=name,
+            ip=section["ip"],
+            user=section["user"],
+            password=section["password"],
+        )
+        return options
+
+    def select_codec(self):
+        """
+        Choose codec and level of today's archive from compression options.
+        Codec and preset of "days" bracket override default ones on matching
+        days, such as xz on weekends. Archive extension follows the codec.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        options = self.compression_options
+        codec = options["codec"]
+        preset = options["preset"]
+
+        today = WEEK_DAYS[datetime.datetime.now().weekday()]
+        days = options["days"] if isinstance(options["days"], dict) else {}
+        if isinstance(days.get(today), dict):
+            codec = days[today].get("codec", codec)
+            preset = days[today].get("preset", preset)
+
+        codec = str(codec).lower()
+        if codec not in CODECS or not CODECS[codec]["available"]:
+            self.log_email_matt.warning(
+                "JSON read",
+                "Compression codec '"
+                + codec
+                + "' is not available. Default value is "
+                + DEFAULT_CODEC
+                + ".",
+            )
+            codec = DEFAULT_CODEC
+
+        level = get_level(codec, preset)
+        if level is None:
+            level = CODECS[codec]["presets"]["default"]
+            self.log_email_matt.warning(
+                "JSON read",
+                "Compression preset '"
+                + str(preset)
+                + "' is not supported by "
+                + codec
+                + ". Default value is "
+                + str(level)
+                + ".",
+            )
+
+        options["codec"] = codec
+        options["level"] = level
+        self.tgz_name = (
+            datetime.datetime.now().date().strftime("%Y%d%m")
+            + CODECS[codec]["extension"]
+        )
+
     def request_zip(self):
         """
         Make GET HTTP request to get zip file on web server.
@@ -244,26 +674,42 @@ when you will regenerate template.",
 
         """
 
-        # Create requester
-        http = urllib3.PoolManager()
-        req = None
+        # Create requester, one connection per concurrent segment. Daemon
+        # keeps connections of previous runs.
+        if self.pool is not None:
+            http = self.pool.http(self.download_options.get("segments", 1))
+        else:
+            http = urllib3.PoolManager(maxsize=self.download_options.get("segments", 1))
 
         try:
-            # Create request type 'GET' to get zip file on http server
+            # Stream zip file from http server to disk, never hold it in memory.
             url = "http://localhost:" + str(self.port) + "/" + self.zip_name
-            req = http.request("GET", url)
+            self.downloader = ZipDownload(
+                http, url, self.zip_path, self.log_email_matt, self.download_options
+            )
+
+            # Only central directory is needed to know if download is useful.
+            if self.download_options.get("probe") and self.probe_zip(http, url):
+                return
 
-            if req.status == 404:
-                raise urllib3.exceptions.ResponseError()
+            self.downloader.download()
 
             self.log_email_matt.info("Request ZIP")
-            self.create_zip(req.data)
+            if self.downloader.not_modified:
+                self.zip_not_modified = True
+                return
+            self.create_zip()
 
         except urllib3.exceptions.ConnectTimeoutError:
             self.log_email_matt.error(
                 "Request ZIP", "Connection Timeout error. Please retry."
             )
 
+        except urllib3.exceptions.IncompleteRead:
+            self.log_email_matt.error(
+                "Request ZIP", "Connection closed before whole ZIP was received."
+            )
+
         except urllib3.exceptions.ConnectionError:
             self.log_email_matt.error(
                 "Request ZIP",
@@ -290,14 +736,161 @@ when you will regenerate template.",
         except urllib3.exceptions.SSLError:
             self.log_email_matt.error("Request ZIP", "SSL certificate failed")
 
-    def create_zip(self, data):
+        except OSError:
+            self.log_email_matt.error(
+                "Request ZIP", "ZIP file could not be written to local disk."
+            )
+
+    def probe_zip(self, http, url):
+        """
+        Read central directory of zip still on web server with Range requests,
+        to know if dump is in zip and was modified today before any bulk
+        transfer.
+
+        Parameters
+        ----------
+        http: urllib3.PoolManager
+            requester used to talk to web server
+        url: string
+            URL of zip file on web server
+
+        Returns
+        -------
+        boolean:
+            True if zip does not have to be downloaded, else False.
+
         """
-        Create zip file from data got from web server.
+
+        remote = RemoteZipFile(http, url)
+        try:
+            if not remote.open_tail(self.downloader.conditional_headers()):
+                self.log_email_matt.warning(
+                    "Probe ZIP", "Web server does not serve ranges, whole ZIP is downloaded."
+                )
+                return False
+
+            if remote.not_modified:
+                self.zip_not_modified = True
+                self.log_email_matt.info("Probe ZIP", "ZIP not modified since last run.")
+                return True
+
+            zfile = zipfile.ZipFile(remote, "r")
+
+        except (
+                zipfile.BadZipFile,
+                zipfile.LargeZipFile,
+                urllib3.exceptions.ProtocolError):
+            self.log_email_matt.warning(
+                "Probe ZIP",
+                "Central directory could not be read remotely, whole ZIP is downloaded.",
+            )
+            return False
+
+        file_date = None
+        for info in zfile.infolist():
+            if info.filename == self.file_name:
+                file_date = datetime.datetime(*info.date_time[0:3]).date()
+
+        self.log_email_matt.info(
+            "Probe ZIP",
+            str(len(zfile.infolist()))
+            + " member(s) listed with "
+            + str(remote.fetched)
+            + " bytes in "
+            + str(remote.requests)
+            + " request(s).",
+        )
+
+        if file_date == datetime.datetime.now().date():
+            return False
+
+        # Keep remote central directory, later checks report what is missing.
+        self.zfile = zfile
+        self.download_skipped = True
+        self.log_email_matt.info(
+            "Probe ZIP",
+            "ZIP not downloaded, "
+            + self.file_name
+            + (" is missing." if file_date is None else " was not modified today."),
+        )
+        return True
+
+    def save_download_state(self):
+        """
+        Store validators of downloaded zip so next run can skip it if unchanged.
+        Call it only once the run succeeded, else next run would skip a zip
+        that has never been sent.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if self.downloader is not None:
+            self.downloader.save_state()
+
+    def select_incremental(self):
+        """
+        Choose between full and delta archive in incremental mode. Name of a
+        delta archive gives the date of its base, such as
+        20261910.from-20261810.tgz.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if not self.incremental_options["enabled"]:
+            return
+
+        if self.dedup_options["enabled"]:
+            self.log_email_matt.warning(
+                "JSON read", "Incremental mode is not used with dedup mode."
+            )
+            return
+
+        self.delta = DeltaArchive(self.log_email_matt, self.incremental_options)
+        today = datetime.datetime.now().date()
+        base = self.delta.base_date(today)
+        if base is not None:
+            self.tgz_name = (
+                today.strftime("%Y%d%m")
+                + DELTA_SEPARATOR
+                + base.strftime("%Y%d%m")
+                + CODECS[self.compression_options["codec"]]["extension"]
+            )
+
+    def save_incremental_state(self):
+        """
+        Store signatures of dump sent, it becomes base of next delta archive.
+        Call it only once archive is on server.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if self.delta is not None:
+            self.delta.save_state()
+
+    def create_zip(self):
+        """
+        Open zip file spooled to disk from web server.
 
         Parameters
         ----------
-        data : request response
-            Data needed to create zip. It comes from request on web server.
 
         Returns
         -------
@@ -305,8 +898,8 @@ when you will regenerate template.",
 
         """
         try:
-            # Decode zip from bytes
-            self.zfile = zipfile.ZipFile(io.BytesIO(data), "r")
+            # Read zip from spool file, members are read lazily from disk.
+            self.zfile = zipfile.ZipFile(self.zip_path, "r")
 
         except (zipfile.BadZipFile, zipfile.LargeZipFile):
             self.zfile = None
@@ -353,7 +946,8 @@ when you will regenerate template.",
 
     def extract_zip(self):
         """
-        Extract zip.
+        Extract dump file from zip. Other members are never written to disk,
+        dump is streamed out of zip in one pass.
 
         Parameters
         ----------
@@ -369,9 +963,18 @@ when you will regenerate template.",
             return
 
         try:
-            self.zfile.extractall(os.getcwd())
+            info = self.zfile.getinfo(self.file_name)
+            with self.zfile.open(info) as member, open(
+                    self.workdir + "/" + self.file_name, "wb") as dump:
+                shutil.copyfileobj(member, dump, COPY_BUFFER_SIZE)
             self.log_email_matt.info("ZIP extracted")
 
+        except KeyError:
+            # Reported by zip_has_file.
+            self.log_email_matt.warning(
+                "ZIP extracted", self.file_name + " not found, nothing extracted."
+            )
+
         except zipfile.BadZipFile:
             self.log_email_matt.error(
                 "ZIP extracted", "Bad ZIP file. ZIP file not extracted."
@@ -384,6 +987,11 @@ when you will regenerate template.",
 that has not been enabled. ZIP file not extracted.",
             )
 
+        except OSError:
+            self.log_email_matt.error(
+                "ZIP extracted", "Dump file could not be written to local disk."
+            )
+
         finally:
             self.zfile.close()
 
@@ -419,9 +1027,11 @@ that has not been enabled. ZIP file not extracted.",
             )
             self.log_email_matt.error(
                 "Compress file",
-                "Fail to compress (.tgz) "
+                "Fail to compress ("
+                + CODECS[self.compression_options["codec"]]["extension"]
+                + ") "
                 + self.file_name
-                + " file. TGZ file not created.",
+                + " file. Archive not created.",
             )
             self.log_email_matt.error(
                 "SFTP connection", "Connection not launch with SFTP server."
@@ -433,42 +1043,112 @@ that has not been enabled. ZIP file not extracted.",
             self.log_email_matt.error("ACK", "Checking ACK not done.")
         return False
 
-    def compress_to_tgz(self):
+    def open_dump(self):
         """
-        Compress file to .tgz.
+        Open dump for reading, straight from zip when transcoding, else from
+        the extracted file.
 
         Parameters
         ----------
 
         Returns
         -------
-        None.
+        file object:
+            Dump, to close once read.
+        tarfile.TarInfo:
+            Name, size and date of dump.
+
+        Raises
+        ------
+        KeyError
+            If zip does not contain dump.
+        OSError
+            If extracted dump could not be read.
 
         """
 
-        # Compress and check if an error occured
-        err = os.system(
-            'tar -czf "'
-            + os.getcwd()
-            + "/"
-            + self.tgz_name
-            + '" "'
-            + self.file_name
-            + '"'
-        )
+        entry = tarfile.TarInfo(self.file_name)
+        entry.mode = 0o644
+
+        if self.compression_options.get("transcode"):
+            # Size and date of tar entry come from zip.
+            info = self.zfile.getinfo(self.file_name)
+            entry.size = info.file_size
+            entry.mtime = time.mktime(info.date_time + (0, 0, -1))
+            return self.zfile.open(info), entry
 
-        # If err != 0, an error occured
-        if err != 0:
+        dump_path = self.workdir + "/" + self.file_name
+        entry.size = os.path.getsize(dump_path)
+        entry.mtime = os.path.getmtime(dump_path)
+        return open(dump_path, "rb"), entry
+
+    def compress_to_tgz(self, target=None):
+        """
+        Compress file to .tgz with the in-process compression engine. When
+        transcoding, dump is read straight from zip, else it is read from the
+        extracted file, which is then removed.
+
+        Parameters
+        ----------
+        target: file object, optional
+            File object archive is written to, such as a pipe streaming it to
+            sftp server. Default is None, archive is written to local disk.
+
+        Returns
+        -------
+        boolean:
+            True if archive was created, else False.
+
+        """
+
+        if target is None:
+            target = self.workdir + "/" + self.tgz_name
+        dump_path = self.workdir + "/" + self.file_name
+        # Incremental archives are deltas, not SQL, they are never split.
+        if self.compression_options["split-tables"] and self.delta is None:
+            compressor = TableCompressor(self.log_email_matt, self.compression_options)
+        else:
+            compressor = Compressor(self.log_email_matt, self.compression_options)
+        transcode = self.compression_options.get("transcode")
+
+        result = None
+        try:
+            source, entry = self.open_dump()
+            with source:
+                if self.delta is not None:
+                    result = self.delta.compress(
+                        compressor, source, entry, target, self.tgz_name
+                    )
+                else:
+                    result = compressor.compress(source, entry, target)
+
+        except (KeyError, OSError, ValueError, zipfile.BadZipFile) as err:
+            result = {"error": str(err) or type(err).__name__}
+
+        finally:
+            if transcode:
+                self.zfile.close()
+
+        if result["error"] is None:
+            compressor.report(result)
+            # Computed while compressing, checked against server copy.
+            self.archive_digest = {"sha256": result["sha256"], "size": result["output"]}
+        else:
             self.log_email_matt.error(
                 "Compress file",
-                "Fail to compress (.tgz) "
+                "Fail to compress ("
+                + CODECS[self.compression_options["codec"]]["extension"]
+                + ") "
                 + self.file_name
-                + " file. TGZ file not created.",
+                + " file. Archive not created. "
+                + result["error"],
             )
 
         # Delete file name
-        if os.path.exists(os.getcwd() + "/" + self.file_name):
-            os.remove(os.getcwd() + "/" + self.file_name)
+        if os.path.exists(dump_path):
+            os.remove(dump_path)
+
+        return result["error"] is None
 
     def clean(self, sftp):
         """
@@ -485,12 +1165,18 @@ that has not been enabled. ZIP file not extracted.",
 
         """
 
-        if os.path.exists(os.getcwd() + "/" + self.tgz_name):
-            os.remove(os.getcwd() + "/" + self.tgz_name)
+        if os.path.exists(self.workdir + "/" + self.tgz_name):
+            os.remove(self.workdir + "/" + self.tgz_name)
+        if self.zip_path is not None and os.path.exists(self.zip_path):
+            os.remove(self.zip_path)
+        # Dump is the only member ever extracted.
+        if self.file_name is not None and os.path.exists(
+                self.workdir + "/" + self.file_name):
+            os.remove(self.workdir + "/" + self.file_name)
+
+        # Zip is left open when archive was not streamed to server.
         if self.zfile is not None:
-            for file in self.zfile.infolist():
-                if os.path.exists(os.getcwd() + "/" + file.filename):
-                    os.remove(os.getcwd() + "/" + file.filename)
+            self.zfile.close()
 
         if sftp is not None:
             sftp.close()
@@ -0,0 +1,496 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 21 09:05:17 2026
+
+-- Fan-out of archive to several sftp destinations --
+
+Archive is produced once and sent to every destination at the same time:
+local file is read once, or compression stream is written once, into a tee
+of bounded pipes, one per destination. Each destination has its own session,
+remote folder, retention, ACK and metrics, its logs are tagged with its name.
+
+@author: Julien
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from modules.sftp_server import SFTPServer
+from modules.sftp_transfer import DEFAULT_BLOCK_SIZE
+from modules.stream_pipe import BoundedPipe, TeePipe, DEFAULT_PIPE_SIZE
+
+
+class DestinationLog:
+    """
+    Logs of one destination: action names are tagged with destination name,
+    and calls of concurrent destinations are serialised.
+
+    Attributes
+    ----------
+    log_email_matt: LogEmailMattermost
+        Object to manage all logs.
+    name: string
+        Destination name, None to leave action names as they are.
+    lock: threading.Lock
+        Lock shared by every destination.
+    error_nb: int
+        Number of errors of this destination.
+
+    Methods
+    -------
+    tag(current_action):
+        Add destination name to action name.
+    info(current_action, message=None):
+        Log info.
+    warning(current_action, message=None):
+        Log warning.
+    error(current_action, message=None):
+        Log error.
+    critical(current_action, message=None):
+        Log critical.
+
+    """
+
+    def __init__(self, logging, name, lock):
+        """
+        Constructor of the DestinationLog class.
+
+        Parameters
+        ----------
+        logging: logging object
+            object to manage logs
+        name: string
+            destination name, None to leave action names as they are
+        lock: threading.Lock
+            lock shared by every destination
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.log_email_matt = logging
+        self.name = name
+        self.lock = lock
+        self.error_nb = 0
+
+    def tag(self, current_action):
+        """
+        Add destination name to action name.
+
+        Parameters
+        ----------
+        current_action: string
+            Action name.
+
+        Returns
+        -------
+        string:
+            Tagged action name.
+
+        """
+
+        if self.name is None:
+            return current_action
+        return current_action + " @" + self.name
+
+    def info(self, current_action, message=None):
+        """
+        Log info.
+
+        Parameters
+        ----------
+        current_action: string
+            Action name.
+        message: string, optional
+            Message. The default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        with self.lock:
+            self.log_email_matt.info(self.tag(current_action), message)
+
+    def warning(self, current_action, message=None):
+        """
+        Log warning.
+
+        Parameters
+        ----------
+        current_action: string
+            Action name.
+        message: string, optional
+            Message. The default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        with self.lock:
+            self.log_email_matt.warning(self.tag(current_action), message)
+
+    def error(self, current_action, message=None):
+        """
+        Log error.
+
+        Parameters
+        ----------
+        current_action: string
+            Action name.
+        message: string, optional
+            Message. The default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        with self.lock:
+            self.error_nb += 1
+            self.log_email_matt.error(self.tag(current_action), message)
+
+    def critical(self, current_action, message=None):
+        """
+        Log critical.
+
+        Parameters
+        ----------
+        current_action: string
+            Action name.
+        message: string, optional
+            Message. The default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        with self.lock:
+            self.error_nb += 1
+            self.log_email_matt.critical(self.tag(current_action), message)
+
+
+class SFTPFanout:
+    """
+    Class to send archive to every sftp destination at the same time. It
+    offers the stages of SFTPServer, each one runs on every destination.
+
+    Attributes
+    ----------
+    log_email_matt: LogEmailMattermost
+        Object to manage all logs.
+    servers: list
+        SFTPServer of each destination.
+    logs: list
+        DestinationLog of each destination.
+    buffer_size: int
+        Bytes buffered for each destination while archive is read once.
+
+    Methods
+    -------
+    each(operation, *args):
+        Run an operation on every destination at the same time.
+    archival_check():
+        Remove old archives of every destination.
+    send_to_sftp_server(tgz_name_, local_path=None):
+        Send local archive to every destination, read once.
+    stream_to_sftp_server(tgz_name_, compress, buffer_size):
+        Send archive to every destination while it is being compressed.
+    tee(tgz_name_, produce, buffer_size, resumable):
+        Feed every destination from one producer.
+    send_chunks(recipe_name_, open_dump):
+        Upload missing chunks and recipe to every destination.
+    check_file_ack(tgz_name_, digest=None):
+        Check every destination has whole archive.
+    report():
+        Log metrics of every destination and number that got archive.
+    close():
+        Close every session.
+
+    """
+
+    def __init__(self, destinations, logging, is_date_ok, buffer_size=DEFAULT_PIPE_SIZE):
+        """
+        Constructor of the SFTPFanout class. Destinations are connected one
+        after the other, known_hosts may be updated by each.
+
+        Parameters
+        ----------
+        destinations: list
+            server infos of each destination, see SFTPServer, with a "name".
+        logging: logging object
+            object to manage logs
+        is_date_ok: boolean
+            True if the last modification date of the file is today, else False
+        buffer_size: int, optional
+            bytes buffered for each destination. Default is 8 MiB.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.log_email_matt = logging
+        self.buffer_size = buffer_size
+        lock = threading.Lock()
+
+        # Logs are only tagged when there are several destinations.
+        self.logs = [
+            DestinationLog(
+                logging,
+                destination.get("name", destination["ip"]) if len(destinations) > 1 else None,
+                lock,
+            )
+            for destination in destinations
+        ]
+        self.servers = [
+            SFTPServer(destination, log, is_date_ok)
+            for destination, log in zip(destinations, self.logs)
+        ]
+
+    def each(self, operation, *args):
+        """
+        Run an operation on every destination at the same time.
+
+        Parameters
+        ----------
+        operation: function
+            takes the SFTPServer of a destination, then one item of each args.
+        *args: list
+            one item per destination, given to operation.
+
+        Returns
+        -------
+        list:
+            Value returned by operation for each destination.
+
+        """
+
+        if len(self.servers) == 1:
+            return [operation(self.servers[0], *(arg[0] for arg in args))]
+
+        with ThreadPoolExecutor(max_workers=len(self.servers)) as pool:
+            return list(pool.map(operation, self.servers, *args))
+
+    def archival_check(self):
+        """
+        Remove old archives of every destination, with its own retention.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.each(SFTPServer.archival_check)
+
+    def send_to_sftp_server(self, tgz_name_, local_path=None):
+        """
+        Send local archive to every destination. It is read once and copied
+        to all of them, a destination whose upload failed then resumes from
+        its .part file on its own. Local file is removed at clean.
+
+        Parameters
+        ----------
+        tgz_name_: string
+            name of archive to send.
+        local_path: string, optional
+            path of local archive. Default is None, tgz_name_ in current
+            folder.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if local_path is None:
+            local_path = tgz_name_
+
+        if len(self.servers) == 1:
+            self.servers[0].send_to_sftp_server(tgz_name_, local_path=local_path)
+            return
+
+        def produce(tee):
+            with open(local_path, "rb") as archive:
+                while True:
+                    data = archive.read(DEFAULT_BLOCK_SIZE)
+                    if not data:
+                        break
+                    tee.write(data)
+            return True
+
+        received = self.tee(tgz_name_, produce, self.buffer_size, True)
+        self.each(
+            lambda server, done: done or server.send_to_sftp_server(
+                tgz_name_, False, local_path
+            ),
+            received,
+        )
+
+    def stream_to_sftp_server(self, tgz_name_, compress, buffer_size=DEFAULT_PIPE_SIZE):
+        """
+        Send archive to every destination while it is being compressed, it
+        is compressed once. A destination whose upload failed does not get
+        archive.
+
+        Parameters
+        ----------
+        tgz_name_: string
+            name of archive on sftp servers.
+        compress: function
+            writes archive into the file object given, returns True on success.
+        buffer_size: int, optional
+            bytes buffered for each destination. Default is 8 MiB.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if len(self.servers) == 1:
+            self.servers[0].stream_to_sftp_server(tgz_name_, compress, buffer_size)
+            return
+
+        self.tee(tgz_name_, compress, buffer_size, False)
+
+    def tee(self, tgz_name_, produce, buffer_size, resumable):
+        """
+        Feed every destination from one producer: it writes into a tee of
+        pipes, read by the upload of each destination.
+
+        Parameters
+        ----------
+        tgz_name_: string
+            name of archive on sftp servers.
+        produce: function
+            writes archive into the file object given, returns True on success.
+        buffer_size: int
+            bytes buffered for each destination.
+        resumable: boolean
+            True if a failed upload will be sent again, see SFTPServer.receive.
+
+        Returns
+        -------
+        list:
+            True for each destination that received archive.
+
+        """
+
+        pipes = [BoundedPipe(buffer_size) for _ in self.servers]
+        tee = TeePipe(pipes)
+
+        def run_producer():
+            done = False
+            try:
+                done = produce(tee)
+            except OSError as err:
+                # Every destination failed, or archive could not be read.
+                tee.abort(err)
+                return
+            if done:
+                tee.close()
+            else:
+                tee.abort(OSError("Compression failed."))
+
+        producer = threading.Thread(target=run_producer, name="tee-to-sftp")
+        producer.start()
+        try:
+            return self.each(
+                lambda server, pipe: server.receive(tgz_name_, pipe, resumable), pipes
+            )
+        finally:
+            producer.join()
+
+    def send_chunks(self, recipe_name_, open_dump):
+        """
+        Upload missing chunks and recipe to every destination, each one
+        reads dump on its own since chunks missing differ.
+
+        Parameters
+        ----------
+        recipe_name_: string
+            name of recipe on sftp servers.
+        open_dump: function
+            returns dump file object and its tar entry.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.each(lambda server: server.send_chunks(recipe_name_, open_dump))
+
+    def check_file_ack(self, tgz_name_, digest=None):
+        """
+        Check every destination has whole archive.
+
+        Parameters
+        ----------
+        tgz_name_: string
+            name of archive on sftp servers.
+        digest: dict, optional
+            "sha256" and "size" of archive sent. Default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.each(lambda server: server.check_file_ack(tgz_name_, digest))
+
+    def report(self):
+        """
+        Log metrics of every destination, and number of destinations
+        without error.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        for server in self.servers:
+            server.report()
+
+        if len(self.servers) > 1:
+            succeeded = sum(log.error_nb == 0 for log in self.logs)
+            self.log_email_matt.info(
+                "SFTP destinations",
+                "{} of {} destination(s) without error.".format(
+                    succeeded, len(self.servers)
+                ),
+            )
+
+    def close(self):
+        """
+        Close every session.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        for server in self.servers:
+            server.close()
@@ -8,8 +8,34 @@ Created on Mon Oct 19 12:11:28 2020
 # pylint: disable=R1702
 
 import datetime
+import hashlib
+import io
 import os
+import posixpath
+import shlex
+import tarfile
+import tempfile
+import threading
+import time
 import pysftp
+from modules.delta_archive import archive_base, archive_date, file_date, rebuild_dump
+from modules.retention import (
+    RetentionPolicy,
+    RemoveBatch,
+    DEFAULT_DELETE_WINDOW,
+)
+from modules.stream_pipe import BoundedPipe, DEFAULT_PIPE_SIZE
+from modules.chunk_store import ChunkStore, CHUNK_FOLDER, RECIPE_EXTENSION
+from modules.sftp_transfer import TransferEngine, CHECKSUM_EXTENSION, PART_EXTENSION
+from modules.remote_layout import RemoteLayout, FLAT, DATED
+from modules.remote_manifest import RemoteManifest
+
+
+# Seconds between keepalives sent on idle session.
+DEFAULT_KEEPALIVE = 30
+
+# Remote folder of archives.
+DEFAULT_FOLDER = "TSE-INFORX"
 
 
 class SFTPServer:
@@ -23,27 +49,87 @@ class SFTPServer:
         Object to manage all logs.
     time_to_save: int
         Time in days to store data on server.
+    retention: RetentionPolicy
+        Policy choosing archives kept on server.
+    delete_window: int
+        Remove requests in flight at once during archival.
     ip_sftp: string
         IP of SFTP server.
     user: string
         Username of user to connect.
     pswd: string
         Password to connect to user.
+    folder: string
+        Remote folder of archives.
+    layout: RemoteLayout
+        Place of each archive in remote folder.
+    manifest: RemoteManifest
+        Manifest of archives on server, None if it is disabled.
     is_date_ok: boolean
         Comparison of last modification date of dump file and today.
+    dedup_options: dict
+        Options of chunk store used in dedup mode, None if dedup is disabled.
+    server_hash: boolean
+        True to ask server for SHA-256 of archives when exec is allowed.
+    keepalive: int
+        Seconds between keepalives sent on idle session, 0 disables them.
+    connections: int
+        Number of connections made to sftp server.
+    connect_seconds: float
+        Time spent connecting to sftp server, in seconds.
+    sftp: pysftp.Connection
+        Session shared by all stages, None if server could not be reached.
+    pool: ConnectionPool
+        Sessions kept open between runs of daemon, None to close session.
+    engine: TransferEngine
+        Engine sending archives with tuned transfer settings.
 
     Methods
     -------
     connect(action):
         Connect to sftp server with ssh keys.
-    send_to_sftp_server(tgz_name_):
+    is_alive():
+        Check session is open and its transport still active.
+    alive(sftp):
+        Check a session is open and its transport still active.
+    session(action):
+        Get the session shared by all stages, reconnect if it was lost.
+    run(action, operation):
+        Run an operation on the shared session, run it again after reconnect
+        if connection was lost.
+    send_to_sftp_server(tgz_name_, remove_local=True, local_path=None):
         Send tgz file to sftp server.
+    stream_to_sftp_server(tgz_name_, compress, buffer_size):
+        Upload archive while it is being compressed, without local file.
+    receive(tgz_name_, pipe, resumable=False):
+        Upload archive read from a pipe.
+    send_chunks(recipe_name_, open_dump):
+        Upload chunks of dump missing on server and recipe of the day.
     archival_check():
-        Check and remove old tgz files depending on the time to save files.
-    check_file_ack(tgz_name_):
-        Check if sftp server has tgz file.
+        Check and remove old archives depending on the time to save files.
+    load_manifest(sftp):
+        Read manifest, write it again if it was rebuilt.
+    update_manifest(change):
+        Apply a change to manifest and write it to server.
+    record_partial(tgz_name_):
+        Record an upload starting in manifest.
+    record_upload(tgz_name_, size=None):
+        Record an archive sent in manifest.
+    check_file_ack(tgz_name_, digest=None):
+        Check sftp server has whole tgz file, on the session used to send it.
+    verify_file(sftp, tgz_name_, digest):
+        Check size and SHA-256 of tgz file on server.
+    server_sha256(sftp, path, size=None):
+        Ask server to compute SHA-256 of an archive, if exec is allowed.
+    restore(tgz_name_, path):
+        Get an archive, or rebuild dump of a recipe, from server.
+    migrate_layout():
+        Move archives of a flat folder into partitions of dated layout.
     close():
-        Close sftp connection if this one is still opened.
+        Close sftp connection if this one is still opened, or give it back
+        to pool.
+    report():
+        Log number of connections and time spent connecting.
 
     """
 
@@ -68,17 +154,47 @@ class SFTPServer:
 
         self.log_email_matt = logging
         self.time_to_save = sftp_server_infos["time-to-save"]
+        retention = sftp_server_infos.get("retention", {})
+        self.retention = RetentionPolicy(self.time_to_save, retention)
+        self.delete_window = retention.get("delete-window", DEFAULT_DELETE_WINDOW)
         self.ip_sftp = sftp_server_infos["ip"]
         self.user = sftp_server_infos["user"]
         self.pswd = sftp_server_infos["password"]
+        self.folder = sftp_server_infos.get("folder", DEFAULT_FOLDER)
+        self.layout = RemoteLayout(self.folder, sftp_server_infos.get("layout", FLAT))
+        self.manifest = None
+        if sftp_server_infos.get("manifest", True):
+            self.manifest = RemoteManifest(self.layout)
         self.is_date_ok = is_date_ok
+        self.dedup_options = sftp_server_infos.get("dedup")
+        self.server_hash = sftp_server_infos.get("server-hash", True)
+        self.keepalive = sftp_server_infos.get("keepalive", DEFAULT_KEEPALIVE)
+        self.connections = 0
+        self.connect_seconds = 0.0
+
+        self.pool = sftp_server_infos.get("pool")
+
+        self.engine = TransferEngine(logging, sftp_server_infos.get("transfer"))
 
+        # One session is shared by archival, upload and ACK.
         self.sftp = None
         self.sftp = self.connect("SFTP connection")
 
+        # Folders of new jobs or destinations are created on first run.
+        if self.sftp is not None:
+            try:
+                if not self.sftp.exists(self.folder):
+                    self.sftp.makedirs(self.folder)
+                    self.log_email_matt.info(
+                        "SFTP connection", "Remote folder " + self.folder + " created."
+                    )
+            except IOError:
+                pass
+
     def connect(self, action):
         """
-        Connect to sftp server by managing ssh keys.
+        Connect to sftp server by managing ssh keys. Time spent connecting is
+        measured, and keepalives are sent on the new transport.
 
         Parameters
         ----------
@@ -91,6 +207,17 @@ class SFTPServer:
 
         """
 
+        # Daemon keeps sessions of previous runs.
+        if self.pool is not None:
+            sftp = self.pool.acquire(("sftp", self.ip_sftp, self.user, self.pswd), self.alive)
+            if sftp is not None:
+                self.connections += 1
+                self.log_email_matt.info(
+                    action, "Connection reused with sftp server @" + self.ip_sftp + "."
+                )
+                return sftp
+
+        start = time.monotonic()
         cnopts = None
         try:
             cnopts = pysftp.CnOpts(knownhosts=pysftp.known_hosts())
@@ -125,9 +252,20 @@ class SFTPServer:
                 )
                 host_keys.save(pysftp.known_hosts())
 
+            # Idle session is kept alive between stages.
+            if self.keepalive > 0:
+                sftp.sftp_client.get_channel().get_transport().set_keepalive(
+                    self.keepalive
+                )
+
+            elapsed = time.monotonic() - start
+            self.connections += 1
+            self.connect_seconds += elapsed
             self.log_email_matt.info(
                 action,
-                "Connection established with sftp server @" + self.ip_sftp,
+                "Connection established with sftp server @{} in {:.2f} s.".format(
+                    self.ip_sftp, elapsed
+                ),
             )
             return sftp
 
@@ -143,14 +281,120 @@ class SFTPServer:
         except pysftp.SSHException:
             self.log_email_matt.error(action, "Unknow SSH error occured.")
 
-    def send_to_sftp_server(self, tgz_name_):
+    def is_alive(self):
         """
-        Send tgz file to sftp server.
+        Check session is open and its transport still active.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        boolean:
+            True if session can be used, else False.
+
+        """
+
+        return self.sftp is not None and self.alive(self.sftp)
+
+    @staticmethod
+    def alive(sftp):
+        """
+        Check a session is open and its transport still active.
+
+        Parameters
+        ----------
+        sftp: pysftp.Connection
+            session to sftp server.
+
+        Returns
+        -------
+        boolean:
+            True if session can be used, else False.
+
+        """
+
+        try:
+            channel = sftp.sftp_client.get_channel()
+            return not channel.closed and channel.get_transport().is_active()
+        except (AttributeError, EOFError, OSError, pysftp.SSHException):
+            return False
+
+    def session(self, action):
+        """
+        Get the session shared by all stages, reconnect if it was lost.
+
+        Parameters
+        ----------
+        action: string
+            Current action written in logs.
+
+        Returns
+        -------
+        pysftp.Connection:
+            Open session, None if server could not be reached.
+
+        """
+
+        if self.sftp is not None and not self.is_alive():
+            self.log_email_matt.warning(action, "Connection lost, reconnecting.")
+            self.close()
+        if self.sftp is None and self.connections > 0:
+            self.sftp = self.connect(action)
+        return self.sftp
+
+    def run(self, action, operation):
+        """
+        Run an operation on the shared session. If connection was lost during
+        operation, session is reconnected and operation is run once again.
+
+        Parameters
+        ----------
+        action: string
+            Current action written in logs.
+        operation: function
+            takes the session, must be safe to run twice.
+
+        Returns
+        -------
+        Value returned by operation.
+
+        Raises
+        ------
+        ConnectionError
+            If there is no session to sftp server.
+
+        """
+
+        sftp = self.session(action)
+        if sftp is None:
+            raise ConnectionError("Connection to sftp is not done.")
+
+        try:
+            return operation(sftp)
+        except (EOFError, OSError, pysftp.SSHException):
+            # Errors of a live session, such as missing paths, are not retried.
+            if self.is_alive():
+                raise
+            sftp = self.session(action)
+            if sftp is None:
+                raise
+            return operation(sftp)
+
+    def send_to_sftp_server(self, tgz_name_, remove_local=True, local_path=None):
+        """
+        Send tgz file to sftp server. It is written as a .part file renamed
+        once complete, an upload that failed is resumed from its .part file.
 
         Parameter
         ---------
         tgz_name_: string
             name of tar.gz file to send to server.
+        remove_local: boolean, optional
+            True to remove local file once sent. Default is True.
+        local_path: string, optional
+            path of local archive. Default is None, tgz_name_ in current
+            folder.
 
         Returns
         -------
@@ -158,14 +402,33 @@ class SFTPServer:
 
         """
 
+        path = self.layout.path(tgz_name_)
+        if local_path is None:
+            local_path = tgz_name_
+
+        def upload(sftp):
+            # upload file to /data/guest/upload on remote
+            self.layout.prepare(sftp, tgz_name_)
+            with open(local_path, "rb") as archive:
+                return self.engine.upload(
+                    sftp,
+                    archive,
+                    path,
+                    resume=True,
+                    prefix_hash=lambda size: self.server_sha256(
+                        sftp, path + PART_EXTENSION, size
+                    ),
+                )
+
         try:
             if self.sftp is not None:
-                # upload file to /data/guest/upload on remote
-                with self.sftp.cd("TSE-INFORX"):
-                    self.sftp.put(tgz_name_)
-                os.remove(tgz_name_)
+                self.record_partial(tgz_name_)
+                result = self.run("Send to SFTP", upload)
+                if remove_local:
+                    os.remove(local_path)
 
-                self.log_email_matt.info("Send to SFTP")
+                self.engine.report("Send to SFTP", result)
+                self.record_upload(tgz_name_, result["resumed"] + result["bytes"])
 
         except (IOError, OSError) as err:
             if err is OSError:
@@ -174,16 +437,131 @@ class SFTPServer:
                 path = "Remote"
             self.log_email_matt.error("Send to SFTP", path + " path does not exists.")
 
+    def stream_to_sftp_server(self, tgz_name_, compress, buffer_size=DEFAULT_PIPE_SIZE):
+        """
+        Upload archive while it is being compressed. Compression runs in a
+        thread writing into a bounded in-memory pipe, which is read by the
+        transfer engine on the open connection: compression and upload overlap and archive
+        never touches local disk. Remote .part file is removed if either side
+        fails. Upload can not be run again, pipe is consumed.
+
+        Parameters
+        ----------
+        tgz_name_: string
+            name of archive on sftp server.
+        compress: function
+            writes archive into the file object given, returns True on success.
+        buffer_size: int, optional
+            bytes buffered between compression and upload. Default is 8 MiB.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        pipe = BoundedPipe(buffer_size)
+
+        def produce():
+            done = False
+            try:
+                done = compress(pipe)
+            finally:
+                if done:
+                    pipe.close()
+                else:
+                    pipe.abort(OSError("Compression failed."))
+
+        producer = threading.Thread(target=produce, name="compress-to-sftp")
+        if self.session("Send to SFTP") is None:
+            return
+        producer.start()
+        try:
+            self.receive(tgz_name_, pipe)
         finally:
-            if self.sftp is not None:
-                self.close()
+            producer.join()
 
-    def archival_check(self):
+    def receive(self, tgz_name_, pipe, resumable=False):
         """
-        Check and remove old tgz files depending on the time to save files.
+        Upload archive read from a pipe, while another thread writes it. If
+        upload fails, pipe is aborted to stop the writer.
 
         Parameters
         ----------
+        tgz_name_: string
+            name of archive on sftp server.
+        pipe: BoundedPipe
+            pipe archive is read from.
+        resumable: boolean, optional
+            True if archive will be sent again from a local file after a
+            failure: .part file is then kept and failure is only a warning.
+            Default is False, .part file is removed.
+
+        Returns
+        -------
+        boolean:
+            True if archive was uploaded, else False.
+
+        """
+
+        sftp = self.session("Send to SFTP")
+        if sftp is None:
+            pipe.abort(ConnectionError("Connection to sftp is not done."))
+            return False
+
+        path = self.layout.path(tgz_name_)
+        try:
+            self.record_partial(tgz_name_)
+            self.layout.prepare(sftp, tgz_name_)
+            result = self.engine.upload(sftp, pipe, path)
+
+            self.log_email_matt.info(
+                "Send to SFTP",
+                "{} bytes streamed in {:.2f} s ({:.2f} MB/s).".format(
+                    result["bytes"], result["seconds"], result["speed"]
+                ),
+            )
+            self.record_upload(tgz_name_, result["bytes"])
+            return True
+
+        except (IOError, OSError, EOFError, pysftp.SSHException) as err:
+            # Stop writer if upload failed.
+            pipe.abort(err)
+            if resumable:
+                self.log_email_matt.warning(
+                    "Send to SFTP", "Streamed upload failed, resuming. " + str(err)
+                )
+                return False
+
+            self.log_email_matt.error(
+                "Send to SFTP", "Streamed upload failed. " + str(err)
+            )
+
+            def remove_partial(sftp):
+                if sftp.exists(path + PART_EXTENSION):
+                    sftp.remove(path + PART_EXTENSION)
+
+            try:
+                self.run("Send to SFTP", remove_partial)
+            except (IOError, OSError, EOFError, pysftp.SSHException):
+                return False
+            self.update_manifest(
+                lambda sftp: self.manifest.forget(
+                    [self.layout.relative(tgz_name_) + PART_EXTENSION]
+                )
+            )
+            return False
+
+    def send_chunks(self, recipe_name_, open_dump):
+        """
+        Upload chunks of dump missing on server, then recipe of the day.
+
+        Parameters
+        ----------
+        recipe_name_: string
+            name of recipe on sftp server.
+        open_dump: function
+            returns dump file object and its tar entry.
 
         Returns
         -------
@@ -191,26 +569,120 @@ class SFTPServer:
 
         """
 
+        def backup(sftp):
+            # Chunks already sent are skipped if it is run again.
+            store = ChunkStore(sftp, self.folder, self.log_email_matt, self.dedup_options)
+            self.layout.prepare(sftp, recipe_name_)
+            source, entry = open_dump()
+            with source:
+                return store.backup(source, entry, self.layout.relative(recipe_name_))
+
         try:
             if self.sftp is not None:
-                # Current directory.
-                files = self.sftp.listdir("TSE-INFORX")
-                dead_line = (
-                    datetime.datetime.today()
-                    - datetime.timedelta(days=self.time_to_save)
-                ).date()
-                for file in files:
+                result = self.run("Send to SFTP", backup)
+
+                self.log_email_matt.info(
+                    "Send to SFTP",
+                    "{} new chunk(s) of {}, {} bytes sent for a {} bytes dump.".format(
+                        result["new"], result["chunks"], result["output"], result["input"]
+                    ),
+                )
+                self.record_upload(recipe_name_)
+
+        except (IOError, OSError) as err:
+            self.log_email_matt.error("Send to SFTP", "Chunks not sent. " + str(err))
+
+        except (KeyError, ValueError) as err:
+            self.log_email_matt.error("Send to SFTP", "Dump not read. " + str(err))
+
+    def archival_check(self):
+        """
+        Check and remove old archives depending on the time to save files and
+        retention policies. Archives of every codec (.tgz, .tbz2, .txz, .tzst)
+        and recipes of dedup mode are managed, chunks of removed recipes are
+        removed too. An archive still needed by a retained delta archive is
+        kept. Flat folder is listed once. In dated layout, only partitions
+        reaching retention horizon are listed, older ones are dropped whole.
+        Expired files are removed in a batch, then partitions left empty.
+        With a manifest, archives are known from it and nothing is listed.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        today = datetime.datetime.today().date()
+
+        def expire(sftp):
+            # Paths are relative to remote folder.
+            if self.manifest is not None:
+                self.load_manifest(sftp)
+                index, dropped = self.manifest.index(), []
+            else:
+                # Listed once with sizes.
+                index, dropped = self.layout.index(sftp, self.retention.horizon(today))
+            # Bases of retained delta archives are kept.
+            expired = self.retention.expired(index, today)
+            paths = [posixpath.join(self.folder, file) for file in expired]
+            for partition in dropped:
+                folder = posixpath.join(self.folder, partition)
+                paths.extend(posixpath.join(folder, file) for file in sftp.listdir(folder))
+            failed = RemoveBatch(self.engine.channel(sftp), self.delete_window).remove(paths)
+            # Files already missing, such as ones removed by hand, are gone.
+            failed = [path for path in failed if sftp.exists(path)]
+            self.log_email_matt.info(
+                "SFTP archival",
+                "{} file(s) removed.".format(len(paths) - len(failed)),
+            )
+            if failed:
+                self.log_email_matt.warning(
+                    "SFTP archival", "{} file(s) could not be removed.".format(len(failed))
+                )
+
+            if self.layout.layout == DATED:
+                # Partitions still holding files are not removed.
+                emptied = set(dropped)
+                emptied.update(posixpath.dirname(file) for file in expired)
+                for partition in sorted(emptied) + sorted(
+                        {posixpath.dirname(path) for path in emptied}):
                     try:
-                        date = datetime.datetime.strptime(
-                            file.replace(".tgz", ""), "%Y%d%m"
-                        ).date()
-                        if date < dead_line:
-                            self.sftp.remove(file)
-                        self.log_email_matt.info("SFTP archival")
-
-                    except ValueError:
+                        sftp.rmdir(posixpath.join(self.folder, partition))
+                    except IOError:
                         pass
 
+            if sftp.exists(posixpath.join(self.folder, CHUNK_FOLDER)):
+                # Recipes that could not be removed still use their chunks.
+                expired = set(expired)
+                recipes = [
+                    file
+                    for entry in index.values()
+                    for file in entry["files"]
+                    if file not in expired
+                ] + [posixpath.relpath(path, self.folder) for path in failed]
+                recipes = [file for file in recipes if file.endswith(RECIPE_EXTENSION)]
+                removed = ChunkStore(sftp, self.folder, self.log_email_matt).collect_garbage(
+                    recipes
+                )
+                if removed > 0:
+                    self.log_email_matt.info(
+                        "SFTP archival", str(removed) + " unused chunk(s) removed."
+                    )
+
+            failed = set(failed)
+            return [
+                posixpath.relpath(path, self.folder) for path in paths if path not in failed
+            ]
+
+        try:
+            if self.sftp is not None:
+                removed = self.run("SFTP archival", expire)
+                if removed:
+                    self.update_manifest(lambda sftp: self.manifest.forget(removed))
+
             else:
                 self.log_email_matt.error(
                     "SFTP archival", "Connection to sftp is not done."
@@ -232,16 +704,126 @@ class SFTPServer:
                 self.log_email_matt.warning(
                     "ACK", "Checking ACK not done because dates do not correspond."
                 )
-                self.close()
 
-    def check_file_ack(self, tgz_name_):
+    def load_manifest(self, sftp):
         """
-        Check if sftp server has tgz file.
+        Read manifest once, write it again if it was rebuilt from a listing.
+
+        Parameters
+        ----------
+        sftp: pysftp.Connection
+            connection to sftp server.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if not self.manifest.load(sftp):
+            self.manifest.save(self.engine.channel(sftp))
+            self.log_email_matt.info(
+                "Manifest",
+                "Manifest rebuilt, {} archive(s) listed.".format(len(self.manifest.entries)),
+            )
+
+    def update_manifest(self, change):
+        """
+        Apply a change to manifest and write it to server. A manifest that
+        could not be written is removed, next run rebuilds it from a listing.
+
+        Parameters
+        ----------
+        change: function
+            takes the connection to sftp server, changes manifest.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if self.manifest is None or self.sftp is None:
+            return
+
+        def update(sftp):
+            self.load_manifest(sftp)
+            change(sftp)
+            self.manifest.save(self.engine.channel(sftp))
+
+        try:
+            self.run("Manifest", update)
+        except (IOError, OSError, EOFError, pysftp.SSHException) as err:
+            self.log_email_matt.warning(
+                "Manifest", "Manifest not updated, it will be rebuilt. " + str(err)
+            )
+            self.manifest.entries = None
+            try:
+                self.run("Manifest", lambda sftp: sftp.remove(self.manifest.path))
+            except (IOError, OSError, EOFError, pysftp.SSHException):
+                pass
+
+    def record_partial(self, tgz_name_):
+        """
+        Record an upload starting in manifest, under name of its .part file,
+        so retention removes it if upload is never completed. Entry is
+        dropped once archive is recorded.
+
+        Parameters
+        ----------
+        tgz_name_: string
+            name of archive being sent.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        relative = self.layout.relative(tgz_name_) + PART_EXTENSION
+        self.update_manifest(lambda sftp: self.manifest.record(relative))
+
+    def record_upload(self, tgz_name_, size=None):
+        """
+        Record an archive sent in manifest, entry of an archive sent again
+        is replaced. SHA-256 is recorded once checked by ACK.
+
+        Parameters
+        ----------
+        tgz_name_: string
+            name of archive or recipe sent.
+        size: int, optional
+            size of archive. Default is None, it is then read on server.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        relative = self.layout.relative(tgz_name_)
+
+        def change(sftp):
+            previous = self.manifest.entries.get(relative, {})
+            self.manifest.forget([relative])
+            self.manifest.record(
+                relative,
+                size=sftp.stat(self.layout.path(tgz_name_)).st_size if size is None else size,
+                sidecar=previous.get("sidecar"),
+            )
+
+        self.update_manifest(change)
+
+    def check_file_ack(self, tgz_name_, digest=None):
+        """
+        Check sftp server has whole tgz file, on the session used to send it.
 
         Parameters
         ----------
         tgz_name_: string
             tar.gz filename to check ack on sftp server.
+        digest: dict, optional
+            "sha256" and "size" of archive sent. Default is None.
 
         Returns
         -------
@@ -249,17 +831,13 @@ class SFTPServer:
 
         """
 
-        sftp = None
         try:
-            sftp = self.connect("ACK")
-            with sftp.cd("TSE-INFORX"):
-                files = sftp.listdir()
-                for file in files:
-                    if file == tgz_name_:
-                        self.log_email_matt.info("ACK", "Tar file sent to sftp server.")
-                        return
-            self.log_email_matt.error("ACK", "Tar file is not on server.")
-            sftp.close()
+            if self.run("ACK", lambda sftp: self.verify_file(sftp, tgz_name_, digest)):
+                self.update_manifest(
+                    lambda sftp: self.manifest.record(
+                        self.layout.relative(tgz_name_), sha256=digest["sha256"], sidecar=True
+                    )
+                )
 
         except pysftp.ConnectionException:
             self.log_email_matt.error("ACK" "Connection error occured.")
@@ -273,16 +851,310 @@ class SFTPServer:
         except pysftp.SSHException:
             self.log_email_matt.error("ACK", "Unknow SSH error occured.")
 
+        except ConnectionError as err:
+            self.log_email_matt.error("ACK", str(err))
+
         except IOError:
             self.log_email_matt.error("ACK", "Remote path does not exists.")
 
-        finally:
-            if sftp is not None:
-                sftp.close()
+    def verify_file(self, sftp, tgz_name_, digest):
+        """
+        Check size of tgz file with a remote stat and write its SHA-256,
+        computed while compressing, as a sidecar next to it. When server
+        allows exec, SHA-256 of remote file is computed by server and
+        compared before sidecar is written, else sidecar is read back and
+        removed if it does not match. Without digest, only presence
+        of file is checked. File is found at its known path, folder is not
+        listed.
+
+        Parameters
+        ----------
+        sftp: pysftp.Connection
+            connection to sftp server.
+        tgz_name_: string
+            tar.gz filename to check on sftp server.
+        digest: dict
+            "sha256" and "size" of archive sent, or None.
+
+        Returns
+        -------
+        boolean:
+            True if size and SHA-256 were checked, else False.
+
+        """
+
+        path = self.layout.path(tgz_name_)
+        if digest is None:
+            if sftp.exists(path):
+                self.log_email_matt.info("ACK", "Tar file sent to sftp server.")
+                return False
+            self.log_email_matt.error("ACK", "Tar file is not on server.")
+            return False
+
+        size = sftp.stat(path).st_size
+        if size != digest["size"]:
+            self.log_email_matt.error(
+                "ACK",
+                "Tar file on server has {} bytes instead of {}.".format(
+                    size, digest["size"]
+                ),
+            )
+            return False
+
+        # Same format as sha256sum, checkable with sha256sum -c.
+        sidecar = (digest["sha256"] + "  " + posixpath.basename(path) + "\n").encode()
+
+        remote = self.server_sha256(sftp, path)
+        if remote is None:
+            check = "sidecar"
+            sftp.putfo(io.BytesIO(sidecar), path + CHECKSUM_EXTENSION)
+            buffer = io.BytesIO()
+            sftp.getfo(path + CHECKSUM_EXTENSION, buffer)
+            remote = buffer.getvalue().decode().partition(" ")[0]
+        else:
+            check = "server-side hash"
+
+        if remote != digest["sha256"]:
+            # Sidecar is only kept next to a checked archive, manifest
+            # would not know it.
+            if check == "sidecar":
+                try:
+                    sftp.remove(path + CHECKSUM_EXTENSION)
+                except IOError:
+                    pass
+            self.log_email_matt.error(
+                "ACK", "SHA-256 of tar file on server does not match."
+            )
+            return False
+
+        if check == "server-side hash":
+            sftp.putfo(io.BytesIO(sidecar), path + CHECKSUM_EXTENSION)
+
+        self.log_email_matt.info(
+            "ACK",
+            "Tar file sent to sftp server, size and SHA-256 checked ("
+            + check
+            + ").",
+        )
+        return True
+
+    def server_sha256(self, sftp, path, size=None):
+        """
+        Ask server to compute SHA-256 of an archive with sha256sum, if exec
+        is allowed on server.
+
+        Parameters
+        ----------
+        sftp: pysftp.Connection
+            connection to sftp server.
+        path: string
+            remote path of archive.
+        size: int, optional
+            only this many first bytes are hashed. Default is None, whole
+            archive is hashed.
+
+        Returns
+        -------
+        string:
+            SHA-256 computed by server, None if it is not available.
+
+        """
+
+        if not self.server_hash:
+            return None
+
+        # Folder and archive names are quoted, a quote in them must not
+        # end up in the command.
+        try:
+            if size is None:
+                lines = sftp.execute("sha256sum " + shlex.quote(path))
+            else:
+                lines = sftp.execute(
+                    "head -c {} {} | sha256sum".format(int(size), shlex.quote(path))
+                )
+        except pysftp.SSHException:
+            return None
+
+        remote = lines[0].decode(errors="replace").partition(" ")[0] if lines else ""
+        if len(remote) != 64 or any(c not in "0123456789abcdef" for c in remote):
+            return None
+        return remote
+
+    def restore(self, tgz_name_, path):
+        """
+        Get an archive from its known path on server, or rebuild dump of a
+        recipe from its chunks. Archive is downloaded with prefetched reads,
+        then checked against SHA-256 recorded in manifest. A delta archive is
+        downloaded with every archive of its chain, back to the full one,
+        then its dump is rebuilt by applying each delta in turn.
+
+        Parameters
+        ----------
+        tgz_name_: string
+            local name of archive or recipe, dates written YYYYDDMM.
+        path: string
+            local path archive is written to, or dump of a recipe or delta
+            archive.
+
+        Returns
+        -------
+        boolean:
+            True if archive was restored, else False.
+
+        """
+
+        def download(sftp, name, local):
+            result = self.engine.download(sftp, self.layout.path(name), local)
+
+            if self.manifest is not None:
+                self.load_manifest(sftp)
+                entry = self.manifest.entries.get(self.layout.relative(name), {})
+                if entry.get("sha256") is not None:
+                    digest = hashlib.sha256()
+                    local.seek(0)
+                    for block in iter(lambda: local.read(self.engine.block_size), b""):
+                        digest.update(block)
+                    if digest.hexdigest() != entry["sha256"]:
+                        raise ValueError("SHA-256 of " + name + " does not match manifest.")
+            return result
+
+        def rebuild(sftp):
+            archives = []
+            results = []
+            folder = os.path.dirname(os.path.abspath(path))
+            try:
+                name = tgz_name_
+                while name is not None:
+                    archives.append(tempfile.TemporaryFile(dir=folder))
+                    results.append(download(sftp, name, archives[-1]))
+                    archives[-1].seek(0)
+                    base = archive_base(archives[-1])
+                    # Each base is older than its delta, chain ends.
+                    if base is not None and (
+                            archive_date(base) is None
+                            or archive_date(base)[0] >= archive_date(name)[0]):
+                        raise ValueError("Base " + base + " of " + name + " is not older.")
+                    name = base
+
+                with open(path, "wb") as local:
+                    rebuild_dump(archives[::-1], local, folder)
+            finally:
+                for archive in archives:
+                    archive.close()
+
+            self.log_email_matt.info(
+                "Restore", "Dump rebuilt from {} delta(s).".format(len(archives) - 1)
+            )
+            return TransferEngine.figures(
+                sum(result["bytes"] for result in results),
+                sum(result["seconds"] for result in results),
+            )
+
+        def fetch(sftp):
+            if tgz_name_.endswith(RECIPE_EXTENSION):
+                ChunkStore(sftp, self.folder, self.log_email_matt).restore(
+                    self.layout.relative(tgz_name_), path
+                )
+                return None
+            dates = archive_date(tgz_name_)
+            if dates is not None and dates[1] is not None:
+                return rebuild(sftp)
+            with open(path, "w+b") as local:
+                return download(sftp, tgz_name_, local)
+
+        try:
+            result = self.run("Restore", fetch)
+        except (IOError, OSError, EOFError, tarfile.TarError, pysftp.SSHException,
+                ValueError, KeyError) as err:
+            self.log_email_matt.error("Restore", "Archive not restored. " + str(err))
+            # Partial local file is not left behind.
+            if os.path.exists(path):
+                os.remove(path)
+            return False
+
+        if result is None:
+            self.log_email_matt.info("Restore", "Dump rebuilt from its chunks.")
+        else:
+            self.engine.report("Restore", result)
+        return True
+
+    def migrate_layout(self):
+        """
+        Move archives, recipes, sidecars and unfinished uploads of a flat
+        folder into partitions of dated layout, with sortable names. Files
+        are renamed on server, not copied, sidecars are written again with
+        new archive name. Manifest is rebuilt with new paths. Run it once,
+        before first run in dated layout.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if self.layout.layout != DATED:
+            self.log_email_matt.warning(
+                "Layout migration", "Layout is not dated, nothing to migrate."
+            )
+            return
+
+        def migrate(sftp):
+            client = self.engine.channel(sftp)
+            known = None
+            if self.manifest is not None:
+                known = self.manifest.read(sftp)
+            moved = 0
+            for name in sftp.listdir(self.folder):
+                # Only names of flat layout are migrated, partitions are not.
+                if file_date(name) is None:
+                    continue
+                source = posixpath.join(self.folder, name)
+                target = self.layout.path(name)
+                self.layout.prepare(client, name)
+                if name.endswith(CHECKSUM_EXTENSION):
+                    buffer = io.BytesIO()
+                    client.getfo(source, buffer)
+                    digest = buffer.getvalue().decode().partition(" ")[0]
+                    archive = posixpath.basename(target[:-len(CHECKSUM_EXTENSION)])
+                    client.putfo(io.BytesIO((digest + "  " + archive + "\n").encode()), target)
+                    client.remove(source)
+                else:
+                    TransferEngine.publish(client, source, target)
+                moved += 1
+
+            if self.manifest is not None:
+                # Checksums recorded under flat names are kept.
+                self.manifest.rebuild(
+                    sftp,
+                    {
+                        self.layout.relative(path): entry
+                        for path, entry in (known or {}).items()
+                    },
+                )
+                self.manifest.save(client)
+            return moved
+
+        try:
+            if self.sftp is not None:
+                moved = self.run("Layout migration", migrate)
+                self.log_email_matt.info(
+                    "Layout migration", "{} file(s) moved to dated layout.".format(moved)
+                )
+            else:
+                self.log_email_matt.error(
+                    "Layout migration", "Connection to sftp is not done."
+                )
+
+        except (IOError, OSError, EOFError, pysftp.SSHException) as err:
+            self.log_email_matt.error("Layout migration", "Migration stopped. " + str(err))
 
     def close(self):
         """
-        Close sftp connection if this one is still opened.
+        Close sftp connection if this one is still opened. A live session is
+        given back to pool instead, for next run of daemon.
 
         Parameters
         ----------
@@ -293,5 +1165,30 @@ class SFTPServer:
 
         """
 
+        self.engine.close()
         if self.sftp is not None:
-            self.sftp.close()
+            if self.pool is not None and self.alive(self.sftp):
+                self.pool.release(("sftp", self.ip_sftp, self.user, self.pswd), self.sftp)
+            else:
+                self.sftp.close()
+            self.sftp = None
+
+    def report(self):
+        """
+        Log number of connections to sftp server and time spent connecting.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.log_email_matt.info(
+            "SFTP connection",
+            "{} connection(s), {:.2f} s spent connecting.".format(
+                self.connections, self.connect_seconds
+            ),
+        )
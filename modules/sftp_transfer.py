@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 09:12:44 2026
+
+-- Tunable sftp transfer engine --
+
+Transfers go through their own SFTP channel, opened on the session transport
+with a configurable window and packet size. Writes are pipelined: many write
+requests are in flight at once instead of waiting for each acknowledgement,
+and reads prefetch ahead, so throughput is bounded by window size over round
+trip time instead of packet size over round trip time.
+
+Uploads are written to a .part file, renamed to their final name once
+complete, so a file with final name is always whole. An upload run again
+resumes from the size of its .part file, once its prefix is checked.
+
+@author: Julien
+"""
+
+import hashlib
+import time
+import paramiko
+
+
+# Extension of archive while it is uploaded, renamed once complete.
+PART_EXTENSION = ".part"
+
+# Extension of checksum sidecar written next to each archive on server.
+CHECKSUM_EXTENSION = ".sha256"
+
+# SSH channel window in bytes, in flight data before waiting for the server.
+DEFAULT_WINDOW_SIZE = 16 * 1024 * 1024
+
+# Largest SSH packet in bytes.
+DEFAULT_MAX_PACKET_SIZE = 32 * 1024
+
+# Bytes read from local file and written to remote file at once.
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+# Buffer of remote file object in bytes.
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+# Prefetched data is read one request at a time, larger reads of a
+# prefetched file are much slower in paramiko.
+PREFETCH_READ_SIZE = paramiko.SFTPFile.MAX_REQUEST_SIZE
+
+
+class TransferEngine:
+    """
+    Class to upload and download files on sftp server with tuned transfer
+    settings, and to measure throughput of each transfer.
+
+    Attributes
+    ----------
+    log_email_matt: LogEmailMattermost
+        Object to manage all logs.
+    window_size: int
+        SSH channel window in bytes.
+    max_packet_size: int
+        Largest SSH packet in bytes.
+    block_size: int
+        Bytes read and written at once.
+    buffer_size: int
+        Buffer of remote file object in bytes.
+    pipelined: boolean
+        True to send writes without waiting for each acknowledgement, and to
+        prefetch reads.
+    resume: boolean
+        True to resume an upload from its .part file.
+    client: paramiko.SFTPClient
+        Channel used for transfers, opened on session transport.
+
+    Methods
+    -------
+    channel(sftp):
+        Get transfer channel on transport of a session.
+    upload(sftp, fileobj, remote_path, resume=False, prefix_hash=None):
+        Write a local file object to a remote file.
+    resume_offset(client, part_path, fileobj, prefix_hash):
+        Get size of a .part file that matches local file.
+    publish(client, part_path, remote_path):
+        Rename a complete .part file to its final name.
+    download(sftp, remote_path, fileobj):
+        Read a remote file into a local file object.
+    figures(size, seconds):
+        Build figures of a transfer.
+    report(action, result):
+        Log throughput of a transfer.
+    close():
+        Close transfer channel.
+
+    """
+
+    def __init__(self, logging, options=None):
+        """
+        Constructor of the TransferEngine class.
+
+        Parameters
+        ----------
+        logging: logging object
+            object to manage logs
+        options: dict, optional
+            transfer options "window-size", "max-packet-size", "block-size",
+            "buffer-size", "pipelined" and "resume".
+            Default is None, defaults are then used.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if options is None:
+            options = {}
+
+        self.log_email_matt = logging
+        self.window_size = options.get("window-size", DEFAULT_WINDOW_SIZE)
+        self.max_packet_size = options.get("max-packet-size", DEFAULT_MAX_PACKET_SIZE)
+        self.block_size = options.get("block-size", DEFAULT_BLOCK_SIZE)
+        self.buffer_size = options.get("buffer-size", DEFAULT_BUFFER_SIZE)
+        self.pipelined = options.get("pipelined", True)
+        self.resume = options.get("resume", True)
+        self.client = None
+
+    def channel(self, sftp):
+        """
+        Get transfer channel on transport of a session, it is opened again
+        if session was reconnected.
+
+        Parameters
+        ----------
+        sftp: pysftp.Connection
+            session to sftp server.
+
+        Returns
+        -------
+        paramiko.SFTPClient:
+            Transfer channel.
+
+        """
+
+        transport = sftp.sftp_client.get_channel().get_transport()
+        if self.client is not None:
+            current = self.client.get_channel()
+            if not current.closed and current.get_transport() is transport:
+                return self.client
+            self.close()
+
+        self.client = paramiko.SFTPClient.from_transport(
+            transport,
+            window_size=self.window_size,
+            max_packet_size=self.max_packet_size,
+        )
+        return self.client
+
+    def upload(self, sftp, fileobj, remote_path, resume=False, prefix_hash=None):
+        """
+        Write a local file object to a .part remote file, check its size,
+        then rename it to remote path.
+
+        Parameters
+        ----------
+        sftp: pysftp.Connection
+            session to sftp server.
+        fileobj: file object
+            data to send, read block by block.
+        remote_path: string
+            path of remote file, relative to login folder.
+        resume: boolean, optional
+            True to resume from .part file left by a failed upload, file
+            object must then be seekable. Default is False.
+        prefix_hash: function, optional
+            takes a size, returns SHA-256 of that many first bytes of .part
+            file computed by server, or None. Default is None.
+
+        Returns
+        -------
+        dict:
+            "bytes" sent, "seconds", "speed" in MB/s and "resumed", bytes
+            already on server.
+
+        Raises
+        ------
+        IOError
+            If remote file could not be written or has a wrong size.
+
+        """
+
+        start = time.monotonic()
+        client = self.channel(sftp)
+        part_path = remote_path + PART_EXTENSION
+        offset = 0
+        if resume and self.resume:
+            offset = self.resume_offset(client, part_path, fileobj, prefix_hash)
+
+        size = offset
+        with client.open(part_path, "r+b" if offset else "wb", self.buffer_size) as remote:
+            remote.set_pipelined(self.pipelined)
+            remote.seek(offset)
+            while True:
+                data = fileobj.read(self.block_size)
+                if not data:
+                    break
+                remote.write(data)
+                size += len(data)
+
+        # Closing remote file waited for every pending write.
+        remote_size = client.stat(part_path).st_size
+        if remote_size != size:
+            raise IOError(
+                "size mismatch in upload: {} != {}".format(remote_size, size)
+            )
+        self.publish(client, part_path, remote_path)
+
+        result = self.figures(size - offset, time.monotonic() - start)
+        result["resumed"] = offset
+        return result
+
+    def resume_offset(self, client, part_path, fileobj, prefix_hash):
+        """
+        Get size of a .part file left by a failed upload if it is a prefix
+        of local file, file object is then positioned after it. SHA-256 of
+        prefix is computed by server if it can, else .part file is read back
+        and hashed, which is still cheaper than sending it again on links
+        with a slower upload.
+
+        Parameters
+        ----------
+        client: paramiko.SFTPClient
+            transfer channel.
+        part_path: string
+            path of .part file.
+        fileobj: file object
+            local file, seekable.
+        prefix_hash: function
+            takes a size, returns SHA-256 of prefix computed by server, or
+            None.
+
+        Returns
+        -------
+        int:
+            Bytes already on server, 0 to upload whole file.
+
+        """
+
+        try:
+            part_size = client.stat(part_path).st_size
+        except IOError:
+            return 0
+
+        local = hashlib.sha256()
+        fileobj.seek(0)
+        remaining = part_size
+        while remaining > 0:
+            data = fileobj.read(min(self.block_size, remaining))
+            if not data:
+                break
+            local.update(data)
+            remaining -= len(data)
+
+        match = False
+        if part_size > 0 and remaining == 0:
+            remote = prefix_hash(part_size) if prefix_hash is not None else None
+            if remote is None:
+                digest = hashlib.sha256()
+                remaining = part_size
+                with client.open(part_path, "rb", self.buffer_size) as part:
+                    part.prefetch(part_size)
+                    while remaining > 0:
+                        data = part.read(min(PREFETCH_READ_SIZE, remaining))
+                        if not data:
+                            break
+                        digest.update(data)
+                        remaining -= len(data)
+                remote = digest.hexdigest()
+            match = remote == local.hexdigest()
+
+        if not match:
+            fileobj.seek(0)
+            return 0
+        return part_size
+
+    @staticmethod
+    def publish(client, part_path, remote_path):
+        """
+        Rename a complete .part file to its final name, replacing any file
+        with that name. Rename is atomic on servers with posix-rename.
+
+        Parameters
+        ----------
+        client: paramiko.SFTPClient
+            transfer channel.
+        part_path: string
+            path of .part file.
+        remote_path: string
+            final path.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        try:
+            client.posix_rename(part_path, remote_path)
+        except IOError:
+            # Plain rename fails if target exists.
+            try:
+                client.remove(remote_path)
+            except IOError:
+                pass
+            client.rename(part_path, remote_path)
+
+    def download(self, sftp, remote_path, fileobj):
+        """
+        Read a remote file into a local file object, reads are prefetched.
+
+        Parameters
+        ----------
+        sftp: pysftp.Connection
+            session to sftp server.
+        remote_path: string
+            path of remote file, relative to login folder.
+        fileobj: file object
+            file object data is written to.
+
+        Returns
+        -------
+        dict:
+            "bytes" received, "seconds" and "speed" in MB/s.
+
+        """
+
+        start = time.monotonic()
+        size = 0
+        with self.channel(sftp).open(remote_path, "rb", self.buffer_size) as remote:
+            read_size = self.block_size
+            if self.pipelined:
+                remote.prefetch()
+                read_size = PREFETCH_READ_SIZE
+            while True:
+                data = remote.read(read_size)
+                if not data:
+                    break
+                fileobj.write(data)
+                size += len(data)
+
+        return self.figures(size, time.monotonic() - start)
+
+    @staticmethod
+    def figures(size, seconds):
+        """
+        Build figures of a transfer.
+
+        Parameters
+        ----------
+        size: int
+            Bytes transferred.
+        seconds: float
+            Duration of transfer.
+
+        Returns
+        -------
+        dict:
+            "bytes", "seconds" and "speed" in MB/s.
+
+        """
+
+        speed = size / seconds / (1024 * 1024) if seconds > 0 else 0.0
+        return {"bytes": size, "seconds": seconds, "speed": speed}
+
+    def report(self, action, result):
+        """
+        Log throughput of a transfer.
+
+        Parameters
+        ----------
+        action: string
+            Current action written in logs.
+        result: dict
+            Figures returned by upload or download.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        message = "{} bytes in {:.2f} s ({:.2f} MB/s).".format(
+            result["bytes"], result["seconds"], result["speed"]
+        )
+        if result.get("resumed"):
+            message += " Resumed after {} bytes already on server.".format(
+                result["resumed"]
+            )
+        self.log_email_matt.info(action, message)
+
+    def close(self):
+        """
+        Close transfer channel, session is left open.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if self.client is not None:
+            self.client.close()
+            self.client = None
@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 25 14:06:31 2026
+
+-- Pipeline of stages --
+
+Items, such as backup jobs, go through stages connected by bounded queues. An
+event loop moves items from stage to stage, blocking work of each stage runs
+in a thread of an executor, so stages of different items overlap: one item
+downloads while another compresses and a third uploads. A full queue holds
+previous stage back. Each stage measures how busy its workers were, how long
+items waited in its queue and how deep it got, to tune workers and queues.
+
+@author: Julien
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Stage:
+    """
+    Class of one stage of a pipeline.
+
+    Attributes
+    ----------
+    name: string
+        Stage name.
+    function: function
+        Blocking work of stage, takes an item, returns it for next stage or
+        None if item is done.
+    workers: int
+        Items worked on at the same time.
+    queue_size: int
+        Items waiting for stage at most.
+    queue: asyncio.Queue
+        Items waiting for stage, with the time they were queued.
+    items: int
+        Items worked on.
+    busy: float
+        Time spent working, in seconds, summed over workers.
+    blocked: float
+        Time workers waited for room in queue of next stage, in seconds.
+    waited: float
+        Time items waited in queue, in seconds.
+    depth_max: int
+        Deepest queue seen.
+    depth_sum: int
+        Sum of queue depths seen when items were queued.
+
+    Methods
+    -------
+    metrics(elapsed):
+        Get figures of stage.
+
+    """
+
+    def __init__(self, name, function, workers=1, queue_size=1):
+        """
+        Constructor of the Stage class.
+
+        Parameters
+        ----------
+        name: string
+            stage name.
+        function: function
+            blocking work of stage, takes an item, returns it for next stage
+            or None if item is done.
+        workers: int, optional
+            items worked on at the same time. Default is 1.
+        queue_size: int, optional
+            items waiting for stage at most. Default is 1.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.name = name
+        self.function = function
+        self.workers = max(workers, 1)
+        self.queue_size = max(queue_size, 1)
+        self.queue = None
+        self.items = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.waited = 0.0
+        self.depth_max = 0
+        self.depth_sum = 0
+
+    def metrics(self, elapsed):
+        """
+        Get figures of stage.
+
+        Parameters
+        ----------
+        elapsed: float
+            Duration of run, in seconds.
+
+        Returns
+        -------
+        dict:
+            "items", "utilisation" of workers (0 to 1), "blocked" and mean
+            "wait" in seconds, "depth-max" and "depth-mean" of queue.
+
+        """
+
+        return {
+            "items": self.items,
+            "utilisation": self.busy / (self.workers * elapsed) if elapsed > 0 else 0.0,
+            "blocked": self.blocked,
+            "wait": self.waited / self.items if self.items else 0.0,
+            "depth-max": self.depth_max,
+            "depth-mean": self.depth_sum / self.items if self.items else 0.0,
+        }
+
+
+class StagePipeline:
+    """
+    Class to run items through stages connected by bounded queues.
+
+    Attributes
+    ----------
+    log_email_matt: LogEmailMattermost
+        Object to manage all logs.
+    stages: list
+        Stage of each step, in order.
+    in_flight: int
+        Items in pipeline at the same time at most.
+    on_error: function
+        Called with stage name, item and exception when work of a stage
+        raised, item is then done.
+    results: list
+        Items that went through every stage.
+    elapsed: float
+        Duration of last run, in seconds.
+    remaining: int
+        Items not done yet.
+    finished: asyncio.Event
+        Set once every item is done.
+    admission: asyncio.Semaphore
+        Bounds items in pipeline.
+
+    Methods
+    -------
+    run(items):
+        Run items through every stage.
+    feed(items, executor):
+        Run pipeline in event loop.
+    consume(index, executor):
+        Work on items of a stage.
+    fail(name, item, err):
+        Hand an exception of a stage to on_error.
+    put(index, item):
+        Queue an item for a stage.
+    done():
+        Count an item done.
+    metrics():
+        Get figures of every stage.
+    report():
+        Log figures of every stage.
+
+    """
+
+    def __init__(self, stages, logging, in_flight=None, on_error=None):
+        """
+        Constructor of the StagePipeline class.
+
+        Parameters
+        ----------
+        stages: list
+            Stage of each step, in order.
+        logging: logging object
+            object to manage logs
+        in_flight: int, optional
+            items in pipeline at the same time at most. Default is None, as
+            many as stages can work on and queue.
+        on_error: function, optional
+            called with stage name, item and exception when work of a stage
+            raised. Default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.log_email_matt = logging
+        self.stages = stages
+        if in_flight is None:
+            in_flight = sum(stage.workers + stage.queue_size for stage in stages)
+        self.in_flight = max(in_flight, 1)
+        self.on_error = on_error
+        self.results = []
+        self.elapsed = 0.0
+        self.remaining = 0
+        self.finished = None
+        self.admission = None
+
+    def run(self, items):
+        """
+        Run items through every stage, blocking work runs in threads.
+
+        Parameters
+        ----------
+        items: list
+            Items given to first stage.
+
+        Returns
+        -------
+        list:
+            Items that went through every stage.
+
+        """
+
+        self.results = []
+        start = time.monotonic()
+        workers = sum(stage.workers for stage in self.stages)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stage") as executor:
+            asyncio.run(self.feed(list(items), executor))
+        self.elapsed = time.monotonic() - start
+        return self.results
+
+    async def feed(self, items, executor):
+        """
+        Start workers of every stage, give items to first stage as room is
+        made, then wait for every item to be done.
+
+        Parameters
+        ----------
+        items: list
+            Items given to first stage.
+        executor: concurrent.futures.Executor
+            executor blocking work runs in.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        for stage in self.stages:
+            stage.queue = asyncio.Queue(stage.queue_size)
+        self.remaining = len(items)
+        self.finished = asyncio.Event()
+        self.admission = asyncio.Semaphore(self.in_flight)
+
+        workers = [
+            asyncio.ensure_future(self.consume(index, executor))
+            for index, stage in enumerate(self.stages)
+            for _ in range(stage.workers)
+        ]
+        try:
+            for item in items:
+                await self.admission.acquire()
+                await self.put(0, item)
+            if items:
+                await self.finished.wait()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def consume(self, index, executor):
+        """
+        Work on items of a stage, one at a time, then give them to next
+        stage.
+
+        Parameters
+        ----------
+        index: int
+            Index of stage.
+        executor: concurrent.futures.Executor
+            executor blocking work runs in.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        stage = self.stages[index]
+        loop = asyncio.get_running_loop()
+        while True:
+            item, queued = await stage.queue.get()
+            start = time.monotonic()
+            stage.waited += start - queued
+            result = None
+            try:
+                result = await loop.run_in_executor(executor, stage.function, item)
+            except Exception as err:  # pylint: disable=W0703
+                # Other items go on.
+                self.fail(stage.name, item, err)
+            finally:
+                stage.busy += time.monotonic() - start
+                stage.items += 1
+                # Item is done unless it goes to next stage, even if worker
+                # is cancelled, so that run never waits for it.
+                if result is None:
+                    self.done()
+                elif index == len(self.stages) - 1:
+                    self.results.append(result)
+                    self.done()
+
+            if result is not None and index < len(self.stages) - 1:
+                start = time.monotonic()
+                await self.put(index + 1, result)
+                stage.blocked += time.monotonic() - start
+
+    def fail(self, name, item, err):
+        """
+        Hand an exception of a stage to on_error. An exception of on_error
+        itself is logged, worker goes on.
+
+        Parameters
+        ----------
+        name: string
+            Name of stage.
+        item: object
+            Item stage worked on.
+        err: Exception
+            Exception raised by stage.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if self.on_error is None:
+            return
+        try:
+            self.on_error(name, item, err)
+        except Exception as error:  # pylint: disable=W0703
+            self.log_email_matt.error(
+                "Pipeline",
+                "Error of " + name + " stage could not be handled. " + repr(error),
+            )
+
+    async def put(self, index, item):
+        """
+        Queue an item for a stage, wait for room if queue is full.
+
+        Parameters
+        ----------
+        index: int
+            Index of stage.
+        item: object
+            Item.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        stage = self.stages[index]
+        await stage.queue.put((item, time.monotonic()))
+        depth = stage.queue.qsize()
+        stage.depth_max = max(stage.depth_max, depth)
+        stage.depth_sum += depth
+
+    def done(self):
+        """
+        Count an item done, let next one in.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.remaining -= 1
+        self.admission.release()
+        if self.remaining == 0:
+            self.finished.set()
+
+    def metrics(self):
+        """
+        Get figures of every stage of last run.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        dict:
+            Figures of each stage by name, see Stage.metrics.
+
+        """
+
+        return {stage.name: stage.metrics(self.elapsed) for stage in self.stages}
+
+    def report(self):
+        """
+        Log figures of every stage of last run.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        for name, figures in self.metrics().items():
+            self.log_email_matt.info(
+                "Pipeline",
+                "{}: {} item(s), {:.0%} busy, {:.2f} s blocked, queue depth "
+                "max {} mean {:.1f}, {:.2f} s mean wait.".format(
+                    name,
+                    figures["items"],
+                    figures["utilisation"],
+                    figures["blocked"],
+                    figures["depth-max"],
+                    figures["depth-mean"],
+                    figures["wait"],
+                ),
+            )
+        self.log_email_matt.info(
+            "Pipeline", "{} item(s) done in {:.2f} s.".format(len(self.results), self.elapsed)
+        )
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 08:21:47 2026
+
+-- Bounded in-memory pipes between threads --
+
+@author: Julien
+"""
+
+import threading
+from collections import deque
+
+
+# Bytes buffered between writer and reader by default (8 MiB).
+DEFAULT_PIPE_SIZE = 8 * 1024 * 1024
+
+
+class BoundedPipe:
+    """
+    File-like pipe between a writer thread and a reader thread. Writer blocks
+    while buffer is full, so memory use stays bounded and the slowest side
+    sets the pace. A failure on one side is raised on the other one.
+
+    Attributes
+    ----------
+    max_size: int
+        Bytes buffered before writer blocks.
+    chunks: deque
+        Buffered data, in order.
+    size: int
+        Number of bytes buffered.
+    closed: boolean
+        True once writer closed pipe, reader then gets end of file.
+    error: Exception
+        Failure of one side, raised on the other side.
+    condition: threading.Condition
+        Synchronise writer and reader.
+    written: int
+        Number of bytes written to pipe.
+
+    Methods
+    -------
+    write(data):
+        Buffer data, block while buffer is full.
+    flush():
+        Nothing to do, data is available to reader once written.
+    close():
+        End of data, reader gets end of file once buffer is empty.
+    abort(error):
+        Stop both sides because of a failure.
+    read(size=-1):
+        Get buffered data, block while buffer is empty.
+
+    """
+
+    def __init__(self, max_size=DEFAULT_PIPE_SIZE):
+        """
+        Constructor of the BoundedPipe class.
+
+        Parameters
+        ----------
+        max_size: int, optional
+            bytes buffered before writer blocks. Default is 8 MiB.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.max_size = max_size
+        self.chunks = deque()
+        self.size = 0
+        self.closed = False
+        self.error = None
+        self.condition = threading.Condition()
+        self.written = 0
+
+    def write(self, data):
+        """
+        Buffer data, block while buffer is full.
+
+        Parameters
+        ----------
+        data: bytes
+            Data to send to reader.
+
+        Returns
+        -------
+        int:
+            Number of bytes written.
+
+        Raises
+        ------
+        OSError
+            If reader failed.
+
+        """
+
+        with self.condition:
+            while self.size >= self.max_size and self.error is None:
+                self.condition.wait()
+            if self.error is not None:
+                raise OSError("Pipe reader failed: " + str(self.error))
+            if data:
+                self.chunks.append(bytes(data))
+                self.size += len(data)
+                self.written += len(data)
+                self.condition.notify_all()
+        return len(data)
+
+    def flush(self):
+        """
+        Nothing to do, data is available to reader once written.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+    def close(self):
+        """
+        End of data, reader gets end of file once buffer is empty.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def abort(self, error):
+        """
+        Stop both sides because of a failure.
+
+        Parameters
+        ----------
+        error: Exception
+            Failure raised on the other side.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        with self.condition:
+            self.error = error
+            self.condition.notify_all()
+
+    def read(self, size=-1):
+        """
+        Get buffered data, block while buffer is empty. Reading 0 bytes
+        returns at once.
+
+        Parameters
+        ----------
+        size: int, optional
+            Maximum number of bytes to read. Default is -1, every buffered
+            byte is read.
+
+        Returns
+        -------
+        bytes:
+            Data read, empty at end of file or if size is 0.
+
+        Raises
+        ------
+        OSError
+            If writer failed.
+
+        """
+
+        with self.condition:
+            if size == 0:
+                if self.error is not None:
+                    raise OSError("Pipe writer failed: " + str(self.error))
+                # Nothing is asked: pipe is neither waited for nor drained.
+                return b""
+
+            while not self.chunks and not self.closed and self.error is None:
+                self.condition.wait()
+            if self.error is not None:
+                raise OSError("Pipe writer failed: " + str(self.error))
+            if not self.chunks:
+                return b""
+
+            data = bytearray()
+            while self.chunks and (size < 0 or len(data) < size):
+                chunk = self.chunks.popleft()
+                if size >= 0 and len(data) + len(chunk) > size:
+                    # Put back what does not fit.
+                    cut = size - len(data)
+                    self.chunks.appendleft(chunk[cut:])
+                    chunk = chunk[:cut]
+                data += chunk
+
+            self.size -= len(data)
+            self.condition.notify_all()
+            return bytes(data)
+
+
+class TeePipe:
+    """
+    File-like writer copying data into several pipes, so one producer feeds
+    several readers. A pipe whose reader failed is dropped, the others go on.
+
+    Attributes
+    ----------
+    pipes: list
+        Pipes still written to.
+    written: int
+        Number of bytes written.
+
+    Methods
+    -------
+    write(data):
+        Write data into every pipe.
+    flush():
+        Nothing to do, data is available to readers once written.
+    close():
+        End of data for every pipe.
+    abort(error):
+        Stop every reader because of a failure.
+
+    """
+
+    def __init__(self, pipes):
+        """
+        Constructor of the TeePipe class.
+
+        Parameters
+        ----------
+        pipes: list
+            pipes to write to, one per reader
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.pipes = list(pipes)
+        self.written = 0
+
+    def write(self, data):
+        """
+        Write data into every pipe, slowest reader sets the pace.
+
+        Parameters
+        ----------
+        data: bytes
+            Data to send to readers.
+
+        Returns
+        -------
+        int:
+            Number of bytes written.
+
+        Raises
+        ------
+        OSError
+            If every reader failed.
+
+        """
+
+        for pipe in list(self.pipes):
+            try:
+                pipe.write(data)
+            except OSError:
+                self.pipes.remove(pipe)
+        if not self.pipes:
+            raise OSError("Every pipe reader failed.")
+        self.written += len(data)
+        return len(data)
+
+    def flush(self):
+        """
+        Nothing to do, data is available to readers once written.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+    def close(self):
+        """
+        End of data for every pipe.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        for pipe in self.pipes:
+            pipe.close()
+
+    def abort(self, error):
+        """
+        Stop every reader because of a failure.
+
+        Parameters
+        ----------
+        error: Exception
+            Failure raised on readers.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        for pipe in self.pipes:
+            pipe.abort(error)
@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 17:45:09 2026
+
+-- SQL dump split by table, compressed in parallel with a table index --
+
+Dump is cut at table boundaries (CREATE TABLE, INSERT INTO...) into parts of
+at most one block. Each part is a tar entry <dump>.d/<nnnn>-<table>/<nnnnnn>.sql
+compressed as an independent member, so tables are compressed in parallel
+and one table can be read back alone. Last member is the table index
+<dump>.d/index.json, with the end of tar archive. Joining every part in name
+order gives back the dump.
+
+@author: Julien
+"""
+
+import contextlib
+import io
+import json
+import os
+import re
+import tarfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, BrokenExecutor
+from modules.compressor import Compressor, CountingFile
+from modules.compression_codecs import CODECS, CODEC_ERRORS
+
+
+# Statements starting a table section, name is the first group.
+TABLE_STATEMENT = re.compile(
+    rb"^(?:DROP TABLE(?: IF EXISTS)?|CREATE TABLE(?: IF NOT EXISTS)?"
+    rb"|INSERT INTO|LOCK TABLES|COPY)\s+[`\"]?([^`\"\s(;]+)"
+)
+
+# Section of statements found before the first table.
+HEADER_SECTION = "_header"
+
+# Bytes read from end of archive to find index, grown until it is found.
+INDEX_TAIL_SIZE = 1024 * 1024
+
+
+def split_tables(source, block_size):
+    """
+    Cut a SQL dump at table boundaries, in parts of at most one block.
+
+    Parameters
+    ----------
+    source: file object
+        Dump to cut, read line by line.
+    block_size: int
+        Maximum size of a part, longer lines are cut too.
+
+    Returns
+    -------
+    generator:
+        Table name and part, as bytes. A new section starts when table
+        name changes.
+
+    """
+
+    table = HEADER_SECTION
+    part = bytearray()
+    while True:
+        line = source.readline(block_size)
+        if not line:
+            break
+        match = TABLE_STATEMENT.match(line)
+        if match is not None:
+            name = match.group(1).decode("utf-8", "replace")
+            if name != table:
+                if part:
+                    yield table, bytes(part)
+                    part = bytearray()
+                table = name
+        if len(part) + len(line) > block_size and part:
+            yield table, bytes(part)
+            part = bytearray()
+        part += line
+    if part:
+        yield table, bytes(part)
+
+
+def read_index(fileobj, codec):
+    """
+    Find and read table index at end of an archive. Index is the last
+    compressed member, it is found by trying every codec magic number of
+    archive tail from its end.
+
+    Parameters
+    ----------
+    fileobj: file object
+        Archive, seekable.
+    codec: string
+        Codec of archive, key of compression_codecs.CODECS.
+
+    Returns
+    -------
+    dict:
+        Table index, None if archive has none.
+
+    """
+
+    decompress = CODECS[codec]["decompress"]
+    magic = CODECS[codec]["magic"]
+    length = fileobj.seek(0, io.SEEK_END)
+
+    tail_size = INDEX_TAIL_SIZE
+    while True:
+        start = max(0, length - tail_size)
+        fileobj.seek(start)
+        tail = fileobj.read()
+        position = tail.rfind(magic)
+        while position >= 0:
+            try:
+                raw = decompress(tail[position:])
+                with tarfile.open(fileobj=io.BytesIO(raw)) as index:
+                    member = index.next()
+                    if member is not None and member.name.endswith("/index.json"):
+                        data = json.loads(index.extractfile(member).read())
+                        return data
+            except (ValueError, tarfile.TarError) + CODEC_ERRORS:
+                pass
+            position = tail.rfind(magic, 0, position)
+
+        if start == 0:
+            return None
+        tail_size *= 4
+
+
+def restore_table(fileobj, codec, table, target):
+    """
+    Write back one table of an archive without decompressing the others.
+
+    Parameters
+    ----------
+    fileobj: file object
+        Archive, seekable.
+    codec: string
+        Codec of archive, key of compression_codecs.CODECS.
+    table: string
+        Table name.
+    target: file object
+        Statements of table are written to it.
+
+    Returns
+    -------
+    int:
+        Number of sections of table found.
+
+    """
+
+    index = read_index(fileobj, codec)
+    if index is None:
+        return 0
+
+    found = 0
+    for section in index["sections"]:
+        if section["table"] != table:
+            continue
+        fileobj.seek(section["offset"])
+        raw = CODECS[codec]["decompress"](fileobj.read(section["length"]))
+        with tarfile.open(fileobj=io.BytesIO(raw)) as parts:
+            for part in parts:
+                target.write(parts.extractfile(part).read())
+        found += 1
+    return found
+
+
+class TableCompressor(Compressor):
+    """
+    Compressor splitting a SQL dump by table. Parts of tables are compressed
+    in parallel as independent members, a table index ends the archive.
+
+    Methods
+    -------
+    compress(source, entry, target):
+        Write dump split by table as a compressed tar archive.
+    report(result):
+        Log figures of a compression and number of table sections.
+    tar_entry(name, data, mtime):
+        Build tar header, data and padding of one part.
+
+    """
+
+    def compress(self, source, entry, target):
+        """
+        Write dump split by table as a compressed tar archive.
+
+        Parameters
+        ----------
+        source: file object
+            Dump to compress, read line by line.
+        entry: tarfile.TarInfo
+            Tar entry of dump, its name prefixes parts.
+        target: string or file object
+            Path of archive to create, it is removed if compression fails.
+            Or file object archive is written to, it is left open.
+
+        Returns
+        -------
+        dict:
+            Figures of Compressor.compress, plus "tables", number of sections.
+
+        """
+
+        start = time.monotonic()
+        result = {
+            "input": 0,
+            "output": 0,
+            "ratio": 0.0,
+            "seconds": 0.0,
+            "speed": 0.0,
+            "sha256": None,
+            "error": None,
+            "tables": 0,
+        }
+
+        compress_block = CODECS[self.codec]["block"]
+        folder = entry.name + ".d/"
+        sections = []
+        pool = None
+        writer = None
+        try:
+            if isinstance(target, str):
+                output = open(target, "wb")
+            else:
+                output = contextlib.nullcontext(target)
+            with output as archive_file:
+                writer = CountingFile(archive_file, digest=True)
+                if self.workers > 1:
+                    pool = ProcessPoolExecutor(max_workers=self.workers)
+                pending = deque()
+
+                def write_oldest():
+                    future, section = pending.popleft()
+                    data = future.result() if pool is not None else future
+                    if section is not None:
+                        section["offset"] = writer.count
+                    writer.write(data)
+
+                def submit(data, section):
+                    if pool is not None:
+                        pending.append((pool.submit(compress_block, data, self.level), section))
+                    else:
+                        pending.append((compress_block(data, self.level), section))
+                    while len(pending) >= 2 * self.workers:
+                        write_oldest()
+
+                table = None
+                part_number = 0
+                tar_size = 0
+                for name, part in split_tables(source, self.block_size):
+                    new_section = None
+                    if name != table:
+                        table = name
+                        part_number = 0
+                        new_section = {
+                            "table": name,
+                            "member": "{}{:04d}-{}".format(
+                                folder, len(sections), re.sub(r"[^\w.-]", "_", name)
+                            ),
+                            "size": 0,
+                            "parts": 0,
+                        }
+                        sections.append(new_section)
+                    section = sections[-1]
+                    data = self.tar_entry(
+                        "{}/{:06d}.sql".format(section["member"], part_number),
+                        part,
+                        entry.mtime,
+                    )
+                    submit(data, new_section)
+                    part_number += 1
+                    section["size"] += len(part)
+                    section["parts"] += 1
+                    result["input"] += len(part)
+                    tar_size += len(data)
+
+                while pending:
+                    write_oldest()
+
+                # Compressed length of each section, from offset of next one.
+                for current, following in zip(sections, sections[1:] + [None]):
+                    end = following["offset"] if following else writer.count
+                    current["length"] = end - current["offset"]
+
+                index = json.dumps(
+                    {"file": entry.name, "codec": self.codec, "sections": sections},
+                    indent="\t",
+                ).encode()
+                data = self.tar_entry(folder + "index.json", index, entry.mtime)
+                tar_size += len(data)
+                # End of archive, then padding to a whole tar record.
+                data += bytes(
+                    2 * tarfile.BLOCKSIZE
+                    + -(tar_size + 2 * tarfile.BLOCKSIZE) % tarfile.RECORDSIZE
+                )
+                writer.write(compress_block(data, self.level))
+
+        except (tarfile.TarError, BrokenExecutor) + CODEC_ERRORS as err:
+            result["error"] = str(err) or type(err).__name__
+            if isinstance(target, str) and os.path.exists(target):
+                os.remove(target)
+
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        result["tables"] = len(sections)
+        if result["error"] is None and writer is not None:
+            result["output"] = writer.count
+            result["sha256"] = writer.sha256.hexdigest()
+        result["seconds"] = time.monotonic() - start
+        if result["input"] > 0:
+            result["ratio"] = result["output"] / result["input"]
+        if result["seconds"] > 0:
+            result["speed"] = result["input"] / result["seconds"] / (1024 * 1024)
+
+        return result
+
+    def report(self, result):
+        """
+        Log figures of a compression and number of table sections.
+
+        Parameters
+        ----------
+        result: dict
+            Figures returned by compress.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        super().report(result)
+        self.log_email_matt.info(
+            "Compress file", str(result["tables"]) + " table section(s) indexed."
+        )
+
+    @staticmethod
+    def tar_entry(name, data, mtime):
+        """
+        Build tar header, data and padding of one part.
+
+        Parameters
+        ----------
+        name: string
+            Path of part in archive.
+        data: bytes
+            Content of part.
+        mtime: float
+            Modification time of part.
+
+        Returns
+        -------
+        bytes:
+            Tar entry.
+
+        """
+
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = mtime
+        info.mode = 0o644
+        return info.tobuf() + data + bytes(-len(data) % tarfile.BLOCKSIZE)
@@ -0,0 +1,793 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 09:12:40 2026
+
+-- Zip downloading from web server --
+
+@author: Julien
+"""
+
+import hashlib
+import http.client
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import psutil
+import urllib3
+
+
+# Default size of each chunk written to spool file (1 MiB).
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# Validators of the last downloaded zip, kept between runs.
+DEFAULT_STATE_FILE = "download_state.json"
+
+# Number of times an interrupted transfer is resumed in the same run.
+DEFAULT_RETRIES = 3
+
+# Journal of partial file is updated every time this many bytes were written.
+JOURNAL_INTERVAL = 16 * 1024 * 1024
+
+# Size of each Range request in segmented mode (16 MiB).
+DEFAULT_SEGMENT_SIZE = 16 * 1024 * 1024
+
+# Errors after which a transfer can be resumed where it stopped. A body cut
+# short raises IncompleteRead, urllib3 one subclasses http.client one.
+RESUMABLE_ERRORS = (
+    urllib3.exceptions.ProtocolError,
+    urllib3.exceptions.ReadTimeoutError,
+    urllib3.exceptions.ConnectTimeoutError,
+    http.client.IncompleteRead,
+)
+
+
+def resident_memory():
+    """
+    Get resident memory of the current process.
+
+    Parameters
+    ----------
+
+    Returns
+    -------
+    int:
+        Resident memory in bytes, None if it cannot be measured.
+
+    """
+
+    try:
+        return psutil.Process().memory_info().rss
+    except psutil.Error:
+        return None
+
+
+class ZipDownload:
+    """
+    Class to download zip file from web server to a local spool file,
+    chunk by chunk, so memory use does not depend on zip size.
+
+    Zip is first written to a partial file (path + ".part") described by a
+    small journal (URL, validator, bytes received). If transfer is
+    interrupted, it is resumed from the journal with a Range request, in the
+    same run or in the next one.
+
+    In segmented mode, partial file is preallocated and several Range
+    requests run concurrently, each one writing its segment at its offset.
+
+    Attributes
+    ----------
+    log_email_matt: LogEmailMattermost
+        Object to manage all logs.
+    http: urllib3.PoolManager
+        Requester used to talk to web server.
+    url: string
+        URL of zip file on web server.
+    path: string
+        Local path of spool file zip is written to.
+    part_path: string
+        Local path of partial file while zip is being downloaded.
+    journal_path: string
+        Local path of journal describing partial file.
+    chunk_size: int
+        Size in bytes of each chunk read from response and written to disk.
+    state_path: string
+        Local file validators (ETag, Last-Modified, Content-Length) are stored in.
+    resume: boolean
+        True if interrupted transfers are resumed instead of restarted.
+    retries: int
+        Number of times an interrupted transfer is resumed in the same run.
+    segments: int
+        Number of concurrent Range requests, 1 disables segmented mode.
+    segment_size: int
+        Size in bytes of each Range request in segmented mode.
+    validators: dict
+        Validators sent back by web server for the last downloaded zip.
+    not_modified: boolean
+        True if web server answered zip did not change since last run.
+    received: int
+        Number of bytes received from web server during this run.
+    sha256: string
+        SHA-256 of zip computed while it was received, None if zip was
+        received in several parts (resumed or segmented).
+    peak_memory: int
+        Highest resident memory in bytes sampled while zip was received,
+        None if it cannot be measured. Lifetime peak of process would
+        include earlier jobs and stages.
+
+    Methods
+    -------
+    download():
+        Download zip to spool file, resuming interrupted transfers.
+    fetch():
+        Send one GET request and stream its body to partial file.
+    fetch_segmented():
+        Download zip with several concurrent Range requests.
+    fetch_segment(first, last, validator):
+        Download one segment of zip and write it at its offset.
+    conditional_headers():
+        Build headers asking web server to answer 304 if zip did not change.
+    read_validators(headers, total):
+        Keep validators of zip sent back by web server.
+    load_journal():
+        Get journal of partial file if it belongs to the same URL.
+    save_journal(size, validator, done=None):
+        Store how many bytes of partial file are valid.
+    discard_partial():
+        Remove partial file and its journal.
+    sample_memory():
+        Keep highest resident memory seen during download.
+    load_state():
+        Get validators stored for this URL on last run.
+    save_state():
+        Store validators of downloaded zip for next run.
+    report(size, elapsed):
+        Log throughput and peak memory of download stage.
+
+    """
+
+    def __init__(self, http, url, path, logging, options=None):
+        """
+        Constructor of the ZipDownload class.
+
+        Parameters
+        ----------
+        http: urllib3.PoolManager
+            requester used to talk to web server
+        url: string
+            URL of zip file on web server
+        path: string
+            local path of spool file
+        logging: logging object
+            object to manage logs
+        options: dict, optional
+            download options such as "chunk-size", "state-file", "resume",
+            "retries", "segments" and "segment-size". Default is None, defaults are then used and
+            conditional requests are disabled.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if options is None:
+            options = {}
+
+        self.log_email_matt = logging
+        self.http = http
+        self.url = url
+        self.path = path
+        self.part_path = path + ".part"
+        self.journal_path = path + ".part.json"
+        self.chunk_size = options.get("chunk-size", DEFAULT_CHUNK_SIZE)
+        self.state_path = options.get("state-file")
+        self.resume = options.get("resume", True)
+        self.retries = options.get("retries", DEFAULT_RETRIES)
+        self.segments = options.get("segments", 1)
+        self.segment_size = options.get("segment-size", DEFAULT_SEGMENT_SIZE)
+        self.validators = {}
+        self.not_modified = False
+        self.received = 0
+        self.sha256 = None
+        self.peak_memory = None
+        # Segments write concurrently to the counters and the journal.
+        self.lock = threading.Lock()
+
+    def download(self):
+        """
+        Download zip to spool file, resuming interrupted transfers.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        int:
+            Size in bytes of spool file, None if zip was not modified since
+            last run.
+
+        Raises
+        ------
+        urllib3.exceptions.ResponseError
+            If zip file was not found on web server.
+        urllib3.exceptions.IncompleteRead
+            If body is still shorter than announced after all retries.
+
+        """
+
+        start = time.monotonic()
+        attempt = 0
+        self.peak_memory = None
+        self.sample_memory()
+
+        while True:
+            try:
+                size = False
+                if self.segments > 1:
+                    size = self.fetch_segmented()
+                # Segmented mode not possible with this web server.
+                if size is False:
+                    size = self.fetch()
+                break
+
+            except RESUMABLE_ERRORS:
+                attempt += 1
+                if not self.resume or attempt > self.retries:
+                    if not self.resume:
+                        self.discard_partial()
+                    raise
+                self.log_email_matt.warning(
+                    "Download ZIP",
+                    "Transfer interrupted, resuming (attempt "
+                    + str(attempt)
+                    + "/"
+                    + str(self.retries)
+                    + ").",
+                )
+
+        if size is None:
+            return None
+
+        # Whole zip received, publish it under its final name.
+        os.replace(self.part_path, self.path)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+        self.report(self.received, time.monotonic() - start)
+        return size
+
+    def fetch(self):
+        """
+        Send one GET request and stream its body to partial file. If a
+        journal exists, only missing bytes are requested.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        int:
+            Size in bytes of partial file, None if zip was not modified since
+            last run.
+
+        Raises
+        ------
+        urllib3.exceptions.ResponseError
+            If zip file was not found on web server.
+        urllib3.exceptions.ProtocolError
+            If transfer was interrupted or answer does not match request.
+
+        """
+
+        headers = self.conditional_headers()
+
+        # Only ask for missing bytes, whole zip is sent back if it changed.
+        offset = 0
+        journal = self.load_journal()
+        if journal is not None:
+            offset = journal["size"]
+            headers["Range"] = "bytes=" + str(offset) + "-"
+            headers["If-Range"] = journal["validator"]
+
+        # Do not preload content, body is read chunk by chunk.
+        req = self.http.request(
+            "GET", self.url, headers=headers, preload_content=False
+        )
+
+        size = offset
+        validator = None
+        try:
+            if req.status == 304:
+                self.not_modified = True
+                self.discard_partial()
+                self.log_email_matt.info(
+                    "Download ZIP", "ZIP not modified since last run."
+                )
+                return None
+
+            if req.status == 416:
+                # Partial file does not match zip anymore, start again.
+                self.discard_partial()
+                raise urllib3.exceptions.ProtocolError("Range not satisfiable.")
+
+            if req.status >= 400:
+                raise urllib3.exceptions.ResponseError()
+
+            total = req.headers.get("Content-Length")
+            if req.status == 206:
+                # Content-Range: bytes <first>-<last>/<total>
+                content_range = req.headers.get("Content-Range", "")
+                if not content_range.startswith("bytes " + str(offset) + "-"):
+                    self.discard_partial()
+                    raise urllib3.exceptions.ProtocolError(
+                        "Unexpected Content-Range: " + content_range
+                    )
+                total = content_range.rpartition("/")[2]
+                if total == "*":
+                    total = None
+            else:
+                # Full body sent back, zip changed or ranges not supported.
+                offset = 0
+                size = 0
+
+            validator = self.read_validators(req.headers, total)
+
+            # Zip is hashed on the fly when it comes in one piece.
+            self.sha256 = None
+            digest = hashlib.sha256() if offset == 0 else None
+
+            with open(self.part_path, "r+b" if offset else "wb") as spool:
+                spool.seek(offset)
+                spool.truncate()
+                journaled = size
+                for chunk in req.stream(self.chunk_size):
+                    spool.write(chunk)
+                    if digest is not None:
+                        digest.update(chunk)
+                    size += len(chunk)
+                    self.received += len(chunk)
+                    self.sample_memory()
+                    if self.resume and size - journaled >= JOURNAL_INTERVAL:
+                        spool.flush()
+                        self.save_journal(size, validator)
+                        journaled = size
+
+        finally:
+            # Remember what has been received so far, even if interrupted.
+            if self.resume and validator is not None and size > 0:
+                self.save_journal(size, validator)
+            req.release_conn()
+
+        # Connection closed before whole body was received.
+        if "content-length" in self.validators:
+            expected = int(self.validators["content-length"])
+            if size != expected:
+                raise urllib3.exceptions.IncompleteRead(size, expected - size)
+
+        if digest is not None:
+            self.sha256 = digest.hexdigest()
+        return size
+
+    def fetch_segmented(self):
+        """
+        Download zip with several concurrent Range requests through the shared
+        pool. Partial file is preallocated, each segment is written at its
+        offset so nothing has to be reassembled afterwards.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        int:
+            Size in bytes of partial file, None if zip was not modified since
+            last run, False if web server can not serve ranges of this zip.
+
+        Raises
+        ------
+        urllib3.exceptions.ResponseError
+            If zip file was not found on web server.
+        urllib3.exceptions.ProtocolError
+            If a segment was interrupted, segments already received are kept.
+
+        """
+
+        req = self.http.request("HEAD", self.url, headers=self.conditional_headers())
+
+        if req.status == 304:
+            self.not_modified = True
+            self.discard_partial()
+            self.log_email_matt.info("Download ZIP", "ZIP not modified since last run.")
+            return None
+
+        if req.status >= 400:
+            raise urllib3.exceptions.ResponseError()
+
+        length = req.headers.get("Content-Length")
+        validator = self.read_validators(req.headers, length)
+        if req.headers.get("Accept-Ranges") != "bytes" or not length or not validator:
+            return False
+        length = int(length)
+
+        # Segments already received by an interrupted run of the same zip.
+        done = set()
+        journal = self.load_journal()
+        if (
+                journal is not None
+                and journal["validator"] == validator
+                and journal.get("length") == length):
+            done = {tuple(segment) for segment in journal.get("done", [])}
+        else:
+            # Preallocate partial file, segments are written in place.
+            with open(self.part_path, "wb") as spool:
+                spool.truncate(length)
+
+        todo = [
+            (first, min(first + self.segment_size, length) - 1)
+            for first in range(0, length, self.segment_size)
+            if (first, min(first + self.segment_size, length) - 1) not in done
+        ]
+
+        rates = []
+        error = None
+        with ThreadPoolExecutor(max_workers=self.segments) as pool:
+            futures = {
+                pool.submit(self.fetch_segment, first, last, validator): (first, last)
+                for first, last in todo
+            }
+            for future in as_completed(futures):
+                try:
+                    rates.append((futures[future], future.result()))
+                    done.add(futures[future])
+                    if self.resume:
+                        self.save_journal(None, validator, sorted(done))
+
+                except RESUMABLE_ERRORS as err:
+                    error = err
+
+        rates.sort()
+        self.log_email_matt.info(
+            "Download ZIP",
+            str(len(rates))
+            + " segment(s) received: "
+            + ", ".join(
+                "{}-{} at {:.2f} MB/s".format(first, last, rate / (1024 * 1024))
+                for (first, last), rate in rates
+            )
+            + ".",
+        )
+
+        if error is not None:
+            raise error
+        return length
+
+    def fetch_segment(self, first, last, validator):
+        """
+        Download one segment of zip and write it at its offset in partial file.
+
+        Parameters
+        ----------
+        first: int
+            Offset of first byte of segment.
+        last: int
+            Offset of last byte of segment.
+        validator: string
+            ETag or Last-Modified of zip, segment is refused if zip changed.
+
+        Returns
+        -------
+        float:
+            Throughput of this segment in bytes/s.
+
+        Raises
+        ------
+        urllib3.exceptions.ProtocolError
+            If segment was interrupted or zip changed on web server.
+
+        """
+
+        start = time.monotonic()
+        req = self.http.request(
+            "GET",
+            self.url,
+            headers={
+                "Range": "bytes=" + str(first) + "-" + str(last),
+                "If-Range": validator,
+            },
+            preload_content=False,
+        )
+
+        position = first
+        try:
+            if req.status != 206 or not req.headers.get("Content-Range", "").startswith(
+                    "bytes " + str(first) + "-" + str(last) + "/"):
+                # Whole zip sent back, it changed since segments started.
+                # Next attempt sees a new validator and starts again.
+                raise urllib3.exceptions.ProtocolError("ZIP changed while downloading.")
+
+            with open(self.part_path, "r+b") as spool:
+                spool.seek(first)
+                for chunk in req.stream(self.chunk_size):
+                    spool.write(chunk)
+                    position += len(chunk)
+                    self.sample_memory()
+
+        finally:
+            with self.lock:
+                self.received += position - first
+            req.release_conn()
+
+        if position != last + 1:
+            raise urllib3.exceptions.IncompleteRead(
+                position - first, last + 1 - position
+            )
+
+        elapsed = time.monotonic() - start
+        return (last + 1 - first) / elapsed if elapsed > 0 else 0.0
+
+    def conditional_headers(self):
+        """
+        Build headers asking web server to answer 304 if zip did not change
+        since last run.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        dict:
+            If-None-Match and If-Modified-Since headers, empty on first run.
+
+        """
+
+        headers = {}
+        state = self.load_state()
+        if "etag" in state:
+            headers["If-None-Match"] = state["etag"]
+        if "last-modified" in state:
+            headers["If-Modified-Since"] = state["last-modified"]
+        return headers
+
+    def read_validators(self, headers, total):
+        """
+        Keep validators of zip sent back by web server, they are sent back on
+        next run once this one succeeded.
+
+        Parameters
+        ----------
+        headers: dict
+            Headers of web server answer.
+        total: string
+            Size in bytes of whole zip, None if unknown.
+
+        Returns
+        -------
+        string:
+            Validator usable with If-Range, None if there is none.
+
+        """
+
+        self.validators = {}
+        for key, header in (("etag", "ETag"), ("last-modified", "Last-Modified")):
+            if headers.get(header):
+                self.validators[key] = headers.get(header)
+        if total:
+            self.validators["content-length"] = total
+
+        # Weak ETags can not be used with If-Range.
+        validator = self.validators.get("etag")
+        if validator is None or validator.startswith("W/"):
+            validator = self.validators.get("last-modified")
+        return validator
+
+    def load_journal(self):
+        """
+        Get journal of partial file if it belongs to the same URL.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        dict:
+            Journal with "url", "validator" and "size" keys ("length" and
+            "done" segments too in segmented mode), None if there is no
+            partial file to resume.
+
+        """
+
+        if not self.resume or not os.path.exists(self.part_path):
+            return None
+
+        try:
+            with open(self.journal_path, "r") as journal_file:
+                journal = json.load(journal_file)
+            if journal["url"] != self.url or not journal["validator"]:
+                raise ValueError()
+            if "done" in journal:
+                return journal
+            # Never trust more bytes than the ones really on disk.
+            journal["size"] = min(
+                int(journal["size"]), os.path.getsize(self.part_path)
+            )
+
+        except (OSError, ValueError, KeyError, TypeError):
+            self.discard_partial()
+            return None
+
+        if journal["size"] <= 0:
+            return None
+        return journal
+
+    def save_journal(self, size, validator, done=None):
+        """
+        Store how many bytes of partial file are valid.
+
+        Parameters
+        ----------
+        size: int
+            Number of bytes written to partial file, None in segmented mode.
+        validator: string
+            ETag or Last-Modified of zip partial file belongs to.
+        done: list, optional
+            Segments (first, last) already written in segmented mode.
+            Default is None.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        journal = {"url": self.url, "validator": validator, "size": size}
+        if done is not None:
+            journal["size"] = 0
+            journal["length"] = int(self.validators["content-length"])
+            journal["done"] = done
+            # A single stream can resume after segments received from offset 0.
+            for first, last in done:
+                if first == journal["size"]:
+                    journal["size"] = last + 1
+        try:
+            with open(self.journal_path + ".tmp", "w") as journal_file:
+                json.dump(journal, journal_file)
+            os.replace(self.journal_path + ".tmp", self.journal_path)
+
+        except OSError:
+            # Without journal, next run only restarts from zero.
+            pass
+
+    def discard_partial(self):
+        """
+        Remove partial file and its journal.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        for path in (self.part_path, self.journal_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def sample_memory(self):
+        """
+        Keep highest resident memory seen during download, sampled once per
+        chunk written.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        current = resident_memory()
+        if current is None:
+            return
+        with self.lock:
+            if self.peak_memory is None or current > self.peak_memory:
+                self.peak_memory = current
+
+    def load_state(self):
+        """
+        Get validators stored for this URL on last run.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        dict:
+            Validators of last downloaded zip, empty if there are none.
+
+        """
+
+        if self.state_path is None or not os.path.exists(self.state_path):
+            return {}
+
+        try:
+            with open(self.state_path, "r") as state_file:
+                return json.load(state_file).get(self.url, {})
+
+        except (OSError, ValueError, AttributeError):
+            # Corrupted state only costs a full download.
+            self.log_email_matt.warning(
+                "Download ZIP", "Download state file unreadable, it is ignored."
+            )
+            return {}
+
+    def save_state(self):
+        """
+        Store validators of downloaded zip for next run.
+
+        Parameters
+        ----------
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if self.state_path is None or not self.validators:
+            return
+
+        states = {}
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, "r") as state_file:
+                    states = json.load(state_file)
+            except (OSError, ValueError):
+                states = {}
+        if not isinstance(states, dict):
+            states = {}
+        states[self.url] = self.validators
+
+        try:
+            # Write next to state file then rename, never leave half a file.
+            with open(self.state_path + ".tmp", "w") as state_file:
+                json.dump(states, state_file, indent="\t")
+            os.replace(self.state_path + ".tmp", self.state_path)
+
+        except OSError:
+            self.log_email_matt.warning(
+                "Download ZIP", "Download state file could not be written."
+            )
+
+    def report(self, size, elapsed):
+        """
+        Log throughput and peak memory of download stage.
+
+        Parameters
+        ----------
+        size: int
+            Number of bytes downloaded.
+        elapsed: float
+            Duration of download in seconds.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        speed = size / elapsed if elapsed > 0 else 0.0
+        message = "{} bytes in {:.2f} s ({:.2f} MB/s)".format(
+            size, elapsed, speed / (1024 * 1024)
+        )
+        if self.peak_memory is not None:
+            message += ", peak memory {:.1f} MB while downloading".format(
+                self.peak_memory / (1024 * 1024)
+            )
+        if self.sha256 is not None:
+            message += ", SHA-256 " + self.sha256
+        self.log_email_matt.info("Download ZIP", message + ".")
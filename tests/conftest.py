@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:05:12 2026
+
+-- Shared fixtures of tests --
+
+Modules are imported from the root of the repository, as scripts do.
+
+@author: Julien
+"""
+
+import os
+import shutil
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class RecordingLog:
+    """
+    Stand-in of LogEmailMattermost keeping messages in memory.
+
+    Attributes
+    ----------
+    messages: list
+        Level, action and message of each log.
+
+    """
+
+    def __init__(self):
+        self.messages = []
+
+    def log(self, level, current_action, message=None):
+        self.messages.append((level, current_action, message))
+
+    def info(self, current_action, message=None):
+        self.log("info", current_action, message)
+
+    def warning(self, current_action, message=None):
+        self.log("warning", current_action, message)
+
+    def error(self, current_action, message=None):
+        self.log("error", current_action, message)
+
+    def critical(self, current_action, message=None):
+        self.log("critical", current_action, message)
+
+    def levels(self, level):
+        """
+        Get messages logged at a level.
+
+        Parameters
+        ----------
+        level: string
+            "info", "warning", "error" or "critical".
+
+        Returns
+        -------
+        list:
+            Action and message of each log.
+
+        """
+
+        return [entry[1:] for entry in self.messages if entry[0] == level]
+
+
+@pytest.fixture
+def log():
+    """
+    Log keeping messages in memory.
+
+    Returns
+    -------
+    RecordingLog:
+        Log.
+
+    """
+
+    return RecordingLog()
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """
+    Serve zip of server from memory, with conditional requests, single
+    Range, suffix Range and If-Range support. A body is cut, connection
+    closed, after the number of bytes taken from cuts of server.
+    """
+
+    def do_HEAD(self):  # pylint: disable=C0103
+        self.answer(head=True)
+
+    def do_GET(self):  # pylint: disable=C0103
+        self.answer(head=False)
+
+    def answer(self, head):
+        data = self.server.data
+        etag = self.server.etag
+        self.server.requests.append(dict(self.headers, method=self.command))
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        spec = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if not self.server.ranges or spec is None or (if_range and if_range != etag):
+            self.send_response(200)
+            body = data
+        else:
+            first, _, last = spec.replace("bytes=", "").partition("-")
+            if not first:
+                first, last = max(len(data) - int(last), 0), len(data) - 1
+            else:
+                first, last = int(first), min(int(last or len(data) - 1), len(data) - 1)
+            body = data[first:last + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes {}-{}/{}".format(first, last, len(data)))
+
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        if self.server.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        if head:
+            return
+        if self.server.cuts:
+            body = body[:self.server.cuts.pop(0)]
+            self.close_connection = True
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=W0221
+        pass
+
+
+@pytest.fixture
+def range_server():
+    """
+    Range server of a zip held in memory, empty until data is set.
+
+    Returns
+    -------
+    ThreadingHTTPServer:
+        Server, zip is in its data attribute, headers of each request in
+        requests.
+
+    """
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    httpd.data = b""
+    httpd.etag = '"v1"'
+    httpd.ranges = True
+    httpd.cuts = []
+    httpd.requests = []
+    httpd.url = "http://127.0.0.1:{}/dump.zip".format(httpd.server_address[1])
+    # Short poll interval, shutdown waits for it.
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class LocalFile:
+    """
+    Local file with the calls of paramiko.SFTPFile modules use.
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+
+    def __getattr__(self, name):
+        return getattr(self.fileobj, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.fileobj.close()
+
+    def set_pipelined(self, pipelined=True):
+        pass
+
+    def prefetch(self, file_size=None):
+        pass
+
+
+class LocalSFTP:
+    """
+    Stand-in of an sftp session backed by a local folder, with the calls of
+    pysftp.Connection and paramiko.SFTPClient modules use.
+
+    Attributes
+    ----------
+    root: string
+        Local folder remote paths are relative to.
+
+    """
+
+    def __init__(self, root):
+        self.root = str(root)
+
+    def local(self, path):
+        return os.path.join(self.root, path)
+
+    def exists(self, path):
+        return os.path.exists(self.local(path))
+
+    def stat(self, path):
+        return os.stat(self.local(path))
+
+    def mkdir(self, path):
+        os.mkdir(self.local(path))
+
+    def makedirs(self, path):
+        os.makedirs(self.local(path), exist_ok=True)
+
+    def rmdir(self, path):
+        os.rmdir(self.local(path))
+
+    def listdir(self, path="."):
+        return sorted(os.listdir(self.local(path)))
+
+    def listdir_attr(self, path="."):
+        return [
+            SimpleNamespace(filename=name, st_size=stat.st_size, st_mtime=stat.st_mtime)
+            for name, stat in (
+                (name, os.stat(os.path.join(self.local(path), name)))
+                for name in self.listdir(path)
+            )
+        ]
+
+    def putfo(self, fileobj, path):
+        with open(self.local(path), "wb") as remote:
+            shutil.copyfileobj(fileobj, remote)
+
+    def getfo(self, path, fileobj):
+        with open(self.local(path), "rb") as remote:
+            shutil.copyfileobj(remote, fileobj)
+
+    def open(self, path, mode="rb", *_):
+        return LocalFile(open(self.local(path), mode))
+
+    def remove(self, path):
+        os.remove(self.local(path))
+
+    def rename(self, source, target):
+        if os.path.exists(self.local(target)):
+            raise IOError("Target exists.")
+        os.rename(self.local(source), self.local(target))
+
+    def posix_rename(self, source, target):
+        os.replace(self.local(source), self.local(target))
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def sftp(tmp_path):
+    """
+    Sftp session on a temporary folder.
+
+    Returns
+    -------
+    LocalSFTP:
+        Session.
+
+    """
+
+    root = tmp_path / "server"
+    root.mkdir()
+    return LocalSFTP(root)
+
+
+@pytest.fixture
+def make_server(sftp, log, monkeypatch):
+    """
+    Build SFTPServer objects whose session is the local sftp fixture: it is
+    given by a pool and transfers go through it instead of a channel of
+    their own.
+
+    Returns
+    -------
+    function:
+        Takes options merged into server infos, returns SFTPServer.
+
+    """
+
+    from modules.sftp_server import SFTPServer
+    from modules.sftp_transfer import TransferEngine
+
+    monkeypatch.setattr(SFTPServer, "alive", staticmethod(lambda session: True))
+    monkeypatch.setattr(TransferEngine, "channel", lambda engine, session: session)
+    pool = SimpleNamespace(
+        acquire=lambda key, alive: sftp, release=lambda key, session: None
+    )
+
+    def make(options=None):
+        infos = {
+            "ip": "127.0.0.1",
+            "user": "backup",
+            "password": "",
+            "time-to-save": 30,
+            "folder": "backup",
+            "server-hash": False,
+            "pool": pool,
+        }
+        infos.update(options or {})
+        return SFTPServer(infos, log, True)
+
+    return make
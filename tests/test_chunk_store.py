@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:48:26 2026
+
+-- Tests of content-defined chunking and chunk store --
+
+@author: Julien
+"""
+
+import io
+import os
+import random
+import shutil
+import tarfile
+import pytest
+from modules.chunk_store import split_chunks, ChunkStore, CHUNK_FOLDER
+from modules.sftp_transfer import PART_EXTENSION
+
+
+MIN_SIZE = 4 * 1024
+AVG_SIZE = 16 * 1024
+MAX_SIZE = 64 * 1024
+
+
+def lines_dump(count, seed=1):
+    """
+    Build a dump of short lines, as plain inserts.
+
+    Parameters
+    ----------
+    count: int
+        Number of lines.
+    seed: int, optional
+        Seed of line contents. Default is 1.
+
+    Returns
+    -------
+    bytes:
+        Dump.
+
+    """
+
+    rnd = random.Random(seed)
+    return b"".join(
+        b"INSERT INTO `t` VALUES (%d,'%s');\n" % (i, rnd.randbytes(30).hex().encode())
+        for i in range(count)
+    )
+
+
+def long_line_dump(size, seed=2):
+    """
+    Build a dump of one extended insert longer than maximum chunk size.
+
+    Parameters
+    ----------
+    size: int
+        Size in bytes of the line.
+    seed: int, optional
+        Seed of line contents. Default is 2.
+
+    Returns
+    -------
+    bytes:
+        Dump.
+
+    """
+
+    rnd = random.Random(seed)
+    return b"INSERT INTO `t` VALUES " + rnd.randbytes(size // 2).hex().encode() + b";\n"
+
+
+def split(data):
+    return list(split_chunks(io.BytesIO(data), MIN_SIZE, AVG_SIZE, MAX_SIZE))
+
+
+def shared(first, second):
+    return len(set(first) & set(second))
+
+
+@pytest.mark.parametrize(
+    "data",
+    [b"", b"one line\n", lines_dump(5000), long_line_dump(MAX_SIZE * 8)],
+    ids=["empty", "one-line", "lines", "long-line"],
+)
+def test_chunks_join_back(data):
+    chunks = split(data)
+    assert b"".join(chunks) == data
+    # A chunk is cut once it reaches maximum size, at the end of a line.
+    longest = max((len(line) for line in data.splitlines(True)), default=0)
+    assert all(len(chunk) < MAX_SIZE + min(longest, MAX_SIZE) for chunk in chunks)
+    assert all(len(chunk) >= MIN_SIZE for chunk in chunks[:-1])
+
+
+def test_chunks_end_at_line_ends():
+    chunks = split(lines_dump(5000))
+    assert len(chunks) > 5
+    assert all(chunk.endswith(b"\n") for chunk in chunks)
+
+
+def test_insertion_keeps_other_chunks():
+    data = lines_dump(20000)
+    chunks = split(data)
+    changed = split(data[:1000] + b"INSERT INTO `t` VALUES (0,'new');\n" + data[1000:])
+    assert shared(chunks, changed) >= len(chunks) - 2
+
+
+def test_long_line_is_cut_by_content():
+    data = long_line_dump(MAX_SIZE * 16)
+    chunks = split(data)
+    # Cuts are not at fixed offsets, they would all move on insertion.
+    assert len({len(chunk) for chunk in chunks}) > 1
+
+    changed = split(data[:100] + b"12345" + data[100:])
+    assert shared(chunks, changed) >= len(chunks) - 3
+
+
+def test_backup_and_restore(log, sftp, tmp_path):
+    data = lines_dump(20000)
+    entry = tarfile.TarInfo("dump.sql")
+    options = {"min-size": MIN_SIZE, "avg-size": AVG_SIZE, "max-size": MAX_SIZE}
+    store = ChunkStore(sftp, ".", log, options)
+
+    first = store.backup(io.BytesIO(data), entry, "20261610.recipe")
+    assert first["input"] == len(data)
+    assert first["new"] == first["chunks"]
+
+    changed = data[:5000] + b"INSERT INTO `t` VALUES (0,'new');\n" + data[5000:]
+    second = store.backup(io.BytesIO(changed), entry, "20261710.recipe")
+    assert second["new"] <= 2
+    assert not any(name.endswith(PART_EXTENSION) for name in sftp.listdir(CHUNK_FOLDER))
+
+    for name, expected in (("20261610.recipe", data), ("20261710.recipe", changed)):
+        path = tmp_path / name
+        store.restore(name, str(path))
+        assert path.read_bytes() == expected
+
+
+def test_garbage_collection_keeps_used_chunks(log, sftp, tmp_path):
+    entry = tarfile.TarInfo("dump.sql")
+    options = {"min-size": MIN_SIZE, "avg-size": AVG_SIZE, "max-size": MAX_SIZE}
+    store = ChunkStore(sftp, ".", log, options)
+    store.backup(io.BytesIO(lines_dump(5000, 1)), entry, "20261610.recipe")
+    data = lines_dump(5000, 2)
+    store.backup(io.BytesIO(data), entry, "20261710.recipe")
+
+    sftp.remove("20261610.recipe")
+    assert store.collect_garbage() > 0
+    store.restore("20261710.recipe", str(tmp_path / "dump.sql"))
+    assert (tmp_path / "dump.sql").read_bytes() == data
+
+
+def test_corrupted_chunk_is_detected(log, sftp, tmp_path):
+    entry = tarfile.TarInfo("dump.sql")
+    store = ChunkStore(sftp, ".", log, {"min-size": MIN_SIZE, "avg-size": AVG_SIZE,
+                                         "max-size": MAX_SIZE, "codec": "gzip"})
+    store.backup(io.BytesIO(lines_dump(2000)), entry, "20261610.recipe")
+    name = sftp.listdir(CHUNK_FOLDER)[0]
+    other = sftp.listdir(CHUNK_FOLDER)[1]
+    shutil.copyfile(sftp.local(os.path.join(CHUNK_FOLDER, other)),
+                    sftp.local(os.path.join(CHUNK_FOLDER, name)))
+
+    with pytest.raises(ValueError):
+        store.restore("20261610.recipe", str(tmp_path / "dump.sql"))
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:31:08 2026
+
+-- Tests of block-parallel compression --
+
+@author: Julien
+"""
+
+import hashlib
+import io
+import lzma
+import tarfile
+import pytest
+from modules import compression_codecs
+from modules.compressor import Compressor
+from modules.compression_codecs import CODECS, CODEC_ERRORS
+
+
+BLOCK_SIZE = 64 * 1024
+
+
+def dump(size):
+    """
+    Build a dump compressing well but not trivially.
+
+    Parameters
+    ----------
+    size: int
+        Size in bytes.
+
+    Returns
+    -------
+    bytes:
+        Dump.
+
+    """
+
+    line = b"INSERT INTO `t` VALUES (%d,'row %d');\n"
+    data = b"".join(line % (i, i * 7) for i in range(size // 30 + 1))
+    return data[:size]
+
+
+def entry(data):
+    info = tarfile.TarInfo("dump.sql")
+    info.size = len(data)
+    info.mtime = 1700000000
+    return info
+
+
+def compress(log, data, workers, codec="gzip"):
+    target = io.BytesIO()
+    compressor = Compressor(
+        log, {"codec": codec, "level": 1, "block-size": BLOCK_SIZE, "workers": workers}
+    )
+    result = compressor.compress(io.BytesIO(data), entry(data), target)
+    assert result["error"] is None
+    return target.getvalue(), result
+
+
+@pytest.mark.parametrize("codec", ["gzip", "bz2", "xz"])
+def test_parallel_archive_reads_back(log, codec):
+    data = dump(10 * BLOCK_SIZE + 123)
+    archive, result = compress(log, data, 3, codec)
+
+    with tarfile.open(fileobj=io.BytesIO(archive), mode="r:*") as tar:
+        assert tar.extractfile("dump.sql").read() == data
+    assert result["input"] == len(data)
+    assert result["output"] == len(archive)
+    assert result["sha256"] == hashlib.sha256(archive).hexdigest()
+
+
+def test_parallel_archive_is_made_of_blocks(log):
+    data = dump(10 * BLOCK_SIZE)
+    archive, _ = compress(log, data, 2)
+
+    # Each block is a gzip member of its own.
+    assert archive.count(CODECS["gzip"]["magic"]) > 1
+    assert CODECS["gzip"]["decompress"](archive)[512:512 + len(data)] == data
+
+
+def test_parallel_archive_does_not_depend_on_workers(log):
+    data = dump(6 * BLOCK_SIZE + 5)
+    assert compress(log, data, 2)[0] == compress(log, data, 4)[0]
+
+
+def test_serial_and_parallel_hold_same_dump(log):
+    data = dump(3 * BLOCK_SIZE)
+    for workers in (1, 2):
+        archive, _ = compress(log, data, workers)
+        with tarfile.open(fileobj=io.BytesIO(archive), mode="r:gz") as tar:
+            assert tar.extractfile("dump.sql").read() == data
+
+
+def test_failed_compression_removes_archive(log, tmp_path):
+    class Failing(io.RawIOBase):
+        def readinto(self, buffer):
+            raise OSError("disk gone")
+
+    target = tmp_path / "dump.tgz"
+    data = dump(BLOCK_SIZE)
+    result = Compressor(log, {"workers": 2, "block-size": BLOCK_SIZE}).compress(
+        Failing(), entry(data), str(target)
+    )
+    assert result["error"] == "disk gone"
+    assert result["sha256"] is None
+    assert not target.exists()
+
+
+def test_codec_error_removes_archive(log, tmp_path, monkeypatch):
+    def failing_writer(fileobj, level, mtime):
+        raise lzma.LZMAError("codec failed")
+
+    monkeypatch.setitem(CODECS["xz"], "writer", failing_writer)
+    target = tmp_path / "dump.txz"
+    data = dump(BLOCK_SIZE)
+    result = Compressor(log, {"codec": "xz"}).compress(io.BytesIO(data), entry(data), str(target))
+    assert result["error"] == "codec failed"
+    assert not target.exists()
+
+
+@pytest.mark.skipif(not CODECS["zstd"]["available"], reason="zstandard is not installed")
+def test_zstd_errors_are_codec_errors():
+    assert compression_codecs.zstandard.ZstdError in CODEC_ERRORS
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 23:12:40 2026
+
+-- Tests of cron schedule --
+
+@author: Julien
+"""
+
+from datetime import datetime
+import pytest
+from modules.cron_schedule import CronSchedule
+
+
+def next_run(expression, moment):
+    return CronSchedule(expression).next_after(moment)
+
+
+@pytest.mark.parametrize(
+    "expression, moment, expected",
+    [
+        # Strictly after, seconds dropped.
+        ("* * * * *", datetime(2026, 10, 18, 12, 30), datetime(2026, 10, 18, 12, 31)),
+        ("* * * * *", datetime(2026, 10, 18, 12, 30, 59, 999), datetime(2026, 10, 18, 12, 31)),
+        ("30 12 * * *", datetime(2026, 10, 18, 12, 30), datetime(2026, 10, 19, 12, 30)),
+        ("30 12 * * *", datetime(2026, 10, 18, 12, 29, 59), datetime(2026, 10, 18, 12, 30)),
+        # Rollover of hour, day, month and year.
+        ("0 * * * *", datetime(2026, 10, 18, 23, 0), datetime(2026, 10, 19, 0, 0)),
+        ("15 3 * * *", datetime(2026, 10, 31, 4, 0), datetime(2026, 11, 1, 3, 15)),
+        ("0 0 1 1 *", datetime(2026, 12, 31, 23, 59), datetime(2027, 1, 1, 0, 0)),
+        ("0 0 31 * *", datetime(2026, 10, 31, 0, 0), datetime(2026, 12, 31, 0, 0)),
+        # Leap day only.
+        ("0 0 29 2 *", datetime(2026, 10, 18), datetime(2028, 2, 29, 0, 0)),
+        # Steps, ranges, lists and names.
+        ("*/20 * * * *", datetime(2026, 10, 18, 12, 41), datetime(2026, 10, 18, 13, 0)),
+        ("5/20 * * * *", datetime(2026, 10, 18, 12, 46), datetime(2026, 10, 18, 13, 5)),
+        ("0 9-17/4 * * *", datetime(2026, 10, 18, 13, 1), datetime(2026, 10, 18, 17, 0)),
+        ("0 0 * jan,jul *", datetime(2026, 10, 18), datetime(2027, 1, 1, 0, 0)),
+        ("0 8 * * mon-fri", datetime(2026, 10, 17, 9, 0), datetime(2026, 10, 19, 8, 0)),
+    ],
+)
+def test_next_after(expression, moment, expected):
+    assert next_run(expression, moment) == expected
+
+
+def test_sunday_is_0_or_7():
+    # 18/10/2026 is a sunday.
+    moment = datetime(2026, 10, 14)
+    assert next_run("0 0 * * 7", moment) == next_run("0 0 * * 0", moment)
+    assert next_run("0 0 * * sun", moment) == datetime(2026, 10, 18, 0, 0)
+    assert CronSchedule("0 0 * * 5-7").weekdays == {0, 5, 6}
+
+
+def test_day_of_month_or_day_of_week():
+    # Both restricted: the 1st of month or any monday.
+    schedule = CronSchedule("0 0 1 * mon")
+    assert schedule.next_after(datetime(2026, 10, 18)) == datetime(2026, 10, 19, 0, 0)
+    assert schedule.next_after(datetime(2026, 10, 26)) == datetime(2026, 11, 1, 0, 0)
+    # Only one restricted: both must match, day of week "*" matches all.
+    assert next_run("0 0 1 * *", datetime(2026, 10, 18)) == datetime(2026, 11, 1, 0, 0)
+    assert next_run("0 0 * * mon", datetime(2026, 10, 20)) == datetime(2026, 10, 26, 0, 0)
+    # A step from "*" counts as unrestricted.
+    assert next_run("0 0 */2 * mon", datetime(2026, 10, 18)) == datetime(2026, 10, 19, 0, 0)
+    assert next_run("0 0 */2 * mon", datetime(2026, 10, 19)) == datetime(2026, 11, 9, 0, 0)
+
+
+@pytest.mark.parametrize(
+    "alias, expression",
+    [
+        ("@hourly", "0 * * * *"),
+        ("@daily", "0 0 * * *"),
+        ("@midnight", "0 0 * * *"),
+        ("@weekly", "0 0 * * 0"),
+        ("@monthly", "0 0 1 * *"),
+        ("@YEARLY", "0 0 1 1 *"),
+        ("@annually", "0 0 1 1 *"),
+    ],
+)
+def test_aliases(alias, expression):
+    moment = datetime(2026, 10, 18, 12, 30)
+    assert next_run(alias, moment) == next_run(expression, moment)
+
+
+def test_schedule_never_running():
+    assert next_run("0 0 30 2 *", datetime(2026, 10, 18)) is None
+    assert next_run("0 0 31 4,6,9,11 *", datetime(2026, 10, 18)) is None
+
+
+def test_matches_a_minute():
+    schedule = CronSchedule("30 2 * * *")
+    assert schedule.matches(datetime(2026, 10, 18, 2, 30, 45))
+    assert not schedule.matches(datetime(2026, 10, 18, 2, 31))
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        "",
+        "* * * *",
+        "* * * * * *",
+        "@often",
+        "60 * * * *",
+        "* 24 * * *",
+        "* * 0 * *",
+        "* * * 13 *",
+        "* * * * 8",
+        "*/0 * * * *",
+        "10-5 * * * *",
+        "* * * foo *",
+        "a * * * *",
+    ],
+)
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
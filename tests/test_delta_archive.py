@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 22:06:47 2026
+
+-- Tests of delta archives and their chains --
+
+@author: Julien
+"""
+
+import datetime
+import io
+import random
+import tarfile
+import pytest
+from modules.compressor import Compressor
+from modules.delta_archive import (
+    archive_base,
+    archive_date,
+    apply_delta,
+    file_date,
+    rebuild_dump,
+    DeltaArchive,
+)
+
+
+OPTIONS = {"min-size": 1024, "avg-size": 4096, "max-size": 16384}
+
+
+def dumps(days, seed=3):
+    """
+    Build dumps of following days, each one changing a few lines of the
+    previous one.
+
+    Parameters
+    ----------
+    days: int
+        Number of dumps.
+    seed: int, optional
+        Seed of contents. Default is 3.
+
+    Returns
+    -------
+    list:
+        Dumps, as bytes.
+
+    """
+
+    rnd = random.Random(seed)
+    lines = [
+        b"INSERT INTO `t` VALUES (%d,'%s');\n" % (i, rnd.randbytes(20).hex().encode())
+        for i in range(3000)
+    ]
+    result = []
+    for day in range(days):
+        for _ in range(3):
+            lines[rnd.randrange(len(lines))] = b"UPDATE day %d;\n" % day
+        lines.insert(rnd.randrange(len(lines)), b"INSERT day %d;\n" % day)
+        result.append(b"".join(lines))
+    return result
+
+
+def make_chain(log, tmp_path, data, codec="gzip"):
+    """
+    Archive dumps of following days as a full archive then deltas.
+
+    Parameters
+    ----------
+    log: RecordingLog
+        Log.
+    tmp_path: pathlib.Path
+        Folder of delta state.
+    data: list
+        Dumps, oldest first.
+    codec: string, optional
+        Codec of archives. Default is "gzip".
+
+    Returns
+    -------
+    list:
+        Name and content of each archive.
+
+    """
+
+    options = dict(OPTIONS, **{"state-file": str(tmp_path / "delta-state.json")})
+    extension = {"gzip": ".tgz", "bz2": ".tbz2", "xz": ".txz"}[codec]
+    first = datetime.date(2026, 10, 10)
+    archives = []
+    for day, dump in enumerate(data):
+        delta = DeltaArchive(log, options)
+        today = first + datetime.timedelta(days=day)
+        base = delta.base_date(today)
+        name = today.strftime("%Y%d%m")
+        if base is not None:
+            name += ".from-" + base.strftime("%Y%d%m")
+        name += extension
+
+        entry = tarfile.TarInfo("dump.sql")
+        entry.size = len(dump)
+        target = io.BytesIO()
+        result = delta.compress(
+            Compressor(log, {"codec": codec, "level": 1}), io.BytesIO(dump), entry, target, name
+        )
+        assert result["error"] is None
+        delta.save_state()
+        archives.append((name, target.getvalue()))
+    return archives
+
+
+def test_names_give_dates():
+    assert archive_date("20261910.tgz") == (datetime.date(2026, 10, 19), None)
+    assert archive_date("20261910.from-20261810.tzst") == (
+        datetime.date(2026, 10, 19), datetime.date(2026, 10, 18)
+    )
+    assert archive_date("20261910.recipe") == (datetime.date(2026, 10, 19), None)
+    assert archive_date("20261019.tgz", "%Y%m%d") == (datetime.date(2026, 10, 19), None)
+    assert archive_date("notes.txt") is None
+    assert archive_date("20261910") is None
+
+
+@pytest.mark.parametrize("name", ["20261910.tgz.part", "20261910.from-20261810.tgz.sha256"])
+def test_sidecars_and_uploads_are_not_archives(name):
+    assert archive_date(name) is None
+    assert file_date(name) == archive_date(name.rpartition(".")[0])
+
+
+def test_first_archive_is_full_then_deltas(log, tmp_path):
+    archives = make_chain(log, tmp_path, dumps(4))
+    names = [name for name, _ in archives]
+    assert names == [
+        "20261010.tgz",
+        "20261110.from-20261010.tgz",
+        "20261210.from-20261110.tgz",
+        "20261310.from-20261210.tgz",
+    ]
+    assert [archive_base(io.BytesIO(content)) for _, content in archives] == [None] + names[:-1]
+    # Deltas only hold what changed.
+    assert all(len(content) < len(archives[0][1]) / 2 for _, content in archives[1:])
+
+
+@pytest.mark.parametrize("codec", ["gzip", "bz2", "xz"])
+def test_chain_rebuilds_every_dump(log, tmp_path, codec):
+    data = dumps(4)
+    archives = make_chain(log, tmp_path, data, codec)
+
+    for last in range(len(archives)):
+        target = io.BytesIO()
+        rebuild_dump([io.BytesIO(content) for _, content in archives[:last + 1]], target)
+        assert target.getvalue() == data[last]
+
+
+def test_apply_delta_to_previous_dump(log, tmp_path):
+    data = dumps(2)
+    archives = make_chain(log, tmp_path, data)
+
+    with tarfile.open(fileobj=io.BytesIO(archives[1][1]), mode="r:gz") as tar:
+        member = tar.extractfile("dump.sql.delta")
+        target = io.BytesIO()
+        apply_delta(io.BytesIO(data[0]), member, target)
+    assert target.getvalue() == data[1]
+
+
+def test_full_archive_is_forced_when_last_one_is_old(log, tmp_path):
+    options = dict(OPTIONS, **{"state-file": str(tmp_path / "delta-state.json"), "full-every": 2})
+    make_chain(log, tmp_path, dumps(1))
+    # Age of full archive is counted from the day it was made.
+    today = datetime.date.today()
+
+    delta = DeltaArchive(log, options)
+    assert delta.base_date(today + datetime.timedelta(days=1)) == datetime.date(2026, 10, 10)
+    assert delta.base_date(today + datetime.timedelta(days=2)) is None
+    # Base of a delta is always older than it.
+    assert delta.base_date(datetime.date(2026, 10, 10)) is None
+
+
+def test_unreadable_state_gives_full_archive(log, tmp_path):
+    state = tmp_path / "delta-state.json"
+    state.write_text("{not json")
+    delta = DeltaArchive(log, {"state-file": str(state)})
+    assert delta.base_date(datetime.date(2026, 10, 11)) is None
+    assert log.levels("warning")
+
+
+def test_archive_without_dump_is_rejected(log):
+    empty = io.BytesIO()
+    with tarfile.open(fileobj=empty, mode="w:gz"):
+        pass
+    with pytest.raises(ValueError):
+        rebuild_dump([io.BytesIO(empty.getvalue())], io.BytesIO())
+    with pytest.raises(ValueError):
+        rebuild_dump([io.BytesIO(b"not an archive")], io.BytesIO())
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 12:15:44 2026
+
+-- Tests of pool of backup jobs --
+
+@author: Julien
+"""
+
+import json
+import os
+import threading
+import pytest
+from modules import job_pool
+from modules.job_pool import finish_job, JobLog, JobPool
+
+
+# Config file shipped with repository.
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.json")
+
+
+class FakeScript:
+    """
+    Stand-in of a configured ScriptingSystem recording what a job did.
+    """
+
+    def __init__(self, log):
+        self.log_email_matt = log
+        self.calls = []
+
+    def save_download_state(self):
+        self.calls.append("download-state")
+
+    def save_incremental_state(self):
+        self.calls.append("incremental-state")
+
+    def clean(self, sftp):
+        self.calls.append(("clean", sftp))
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    """
+    Write config files in a temporary current folder.
+
+    Returns
+    -------
+    function:
+        Takes brackets of config file, returns its path.
+
+    """
+
+    monkeypatch.chdir(tmp_path)
+    with open(TEMPLATE) as template:
+        base = json.load(template)
+
+    # No destination e-mail, they would be checked against DNS.
+    base["email"]["dest"] = []
+
+    def write(**brackets):
+        data = dict(base, **brackets)
+        path = tmp_path / "config.json"
+        path.write_text(json.dumps(data))
+        return str(path)
+
+    return write
+
+
+def job_log(log, name):
+    return JobLog(log, name, threading.Lock())
+
+
+@pytest.mark.parametrize(
+    "errors, sent, saved",
+    [
+        (0, True, ["download-state", "incremental-state"]),
+        (0, False, ["download-state"]),
+        (1, True, []),
+    ],
+)
+def test_finish_job_saves_states_of_good_runs_only(log, errors, sent, saved):
+    job_logger = job_log(log, "a")
+    for _ in range(errors):
+        job_logger.error("Send to SFTP", "failed")
+    script = FakeScript(job_logger)
+
+    finish_job({"script": script, "log": job_logger, "sftp": "session", "sent": sent})
+    assert script.calls == saved + [("clean", "session")]
+
+
+def test_job_logs_are_tagged_and_counted(log):
+    job_logger = job_log(log, "db1")
+    job_logger.warning("Download ZIP", "slow")
+    job_logger.error("Send to SFTP", "failed")
+    assert log.levels("warning") == [("[db1] Download ZIP", "slow")]
+    assert (job_logger.warning_nb, job_logger.error_nb) == (1, 1)
+    assert job_log(log, None).tag("ACK") == "ACK"
+
+
+def test_jobs_inherit_main_destinations(config):
+    pool = JobPool(80, config(jobs=[{"name": "db1"}, {"zip": "db2", "sftp": []}]))
+    pool.get_configuration()
+    assert pool.critical_nb == 0
+    assert [job["name"] for job in pool.jobs] == ["db1", "db2"]
+    # Each job gets a sub folder of main destinations.
+    assert pool.jobs[0]["sftp"][0]["folder"] == "TSE-INFORX/db1"
+    assert pool.jobs[1]["sftp"] == []
+    assert (pool.workers, pool.stages) == (4, {"download": 2, "compress": 1, "upload": 2})
+
+
+def test_without_jobs_main_brackets_are_the_job(config):
+    pool = JobPool(80, config(jobs=[]))
+    pool.get_configuration()
+    assert pool.jobs == [{"name": None}]
+
+
+@pytest.mark.parametrize("jobs", [{"name": "a"}, [{"name": "a"}, {"name": "a"}]])
+def test_wrong_jobs_bracket(config, jobs):
+    pool = JobPool(80, config(jobs=jobs))
+    pool.get_configuration()
+    assert pool.critical_nb == 1
+    assert pool.run() == []
+
+
+def test_failed_job_does_not_stop_others(log, monkeypatch):
+    pool = JobPool(80, "config.json")
+    pool.log_email_matt = log
+    log.send_all = lambda: None
+    pool.jobs = [{"name": name} for name in ("a", "b", "c")]
+
+    def prepare_job(job):
+        job_logger = job_log(log, job["name"])
+        return {"script": FakeScript(job_logger), "log": job_logger}
+
+    def download(job):
+        if job["log"].name == "b":
+            raise RuntimeError("zip unreadable")
+        return job
+
+    def upload(job):
+        job["sent"] = True
+        finish_job(job)
+        return job
+
+    monkeypatch.setattr(pool, "prepare_job", prepare_job)
+    monkeypatch.setattr(job_pool, "download_stage", download)
+    monkeypatch.setattr(job_pool, "compress_stage", lambda job: job)
+    monkeypatch.setattr(job_pool, "upload_stage", upload)
+
+    logs = pool.run()
+    assert [(job_logger.name, job_logger.error_nb) for job_logger in logs] == [
+        ("a", 0), ("b", 1), ("c", 0)
+    ]
+    assert log.levels("error") == [
+        ("[b] Job", "Job stopped in download stage. RuntimeError('zip unreadable')")
+    ]
+    assert ("Jobs", "2 of 3 job(s) without error.") in log.levels("info")
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 11:48:02 2026
+
+-- Tests of dated layout of archives on sftp server --
+
+@author: Julien
+"""
+
+import datetime
+import pytest
+from modules.remote_layout import RemoteLayout, FLAT, DATED
+
+
+def touch(sftp, path, size=10):
+    sftp.makedirs(path.rpartition("/")[0])
+    with open(sftp.local(path), "wb") as remote:
+        remote.write(b"x" * size)
+
+
+@pytest.mark.parametrize(
+    "first, last",
+    [
+        (datetime.date(2026, 1, 1), datetime.date(2026, 1, 31)),
+        (datetime.date(2026, 2, 1), datetime.date(2026, 2, 28)),
+        (datetime.date(2028, 2, 1), datetime.date(2028, 2, 29)),
+        (datetime.date(2026, 4, 1), datetime.date(2026, 4, 30)),
+        (datetime.date(2026, 12, 1), datetime.date(2026, 12, 31)),
+    ],
+)
+def test_month_end(first, last):
+    assert RemoteLayout.month_end(first) == last
+
+
+def test_partition():
+    assert RemoteLayout.partition(datetime.date(2026, 3, 9)) == "2026/03"
+
+
+def test_dated_names_and_paths():
+    layout = RemoteLayout("backup", DATED)
+    assert layout.remote_name("20260903.tgz") == "20260309.tgz"
+    assert layout.relative("20260903.from-20262802.tgz.sha256") == (
+        "2026/03/20260309.from-20260228.tgz.sha256"
+    )
+    assert layout.path("20260903.recipe") == "backup/2026/03/20260309.recipe"
+    # Files that are not archives stay in remote folder.
+    assert layout.path("manifest.json") == "backup/manifest.json"
+
+
+def test_flat_names_are_kept():
+    layout = RemoteLayout("backup", FLAT)
+    assert layout.path("20260903.tgz") == "backup/20260903.tgz"
+    assert RemoteLayout("backup", "unknown").layout == FLAT
+
+
+def test_prepare_creates_partition_once(sftp):
+    layout = RemoteLayout("backup", DATED)
+    sftp.mkdir("backup")
+    layout.prepare(sftp, "20260903.tgz")
+    assert sftp.listdir("backup/2026") == ["03"]
+    assert layout.created == {"backup/2026/03"}
+    # Already created, server is not asked again.
+    layout.prepare(None, "20261003.tgz")
+
+
+def test_partitions_and_listing(sftp):
+    layout = RemoteLayout("backup", DATED)
+    touch(sftp, "backup/2026/02/20260227.tgz")
+    touch(sftp, "backup/2026/03/20260309.tgz.part")
+    touch(sftp, "backup/2026/13/20261301.tgz")
+    touch(sftp, "backup/misc/notes.txt")
+    touch(sftp, "backup/manifest.json")
+
+    assert layout.partitions(sftp) == [
+        (datetime.date(2026, 2, 1), "2026/02"), (datetime.date(2026, 3, 1), "2026/03")
+    ]
+    assert [path for path, _ in layout.listing(sftp)] == [
+        "2026/02/20260227.tgz", "2026/03/20260309.tgz.part"
+    ]
+
+
+def test_index_lists_partitions_reaching_horizon(sftp):
+    layout = RemoteLayout("backup", DATED)
+    touch(sftp, "backup/2025/12/20251231.tgz")
+    touch(sftp, "backup/2026/01/20260105.tgz")
+    touch(sftp, "backup/2026/02/20260210.tgz")
+    touch(sftp, "backup/2026/02/20260228.tgz")
+    touch(sftp, "backup/2026/03/20260302.tgz")
+
+    index, dropped = layout.index(sftp, datetime.date(2026, 2, 15))
+    assert sorted(index) == [
+        datetime.date(2026, 2, 10), datetime.date(2026, 2, 28), datetime.date(2026, 3, 2)
+    ]
+    assert index[datetime.date(2026, 2, 10)]["files"] == ["2026/02/20260210.tgz"]
+    assert dropped == ["2025/12", "2026/01"]
+
+    index, dropped = layout.index(sftp, None)
+    assert len(index) == 5 and dropped == []
+
+
+def test_index_follows_bases_to_older_partitions(sftp):
+    layout = RemoteLayout("backup", DATED)
+    touch(sftp, "backup/2025/11/20251130.tgz")
+    touch(sftp, "backup/2025/12/20251231.tgz")
+    touch(sftp, "backup/2026/01/20260101.from-20251231.tgz")
+    touch(sftp, "backup/2026/03/20260301.from-20260101.tgz")
+
+    index, dropped = layout.index(sftp, datetime.date(2026, 3, 1))
+    assert sorted(index) == [
+        datetime.date(2025, 12, 31), datetime.date(2026, 1, 1), datetime.date(2026, 3, 1)
+    ]
+    assert dropped == ["2025/11"]
+
+
+def test_archival_drops_old_partitions(make_server, sftp):
+    today = datetime.date.today()
+    old = today - datetime.timedelta(days=120)
+    touch(sftp, "backup/" + old.strftime("%Y/%m/%Y%m%d") + ".tgz")
+    touch(sftp, "backup/" + today.strftime("%Y/%m/%Y%m%d") + ".tgz")
+
+    server = make_server({"layout": DATED, "manifest": False, "time-to-save": 10})
+    server.archival_check()
+    assert [path for path, _ in server.layout.listing(sftp)] == [
+        today.strftime("%Y/%m/%Y%m%d") + ".tgz"
+    ]
+    # Emptied partitions are removed, year too once empty.
+    assert not sftp.exists("backup/" + old.strftime("%Y/%m"))
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 09:14:27 2026
+
+-- Tests of manifest of archives on sftp server --
+
+@author: Julien
+"""
+
+import datetime
+import threading
+import pytest
+from modules.remote_layout import RemoteLayout, DATED
+from modules.remote_manifest import archive_codec, RemoteManifest, MANIFEST_NAME
+from modules.stream_pipe import BoundedPipe
+from modules.sftp_transfer import PART_EXTENSION
+
+
+def local_name(days_ago, extension=".tgz"):
+    date = datetime.date.today() - datetime.timedelta(days=days_ago)
+    return date.strftime("%Y%d%m") + extension
+
+
+def server_files(sftp, folder="backup"):
+    return sftp.listdir(folder)
+
+
+@pytest.fixture
+def manifest(sftp):
+    sftp.mkdir("backup")
+    result = RemoteManifest(RemoteLayout("backup"))
+    result.entries = {}
+    return result
+
+
+def test_codec_of_archives_and_uploads():
+    assert archive_codec("20261810.tgz") == "gzip"
+    assert archive_codec("20261810.txz.part") == "xz"
+    assert archive_codec("20261810.recipe") == "recipe"
+    assert archive_codec("notes.txt") is None
+
+
+def test_record_update_and_forget(manifest):
+    manifest.record("20261810.tgz.part")
+    manifest.record("20261810.tgz", size=10)
+    # Published archive replaces its unfinished upload.
+    assert set(manifest.entries) == {"20261810.tgz"}
+
+    manifest.record("20261810.tgz", sha256="ab" * 32, sidecar=True)
+    entry = manifest.entries["20261810.tgz"]
+    assert (entry["size"], entry["sha256"], entry["sidecar"]) == (10, "ab" * 32, True)
+    assert manifest.index()[datetime.date(2026, 10, 18)]["files"] == [
+        "20261810.tgz", "20261810.tgz.sha256"
+    ]
+
+    manifest.forget(["20261810.tgz.sha256"])
+    assert manifest.entries["20261810.tgz"]["sidecar"] is False
+    manifest.forget(["20261810.tgz"])
+    assert manifest.entries == {}
+
+
+def test_index_dates_unfinished_uploads(manifest):
+    manifest.record("20261810.from-20261710.tgz.part", size=5)
+    manifest.record("20261710.tgz", size=7)
+    index = manifest.index()
+    assert index[datetime.date(2026, 10, 18)] == {
+        "files": ["20261810.from-20261710.tgz.part"],
+        "size": 5,
+        "bases": {datetime.date(2026, 10, 17)},
+    }
+
+
+def test_rebuild_from_listing(sftp):
+    layout = RemoteLayout("backup", DATED)
+    sftp.makedirs("backup/2026/10")
+    for name, data in (("20261017.tgz", b"full"), ("20261018.from-20261017.tgz", b"d"),
+                       ("20261017.tgz.sha256", b"x"), ("20261019.tgz.part", b"pa"),
+                       ("notes.txt", b"n")):
+        with open(sftp.local("backup/2026/10/" + name), "wb") as file:
+            file.write(data)
+
+    manifest = RemoteManifest(layout)
+    known = {"2026/10/20261017.tgz": {"sha256": "cd" * 32}}
+    manifest.rebuild(sftp, known)
+    assert set(manifest.entries) == {
+        "2026/10/20261017.tgz", "2026/10/20261018.from-20261017.tgz", "2026/10/20261019.tgz.part"
+    }
+    full = manifest.entries["2026/10/20261017.tgz"]
+    assert (full["size"], full["sha256"], full["sidecar"]) == (4, "cd" * 32, True)
+    assert manifest.entries["2026/10/20261019.tgz.part"]["codec"] == "gzip"
+
+
+def test_save_then_read(sftp, manifest):
+    manifest.record("20261810.tgz", size=3)
+    manifest.save(sftp)
+    assert server_files(sftp) == [MANIFEST_NAME]
+    assert RemoteManifest(RemoteLayout("backup")).read(sftp) == manifest.entries
+
+    with open(sftp.local("backup/" + MANIFEST_NAME), "w") as file:
+        file.write("{broken")
+    reloaded = RemoteManifest(RemoteLayout("backup"))
+    assert reloaded.read(sftp) is None
+    assert reloaded.load(sftp) is False
+    assert reloaded.entries == {}
+
+
+def test_upload_is_recorded_then_replaced(make_server, sftp, tmp_path):
+    server = make_server()
+    name = local_name(0)
+    (tmp_path / name).write_bytes(b"archive")
+    server.send_to_sftp_server(name, local_path=str(tmp_path / name))
+
+    assert set(server.manifest.entries) == {name}
+    assert server.manifest.entries[name]["size"] == 7
+    assert RemoteManifest(server.layout).read(sftp) == server.manifest.entries
+
+
+def test_failed_upload_is_removed_by_retention(make_server, sftp, tmp_path, monkeypatch):
+    server = make_server({"time-to-save": 10})
+    old = local_name(20)
+    (tmp_path / old).write_bytes(b"archive")
+
+    def refuse(client, part_path, remote_path):
+        raise IOError("rename refused")
+
+    # Manifest is still published, only archive fails.
+    monkeypatch.setattr(server.engine, "publish", refuse)
+    server.send_to_sftp_server(old, local_path=str(tmp_path / old))
+    assert old + PART_EXTENSION in server_files(sftp)
+    assert set(server.manifest.entries) == {old + PART_EXTENSION}
+
+    # Manifest exists, retention does not list folder.
+    server = make_server({"time-to-save": 10})
+    server.archival_check()
+    assert server_files(sftp) == [MANIFEST_NAME]
+    assert server.manifest.entries == {}
+
+
+@pytest.mark.parametrize("resumable", [False, True])
+def test_aborted_stream(make_server, sftp, resumable):
+    server = make_server()
+    name = local_name(0)
+    pipe = BoundedPipe(16)
+
+    def produce():
+        pipe.write(b"first part of archive")
+        pipe.abort(OSError("Compression failed."))
+
+    writer = threading.Thread(target=produce)
+    writer.start()
+    assert server.receive(name, pipe, resumable) is False
+    writer.join()
+
+    if resumable:
+        # Kept to be resumed from local file, and known to retention.
+        assert name + PART_EXTENSION in server_files(sftp)
+        assert set(server.manifest.entries) == {name + PART_EXTENSION}
+    else:
+        assert server_files(sftp) == [MANIFEST_NAME]
+        assert server.manifest.entries == {}
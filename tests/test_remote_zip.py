@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 21:12:40 2026
+
+-- Tests of RemoteZipFile against an in-memory Range server --
+
+@author: Julien
+"""
+
+import io
+import zipfile
+import pytest
+import urllib3
+from modules.remote_zip import RemoteZipFile, TAIL_SIZE
+
+
+def make_zip(members, size):
+    """
+    Build a zip of members of random-looking bytes.
+
+    Parameters
+    ----------
+    members: int
+        Number of members.
+    size: int
+        Size of each member.
+
+    Returns
+    -------
+    bytes:
+        Zip.
+
+    """
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for i in range(members):
+            archive.writestr(
+                "member-{:05d}-{}.sql".format(i, "x" * 40),
+                bytes((i * 31 + j) % 251 for j in range(size)),
+            )
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def server(range_server):
+    """
+    Range server of a small zip.
+
+    Returns
+    -------
+    ThreadingHTTPServer:
+        Server, zip is in its data attribute.
+
+    """
+
+    range_server.data = make_zip(3, 1000)
+    return range_server
+
+
+def remote(httpd):
+    return RemoteZipFile(urllib3.PoolManager(), httpd.url)
+
+
+def test_small_zip_is_listed_from_tail(server):
+    zip_file = remote(server)
+    assert zip_file.open_tail()
+    assert zip_file.length == len(server.data)
+
+    names = zipfile.ZipFile(zip_file).namelist()
+    assert len(names) == 3
+    assert zip_file.requests == 1
+    assert zip_file.fetched == len(server.data)
+
+
+def test_central_directory_beyond_tail(server):
+    server.data = make_zip(2000, 20)
+    zip_file = remote(server)
+    assert zip_file.open_tail()
+    assert len(server.data) > TAIL_SIZE
+
+    archive = zipfile.ZipFile(zip_file)
+    assert len(archive.infolist()) == 2000
+    assert archive.read(archive.infolist()[0]) == bytes(j % 251 for j in range(20))
+
+
+def test_fetched_block_serves_following_reads(server):
+    server.data = make_zip(2000, 20)
+    zip_file = remote(server)
+    zip_file.open_tail()
+    archive = zipfile.ZipFile(zip_file)
+
+    requests = zip_file.requests
+    for info in archive.infolist()[:100]:
+        archive.read(info)
+    # Members are next to each other, one block holds them all.
+    assert zip_file.requests - requests == 1
+
+
+def test_server_without_ranges(server):
+    server.ranges = False
+    assert not remote(server).open_tail()
+
+
+def test_not_modified(server):
+    zip_file = remote(server)
+    assert zip_file.open_tail({"If-None-Match": server.etag})
+    assert zip_file.not_modified
+
+
+def test_zip_changed_between_requests(server):
+    server.data = make_zip(2000, 20)
+    zip_file = remote(server)
+    zip_file.open_tail()
+    server.etag = '"v2"'
+
+    with pytest.raises(urllib3.exceptions.ProtocolError):
+        zip_file.seek(0)
+        zip_file.read(10)
+    assert server.requests[-1]["If-Range"] == '"v1"'
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 22:41:33 2026
+
+-- Tests of retention policies and batched removal --
+
+@author: Julien
+"""
+
+import collections
+import datetime
+from types import SimpleNamespace
+import pytest
+from paramiko import Message, SFTP_OK, SFTP_NO_SUCH_FILE
+from paramiko.sftp import CMD_REMOVE, CMD_STATUS
+from modules.retention import archive_index, RemoveBatch, RetentionPolicy
+
+
+TODAY = datetime.date(2026, 10, 18)
+
+
+def day(days_ago):
+    return TODAY - datetime.timedelta(days=days_ago)
+
+
+def name(date, base=None, extension=".tgz"):
+    text = date.strftime("%Y%d%m")
+    if base is not None:
+        text += ".from-" + base.strftime("%Y%d%m")
+    return text + extension
+
+
+def index_of(names, size=100):
+    attributes = [SimpleNamespace(filename=file, st_size=size) for file in names]
+    return archive_index(attributes)
+
+
+def daily_fulls(days):
+    return index_of(name(day(i)) for i in range(days))
+
+
+def test_index_groups_files_of_an_archive():
+    date = day(3)
+    index = index_of(
+        [
+            name(date),
+            name(date) + ".sha256",
+            name(day(2), date) + ".part",
+            name(day(1), date, ".recipe"),
+            "manifest.json",
+            "notes.txt",
+        ]
+    )
+    assert set(index) == {day(3), day(2), day(1)}
+    assert index[date]["files"] == [name(date), name(date) + ".sha256"]
+    assert index[date]["size"] == 200
+    assert index[day(2)]["bases"] == {date}
+
+
+def test_index_paths_are_prefixed_by_folder():
+    attributes = [SimpleNamespace(filename="20261019.tgz", st_size=None)]
+    index = archive_index(attributes, "%Y%m%d", "2026/10")
+    assert index[datetime.date(2026, 10, 19)] == {
+        "files": ["2026/10/20261019.tgz"], "size": 0, "bases": set()
+    }
+
+
+def test_time_to_save_only():
+    index = daily_fulls(30)
+    policy = RetentionPolicy(10)
+    expired = policy.expired(index, TODAY)
+    assert expired == [name(day(i)) for i in range(29, 10, -1)]
+    assert policy.horizon(TODAY) == day(10)
+
+
+def test_grandfather_father_son():
+    index = daily_fulls(120)
+    policy = RetentionPolicy(0, {"keep-daily": 7, "keep-weekly": 4, "keep-monthly": 3})
+    kept = policy.kept(index, TODAY)
+
+    assert {day(i) for i in range(7)} <= kept
+    # Newest archive of each of the last 4 weeks and 3 months.
+    weeks = collections.defaultdict(list)
+    months = collections.defaultdict(list)
+    for date in index:
+        weeks[date.isocalendar()[:2]].append(date)
+        months[(date.year, date.month)].append(date)
+    assert {max(weeks[week]) for week in sorted(weeks)[-4:]} <= kept
+    assert {max(months[month]) for month in sorted(months)[-3:]} <= kept
+    assert len(kept) <= 7 + 4 + 3
+    assert policy.horizon(TODAY) is None
+
+
+def test_weekly_skips_weeks_without_archive():
+    index = index_of(name(day(i)) for i in (0, 20, 40))
+    policy = RetentionPolicy(0, {"keep-weekly": 2})
+    assert policy.kept(index, TODAY) == {day(0), day(20)}
+
+
+def test_bases_of_kept_deltas_are_kept():
+    full = day(20)
+    names = [name(full)] + [name(day(i), day(i + 1)) for i in range(19, -1, -1)]
+    index = index_of(names)
+    policy = RetentionPolicy(5)
+
+    # Every delta back to the full archive is needed by the newest ones.
+    assert policy.expired(index, TODAY) == []
+
+
+def test_chain_expires_whole_once_unused():
+    names = [name(day(30))] + [name(day(i), day(30)) for i in range(29, 25, -1)]
+    names += [name(day(10))] + [name(day(i), day(10)) for i in range(9, -1, -1)]
+    index = index_of(names)
+    expired = RetentionPolicy(15).expired(index, TODAY)
+    assert expired == names[:5]
+
+
+def test_budget_removes_oldest_first():
+    index = daily_fulls(10)
+    policy = RetentionPolicy(30, {"max-bytes": 450})
+    assert policy.kept(index, TODAY) == {day(i) for i in range(4)}
+
+
+def test_budget_keeps_newest_archive():
+    index = daily_fulls(3)
+    assert RetentionPolicy(30, {"max-bytes": 1}).kept(index, TODAY) == {day(0)}
+
+
+def test_budget_keeps_bases_of_kept_deltas():
+    names = [name(day(5))] + [name(day(i), day(5)) for i in range(4, -1, -1)]
+    index = index_of(names)
+    kept = RetentionPolicy(30, {"max-bytes": 250}).kept(index, TODAY)
+    # Full archive is the base of the newest delta, deltas between go first.
+    assert kept == {day(5), day(0)}
+
+
+def test_budget_with_missing_base():
+    # Full archive was removed by hand or never reached this destination.
+    names = [name(day(i), day(10)) for i in range(3, -1, -1)]
+    index = index_of(names)
+    policy = RetentionPolicy(30, {"max-bytes": 250})
+    assert policy.kept(index, TODAY) == {day(1), day(0)}
+    assert policy.expired(index, TODAY) == names[:2]
+    assert RetentionPolicy(3, {"max-bytes": 50}).expired(
+        {TODAY: {"files": ["a"], "size": 100, "bases": {day(8)}}}, TODAY
+    ) == []
+
+
+class PipelinedClient:
+    """
+    Stand-in of paramiko.SFTPClient answering remove requests in order.
+    """
+
+    def __init__(self, missing=()):
+        self.missing = set(missing)
+        self.queue = collections.deque()
+        self.in_flight = 0
+        self.most_in_flight = 0
+        self.number = 0
+
+    def _async_request(self, handler, command, path):
+        assert command == CMD_REMOVE
+        self.number += 1
+        self.queue.append((handler, self.number, path))
+        self.in_flight += 1
+        self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        return self.number
+
+    def _read_response(self):
+        handler, number, path = self.queue.popleft()
+        self.in_flight -= 1
+        message = Message()
+        message.add_int(SFTP_NO_SUCH_FILE if path in self.missing else SFTP_OK)
+        message.rewind()
+        handler._async_response(CMD_STATUS, message, number)  # pylint: disable=W0212
+
+
+class SerialClient:
+    """
+    Client without the private methods pipelining relies on.
+    """
+
+    def __init__(self, missing=()):
+        self.missing = set(missing)
+        self.removed = []
+
+    def remove(self, path):
+        if path in self.missing:
+            raise IOError("No such file.")
+        self.removed.append(path)
+
+
+@pytest.mark.parametrize("client_class", [PipelinedClient, SerialClient])
+def test_remove_batch_reports_failures(client_class):
+    paths = ["a/{}".format(i) for i in range(100)]
+    client = client_class(missing=paths[10:12])
+    assert RemoveBatch(client, window=8).remove(paths) == paths[10:12]
+
+
+def test_remove_batch_bounds_requests_in_flight():
+    client = PipelinedClient()
+    RemoveBatch(client, window=8).remove(["a/{}".format(i) for i in range(100)])
+    assert client.most_in_flight == 8
+    assert not client.queue
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 11:21:36 2026
+
+-- Tests of fan-out of archive to several sftp destinations --
+
+@author: Julien
+"""
+
+import random
+from types import SimpleNamespace
+import pytest
+from modules.sftp_fanout import SFTPFanout
+from modules.sftp_server import SFTPServer
+from modules.sftp_transfer import TransferEngine, PART_EXTENSION
+from modules.stream_pipe import BoundedPipe, TeePipe
+
+
+DATA = random.Random(11).randbytes(2 * 1024 * 1024 + 3)
+
+NAME = "20261810.tgz"
+
+
+class BrokenWriter:
+    """
+    Remote file failing once a number of bytes were written.
+    """
+
+    def __init__(self, fileobj, limit):
+        self.fileobj = fileobj
+        self.limit = limit
+
+    def __getattr__(self, name):
+        return getattr(self.fileobj, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.fileobj.close()
+
+    def write(self, data):
+        if self.fileobj.tell() + len(data) > self.limit:
+            raise IOError("Connection reset by server.")
+        return self.fileobj.write(data)
+
+
+def failing_session(sftp, failures):
+    """
+    Build a session on the same folder whose first uploads fail after 1 MiB.
+
+    Parameters
+    ----------
+    sftp: LocalSFTP
+        Session to copy.
+    failures: int
+        Number of uploads failing.
+
+    Returns
+    -------
+    LocalSFTP:
+        Session.
+
+    """
+
+    class FailingSFTP(type(sftp)):
+        def open(self, path, mode="rb", *args):
+            remote = super().open(path, mode, *args)
+            if "w" in mode and path.endswith(PART_EXTENSION) and self.failures > 0:
+                self.failures -= 1
+                return BrokenWriter(remote, 1024 * 1024)
+            return remote
+
+    session = FailingSFTP(sftp.root)
+    session.failures = failures
+    return session
+
+
+@pytest.fixture
+def make_fanout(sftp, log, monkeypatch):
+    """
+    Build fan-outs to destinations "a" and "b" on the local sftp fixture,
+    each one in its own folder.
+
+    Returns
+    -------
+    function:
+        Takes session of each destination, returns SFTPFanout.
+
+    """
+
+    monkeypatch.setattr(SFTPServer, "alive", staticmethod(lambda session: True))
+    monkeypatch.setattr(TransferEngine, "channel", lambda engine, session: session)
+
+    def make(sessions):
+        destinations = [
+            {
+                "name": name,
+                "ip": "127.0.0.1",
+                "user": name,
+                "password": "",
+                "time-to-save": 30,
+                "folder": name,
+                "server-hash": False,
+                "pool": SimpleNamespace(
+                    acquire=lambda key, alive, session=session: session,
+                    release=lambda key, session: None,
+                ),
+            }
+            for name, session in zip("ab", sessions)
+        ]
+        return SFTPFanout(destinations, log, True, buffer_size=256 * 1024)
+
+    return make
+
+
+def uploaded(sftp, folder):
+    with open(sftp.local(folder + "/" + NAME), "rb") as remote:
+        return remote.read()
+
+
+def test_tee_drops_failed_reader():
+    first, second = BoundedPipe(1024), BoundedPipe(1024)
+    tee = TeePipe([first, second])
+    first.abort(OSError("Upload failed."))
+    assert tee.write(b"data") == 4
+    assert tee.pipes == [second]
+    tee.close()
+    assert second.read() == b"data"
+
+    second.abort(OSError("Upload failed."))
+    with pytest.raises(OSError):
+        tee.write(b"more")
+
+
+def test_streamed_archive_reaches_every_destination(make_fanout, sftp, log):
+    fanout = make_fanout([sftp, sftp])
+
+    def compress(pipe):
+        for start in range(0, len(DATA), 100000):
+            pipe.write(DATA[start:start + 100000])
+        return True
+
+    fanout.stream_to_sftp_server(NAME, compress)
+    assert uploaded(sftp, "a") == DATA
+    assert uploaded(sftp, "b") == DATA
+    fanout.report()
+    assert log.levels("info")[-1] == (
+        "SFTP destinations", "2 of 2 destination(s) without error."
+    )
+
+
+def test_failed_stream_destination_is_dropped(make_fanout, sftp, log):
+    fanout = make_fanout([failing_session(sftp, 1), sftp])
+    written = []
+
+    def compress(pipe):
+        for start in range(0, len(DATA), 100000):
+            pipe.write(DATA[start:start + 100000])
+            written.append(start)
+        return True
+
+    fanout.stream_to_sftp_server(NAME, compress)
+    # Other destination got whole archive, compressed once.
+    assert uploaded(sftp, "b") == DATA
+    assert written == list(range(0, len(DATA), 100000))
+    assert sftp.listdir("a") == ["manifest.json"]
+    assert any(action == "Send to SFTP @a" for action, _ in log.levels("error"))
+
+    fanout.report()
+    assert log.levels("info")[-1] == (
+        "SFTP destinations", "1 of 2 destination(s) without error."
+    )
+
+
+def test_failed_destination_resumes_from_local_file(make_fanout, sftp, tmp_path, log):
+    fanout = make_fanout([failing_session(sftp, 1), sftp])
+    (tmp_path / NAME).write_bytes(DATA)
+
+    fanout.send_to_sftp_server(NAME, str(tmp_path / NAME))
+    assert uploaded(sftp, "a") == DATA
+    assert uploaded(sftp, "b") == DATA
+    # Local file is kept for clean, each destination read it at most once more.
+    assert (tmp_path / NAME).exists()
+    assert any(action == "Send to SFTP @a" for action, _ in log.levels("warning"))
+    assert any(
+        action == "Send to SFTP @a" and "Resumed after" in message
+        for action, message in log.levels("info")
+    )
+
+
+def test_every_destination_failing(make_fanout, sftp):
+    fanout = make_fanout([failing_session(sftp, 1), failing_session(sftp, 1)])
+
+    def compress(pipe):
+        for start in range(0, len(DATA), 100000):
+            pipe.write(DATA[start:start + 100000])
+        return True
+
+    fanout.stream_to_sftp_server(NAME, compress)
+    assert sftp.listdir("a") == ["manifest.json"]
+    assert sftp.listdir("b") == ["manifest.json"]
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 10:47:19 2026
+
+-- Tests of sftp transfer engine --
+
+@author: Julien
+"""
+
+import hashlib
+import io
+import random
+import pytest
+from modules.sftp_transfer import TransferEngine, PART_EXTENSION
+
+
+DATA = random.Random(9).randbytes(300 * 1024 + 11)
+
+
+@pytest.fixture
+def engine(log, monkeypatch):
+    """
+    Transfer engine whose channel is the session itself.
+
+    Returns
+    -------
+    TransferEngine:
+        Engine writing blocks of 64 KiB.
+
+    """
+
+    monkeypatch.setattr(TransferEngine, "channel", lambda engine, session: session)
+    return TransferEngine(log, {"block-size": 64 * 1024})
+
+
+def test_upload_publishes_whole_file(engine, sftp):
+    result = engine.upload(sftp, io.BytesIO(DATA), "dump.tgz")
+    assert (result["bytes"], result["resumed"]) == (len(DATA), 0)
+    assert sftp.listdir() == ["dump.tgz"]
+    with open(sftp.local("dump.tgz"), "rb") as uploaded:
+        assert uploaded.read() == DATA
+
+
+def test_upload_size_is_checked(engine, sftp, monkeypatch):
+    real_stat = type(sftp).stat
+
+    def short_stat(session, path):
+        stat = real_stat(session, path)
+        return type("Stat", (), {"st_size": stat.st_size - 1})()
+
+    monkeypatch.setattr(type(sftp), "stat", short_stat)
+    with pytest.raises(IOError):
+        engine.upload(sftp, io.BytesIO(DATA), "dump.tgz")
+    # Archive is only published once whole.
+    assert sftp.listdir() == ["dump.tgz" + PART_EXTENSION]
+
+
+def test_download(engine, sftp):
+    with open(sftp.local("dump.tgz"), "wb") as remote:
+        remote.write(DATA)
+    target = io.BytesIO()
+    result = engine.download(sftp, "dump.tgz", target)
+    assert target.getvalue() == DATA
+    assert result["bytes"] == len(DATA)
+
+
+def test_report(engine, log):
+    engine.report("Send to SFTP", {"bytes": 2 * 1024 * 1024, "seconds": 2.0, "speed": 1.0,
+                                   "resumed": 10})
+    assert log.levels("info") == [(
+        "Send to SFTP",
+        "2097152 bytes in 2.00 s (1.00 MB/s). Resumed after 10 bytes already on server.",
+    )]
+    assert TransferEngine.figures(10, 0)["speed"] == 0.0
+
+
+def write_part(sftp, data):
+    with open(sftp.local("dump.tgz" + PART_EXTENSION), "wb") as part:
+        part.write(data)
+
+
+@pytest.mark.parametrize("server_hash", [False, True])
+def test_upload_resumes_from_matching_part(engine, sftp, server_hash):
+    write_part(sftp, DATA[:100000])
+    asked = []
+
+    def prefix_hash(size):
+        asked.append(size)
+        return hashlib.sha256(DATA[:size]).hexdigest() if server_hash else None
+
+    result = engine.upload(sftp, io.BytesIO(DATA), "dump.tgz", True, prefix_hash)
+    assert (result["resumed"], result["bytes"]) == (100000, len(DATA) - 100000)
+    assert asked == [100000]
+    assert sftp.listdir() == ["dump.tgz"]
+    with open(sftp.local("dump.tgz"), "rb") as uploaded:
+        assert uploaded.read() == DATA
+
+
+@pytest.mark.parametrize(
+    "part",
+    [b"x" * 100000, DATA + b"more", b""],
+    ids=["other-file", "longer", "empty"],
+)
+def test_part_not_matching_is_sent_again(engine, sftp, part):
+    write_part(sftp, part)
+    result = engine.upload(sftp, io.BytesIO(DATA), "dump.tgz", True)
+    assert (result["resumed"], result["bytes"]) == (0, len(DATA))
+    with open(sftp.local("dump.tgz"), "rb") as uploaded:
+        assert uploaded.read() == DATA
+
+
+def test_resume_can_be_disabled(log, sftp, monkeypatch):
+    monkeypatch.setattr(TransferEngine, "channel", lambda engine, session: session)
+    write_part(sftp, DATA[:1000])
+    result = TransferEngine(log, {"resume": False}).upload(
+        sftp, io.BytesIO(DATA), "dump.tgz", True
+    )
+    assert result["resumed"] == 0
+
+
+def test_publish_replaces_existing_file(sftp):
+    class PlainRename(type(sftp)):
+        def posix_rename(self, source, target):
+            raise IOError("posix-rename not supported.")
+
+    client = PlainRename(sftp.root)
+    for name, data in (("dump.tgz", b"old"), ("dump.tgz.part", b"new")):
+        with open(sftp.local(name), "wb") as remote:
+            remote.write(data)
+
+    TransferEngine.publish(client, "dump.tgz.part", "dump.tgz")
+    assert sftp.listdir() == ["dump.tgz"]
+    with open(sftp.local("dump.tgz"), "rb") as published:
+        assert published.read() == b"new"
+
+    # Without a file to replace, plain rename is enough.
+    with open(sftp.local("other.part"), "wb") as remote:
+        remote.write(b"other")
+    TransferEngine.publish(client, "other.part", "other.tgz")
+    assert sftp.listdir() == ["dump.tgz", "other.tgz"]
+
+
+def test_server_resumes_failed_upload(make_server, sftp, tmp_path, log):
+    server = make_server()
+    (tmp_path / "20261810.tgz").write_bytes(DATA)
+    with open(sftp.local("backup/20261810.tgz" + PART_EXTENSION), "wb") as part:
+        part.write(DATA[:5000])
+
+    server.send_to_sftp_server("20261810.tgz", local_path=str(tmp_path / "20261810.tgz"))
+    with open(sftp.local("backup/20261810.tgz"), "rb") as uploaded:
+        assert uploaded.read() == DATA
+    assert not (tmp_path / "20261810.tgz").exists()
+    assert any("Resumed after 5000 bytes" in message for _, message in log.levels("info"))
+    assert server.manifest.entries["20261810.tgz"]["size"] == len(DATA)
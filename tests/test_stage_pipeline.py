@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 22:58:02 2026
+
+-- Tests of pipeline of stages --
+
+@author: Julien
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from modules.stage_pipeline import Stage, StagePipeline
+
+
+def test_items_go_through_every_stage(log):
+    stages = [
+        Stage("double", lambda item: item * 2, workers=2),
+        Stage("increment", lambda item: item + 1, workers=3, queue_size=2),
+    ]
+    pipeline = StagePipeline(stages, log)
+    assert sorted(pipeline.run(range(20))) == [item * 2 + 1 for item in range(20)]
+
+    metrics = pipeline.metrics()
+    assert metrics["double"]["items"] == 20
+    assert metrics["increment"]["items"] == 20
+    pipeline.report()
+    assert log.levels("info")[-1] == ("Pipeline", "20 item(s) done in {:.2f} s.".format(
+        pipeline.elapsed))
+
+
+def test_no_items(log):
+    assert StagePipeline([Stage("noop", lambda item: item)], log).run([]) == []
+
+
+def test_none_ends_an_item(log):
+    later = []
+    stages = [
+        Stage("filter", lambda item: item if item % 2 else None),
+        Stage("keep", lambda item: later.append(item) or item),
+    ]
+    assert sorted(StagePipeline(stages, log).run(range(10))) == [1, 3, 5, 7, 9]
+    assert sorted(later) == [1, 3, 5, 7, 9]
+
+
+def test_stage_error_goes_to_on_error(log):
+    errors = []
+
+    def fail_on_three(item):
+        if item == 3:
+            raise RuntimeError("bad item")
+        return item
+
+    stages = [Stage("check", fail_on_three), Stage("keep", lambda item: item)]
+    pipeline = StagePipeline(
+        stages, log, on_error=lambda name, item, err: errors.append((name, item, str(err)))
+    )
+    assert sorted(pipeline.run(range(6))) == [0, 1, 2, 4, 5]
+    assert errors == [("check", 3, "bad item")]
+
+
+def test_error_of_on_error_is_logged(log):
+    def on_error(name, item, err):
+        raise ValueError("handler broken")
+
+    def fail(item):
+        raise RuntimeError("stage broken")
+
+    pipeline = StagePipeline([Stage("work", fail, workers=2)], log, on_error=on_error)
+    # Every item is done and workers go on, run does not hang.
+    assert pipeline.run(range(5)) == []
+    errors = log.levels("error")
+    assert len(errors) == 5
+    assert all("handler broken" in message for _, message in errors)
+
+
+def test_in_flight_bounds_items_admitted(log):
+    lock = threading.Lock()
+    state = {"current": 0, "most": 0}
+
+    def enter(item):
+        with lock:
+            state["current"] += 1
+            state["most"] = max(state["most"], state["current"])
+        return item
+
+    def leave(item):
+        time.sleep(0.01)
+        with lock:
+            state["current"] -= 1
+        return item
+
+    stages = [Stage("enter", enter, workers=4), Stage("leave", leave, workers=4, queue_size=8)]
+    assert len(StagePipeline(stages, log, in_flight=3).run(range(20))) == 20
+    assert state["most"] <= 3
+
+
+def test_cancelled_run_counts_items_done(log):
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow(item):
+        started.set()
+        release.wait(5)
+        return item
+
+    pipeline = StagePipeline([Stage("slow", slow)], log)
+
+    async def cancel_run(executor):
+        feed = asyncio.ensure_future(pipeline.feed([1, 2], executor))
+        while not started.is_set():
+            await asyncio.sleep(0.01)
+        feed.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await feed
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        try:
+            asyncio.run(cancel_run(executor))
+        finally:
+            release.set()
+
+    # Item being worked on is done, second one never got in.
+    assert pipeline.remaining == 1
+    assert pipeline.results == []
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 22:24:15 2026
+
+-- Tests of SQL dump split by table --
+
+@author: Julien
+"""
+
+import io
+import tarfile
+import pytest
+from modules.compressor import Compressor
+from modules.table_compressor import (
+    read_index,
+    restore_table,
+    split_tables,
+    TableCompressor,
+    HEADER_SECTION,
+)
+
+
+BLOCK_SIZE = 4096
+
+
+def table(name, rows):
+    """
+    Build statements of one table.
+
+    Parameters
+    ----------
+    name: string
+        Table name.
+    rows: int
+        Number of rows inserted.
+
+    Returns
+    -------
+    bytes:
+        Statements.
+
+    """
+
+    text = "DROP TABLE IF EXISTS `{0}`;\nCREATE TABLE `{0}` (id int);\n".format(name)
+    text += "".join("INSERT INTO `{}` VALUES ({});\n".format(name, i) for i in range(rows))
+    return text.encode()
+
+
+HEADER = b"-- MySQL dump\nSET NAMES utf8mb4;\n"
+ROWS = {"users": 500, "orders": 20, "logs": 2000}
+DUMP = HEADER + b"".join(table(name, rows) for name, rows in ROWS.items())
+
+
+def compress(log, data, workers=1, codec="gzip"):
+    entry = tarfile.TarInfo("dump.sql")
+    entry.size = len(data)
+    target = io.BytesIO()
+    result = TableCompressor(
+        log, {"codec": codec, "level": 1, "block-size": BLOCK_SIZE, "workers": workers}
+    ).compress(io.BytesIO(data), entry, target)
+    assert result["error"] is None
+    return target, result
+
+
+def test_split_follows_tables():
+    parts = list(split_tables(io.BytesIO(DUMP), BLOCK_SIZE))
+    assert b"".join(part for _, part in parts) == DUMP
+    assert all(len(part) <= BLOCK_SIZE for _, part in parts)
+
+    names = [name for name, _ in parts]
+    assert names[0] == HEADER_SECTION
+    assert [name for i, name in enumerate(names) if name not in names[:i]] == [
+        HEADER_SECTION, "users", "orders", "logs"
+    ]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parts_join_back_in_name_order(log, workers):
+    target, result = compress(log, DUMP, workers)
+    assert result["tables"] == 4
+    assert result["input"] == len(DUMP)
+
+    target.seek(0)
+    with tarfile.open(fileobj=target, mode="r:gz") as tar:
+        members = sorted(
+            (member for member in tar.getmembers() if member.name.endswith(".sql")),
+            key=lambda member: member.name,
+        )
+        assert b"".join(tar.extractfile(member).read() for member in members) == DUMP
+        assert "dump.sql.d/index.json" in tar.getnames()
+
+
+@pytest.mark.parametrize("codec", ["gzip", "xz"])
+@pytest.mark.parametrize("name", ["users", "orders", "logs", HEADER_SECTION])
+def test_restore_one_table(log, codec, name):
+    target, _ = compress(log, DUMP, 2, codec)
+    restored = io.BytesIO()
+    assert restore_table(target, codec, name, restored) == 1
+    expected = HEADER if name == HEADER_SECTION else table(name, ROWS[name])
+    assert restored.getvalue() == expected
+
+
+def test_table_in_several_sections(log):
+    again = b"LOCK TABLES `a` WRITE;\nINSERT INTO `a` VALUES (99);\n"
+    target, result = compress(log, table("a", 10) + table("b", 10) + again)
+    assert result["tables"] == 3
+
+    restored = io.BytesIO()
+    assert restore_table(target, "gzip", "a", restored) == 2
+    assert restored.getvalue() == table("a", 10) + again
+
+
+def test_unknown_table(log):
+    target, _ = compress(log, DUMP)
+    assert restore_table(target, "gzip", "missing", io.BytesIO()) == 0
+
+
+def test_archive_without_index(log):
+    entry = tarfile.TarInfo("dump.sql")
+    entry.size = len(DUMP)
+    target = io.BytesIO()
+    Compressor(log, {"level": 1}).compress(io.BytesIO(DUMP), entry, target)
+
+    assert read_index(target, "gzip") is None
+    assert restore_table(target, "gzip", "users", io.BytesIO()) == 0
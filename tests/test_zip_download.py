@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 10:02:51 2026
+
+-- Tests of zip download to a spool file --
+
+@author: Julien
+"""
+
+import hashlib
+import json
+import os
+import random
+import pytest
+import urllib3
+from modules.zip_download import ZipDownload
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+@pytest.fixture
+def server(range_server):
+    """
+    Range server of a zip of a few MB.
+
+    Returns
+    -------
+    ThreadingHTTPServer:
+        Server, zip is in its data attribute.
+
+    """
+
+    range_server.data = random.Random(5).randbytes(3 * 1024 * 1024 + 17)
+    return range_server
+
+
+def downloader(server, tmp_path, log, **options):
+    options = dict({"chunk-size": CHUNK_SIZE, "state-file": str(tmp_path / "state.json")},
+                   **options)
+    return ZipDownload(
+        urllib3.PoolManager(), server.url, str(tmp_path / "dump.zip"), log, options
+    )
+
+
+def test_zip_is_streamed_to_spool_file(server, tmp_path, log):
+    download = downloader(server, tmp_path, log)
+    assert download.download() == len(server.data)
+
+    assert (tmp_path / "dump.zip").read_bytes() == server.data
+    assert sorted(os.listdir(tmp_path)) == ["dump.zip"]
+    assert download.sha256 == hashlib.sha256(server.data).hexdigest()
+    assert download.received == len(server.data)
+
+    # Peak is sampled while downloading, not the lifetime peak of process.
+    assert download.peak_memory > 0
+    _, message = log.levels("info")[-1]
+    assert message.startswith("{} bytes in ".format(len(server.data)))
+    assert "peak memory {:.1f} MB while downloading".format(
+        download.peak_memory / (1024 * 1024)) in message
+
+
+
+class LenientPoolManager(urllib3.PoolManager):
+    """
+    Requester whose bodies end quietly when connection is closed early, as
+    urllib3 1.x does by default.
+    """
+
+    def request(self, method, url, *args, **kwargs):  # pylint: disable=W0221
+        kwargs.setdefault("enforce_content_length", False)
+        return super().request(method, url, *args, **kwargs)
+
+
+@pytest.mark.parametrize("http", [urllib3.PoolManager, LenientPoolManager])
+def test_cut_body_is_resumed_with_range(server, tmp_path, log, http):
+    server.cuts = [1024 * 1024, 1024 * 1024]
+    download = downloader(server, tmp_path, log, retries=3)
+    download.http = http()
+    assert download.download() == len(server.data)
+    assert (tmp_path / "dump.zip").read_bytes() == server.data
+
+    ranges = [request.get("Range") for request in server.requests]
+    assert ranges == [None, "bytes=1048576-", "bytes=2097152-"]
+    assert all(request["If-Range"] == server.etag for request in server.requests[1:])
+    assert len(log.levels("warning")) == 2
+    # Received in several parts, zip was not hashed on the fly.
+    assert download.sha256 is None
+    assert download.received == len(server.data)
+
+
+def test_interrupted_run_is_resumed_by_next_one(server, tmp_path, log):
+    server.cuts = [1024 * 1024]
+    with pytest.raises(urllib3.exceptions.HTTPError):
+        downloader(server, tmp_path, log, retries=0).download()
+    assert (tmp_path / "dump.zip.part").stat().st_size == 1024 * 1024
+    assert (tmp_path / "dump.zip.part.json").exists()
+
+    download = downloader(server, tmp_path, log)
+    download.download()
+    assert (tmp_path / "dump.zip").read_bytes() == server.data
+    assert server.requests[-1]["Range"] == "bytes=1048576-"
+    assert download.received == len(server.data) - 1024 * 1024
+    assert sorted(os.listdir(tmp_path)) == ["dump.zip"]
+
+
+def test_zip_changed_since_interruption(server, tmp_path, log):
+    server.cuts = [1024 * 1024]
+    with pytest.raises(urllib3.exceptions.HTTPError):
+        downloader(server, tmp_path, log, retries=0).download()
+
+    # If-Range does not match anymore, whole new zip is sent back.
+    server.data = random.Random(6).randbytes(2 * 1024 * 1024)
+    server.etag = '"v2"'
+    download = downloader(server, tmp_path, log)
+    assert download.download() == len(server.data)
+    assert (tmp_path / "dump.zip").read_bytes() == server.data
+    assert server.requests[-1]["If-Range"] == '"v1"'
+    assert download.sha256 == hashlib.sha256(server.data).hexdigest()
+
+
+def test_without_resume_partial_file_is_removed(server, tmp_path, log):
+    server.cuts = [1024 * 1024]
+    with pytest.raises(urllib3.exceptions.HTTPError):
+        downloader(server, tmp_path, log, resume=False).download()
+    assert os.listdir(tmp_path) == []
+
+
+def test_unchanged_zip_is_not_downloaded_again(server, tmp_path, log):
+    first = downloader(server, tmp_path, log)
+    first.download()
+    first.save_state()
+    assert first.validators == {"etag": server.etag, "content-length": str(len(server.data))}
+
+    second = downloader(server, tmp_path, log)
+    assert second.download() is None
+    assert second.not_modified
+    assert second.received == 0
+    assert server.requests[-1]["If-None-Match"] == server.etag
+    assert log.levels("info")[-1] == ("Download ZIP", "ZIP not modified since last run.")
+
+
+def test_changed_zip_is_downloaded(server, tmp_path, log):
+    first = downloader(server, tmp_path, log)
+    first.download()
+    first.save_state()
+
+    server.data = random.Random(7).randbytes(1024)
+    server.etag = '"v2"'
+    second = downloader(server, tmp_path, log)
+    assert second.download() == 1024
+    assert (tmp_path / "dump.zip").read_bytes() == server.data
+    second.save_state()
+    assert second.load_state()["etag"] == '"v2"'
+
+
+def test_without_state_file_nothing_is_conditional(server, tmp_path, log):
+    download = ZipDownload(
+        urllib3.PoolManager(), server.url, str(tmp_path / "dump.zip"), log, {}
+    )
+    download.download()
+    download.save_state()
+    assert "If-None-Match" not in server.requests[-1]
+    assert sorted(os.listdir(tmp_path)) == ["dump.zip"]
+
+
+def test_unreadable_state_file_is_ignored(server, tmp_path, log):
+    (tmp_path / "state.json").write_text("{broken")
+    assert downloader(server, tmp_path, log).download() == len(server.data)
+    assert log.levels("warning")
+
+
+SEGMENT_SIZE = 512 * 1024
+
+
+def segmented(server, tmp_path, log, **options):
+    return downloader(server, tmp_path, log, segments=4, **{"segment-size": SEGMENT_SIZE},
+                      **options)
+
+
+def segment_ranges(server):
+    return sorted(
+        request["Range"] for request in server.requests
+        if request["method"] == "GET" and "Range" in request
+    )
+
+
+def test_segments_are_written_in_place(server, tmp_path, log):
+    download = segmented(server, tmp_path, log)
+    assert download.download() == len(server.data)
+    assert (tmp_path / "dump.zip").read_bytes() == server.data
+    assert server.requests[0]["method"] == "HEAD"
+
+    length = len(server.data)
+    expected = sorted(
+        "bytes={}-{}".format(first, min(first + SEGMENT_SIZE, length) - 1)
+        for first in range(0, length, SEGMENT_SIZE)
+    )
+    assert segment_ranges(server) == expected
+    assert download.received == length
+    assert sorted(os.listdir(tmp_path)) == ["dump.zip"]
+
+
+def test_interrupted_segments_are_resumed_from_journal(server, tmp_path, log):
+    server.cuts = [1000]
+    with pytest.raises(urllib3.exceptions.HTTPError):
+        segmented(server, tmp_path, log, retries=0).download()
+    journal = json.loads((tmp_path / "dump.zip.part.json").read_text())
+    assert journal["length"] == len(server.data)
+    assert len(journal["done"]) == len(segment_ranges(server)) - 1
+
+    server.requests.clear()
+    download = segmented(server, tmp_path, log)
+    download.download()
+    assert (tmp_path / "dump.zip").read_bytes() == server.data
+    # Only the segment cut is asked again.
+    assert len(segment_ranges(server)) == 1
+
+
+def test_segments_fall_back_to_one_stream(server, tmp_path, log):
+    server.ranges = False
+    assert segmented(server, tmp_path, log).download() == len(server.data)
+    assert (tmp_path / "dump.zip").read_bytes() == server.data
+    assert [request["method"] for request in server.requests] == ["HEAD", "GET"]
+
+
+def test_zip_changed_between_segmented_runs(server, tmp_path, log):
+    server.cuts = [1000]
+    with pytest.raises(urllib3.exceptions.HTTPError):
+        segmented(server, tmp_path, log, retries=0).download()
+
+    server.data = random.Random(8).randbytes(len(server.data))
+    server.etag = '"v2"'
+    segmented(server, tmp_path, log).download()
+    assert (tmp_path / "dump.zip").read_bytes() == server.data